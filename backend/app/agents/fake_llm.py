@@ -0,0 +1,134 @@
+"""
+Local fake LLM provider (settings.llm_provider = "fake").
+
+Stands in for the Groq-backed agents in tests and offline demos: no API key,
+no network, deterministic answers. It mimics the small part of the agno
+Agent interface the app uses: run(prompt) returns an object with `.content`,
+and run(prompt, stream=True) yields "RunContent" events with text deltas.
+
+The canned extraction parses as the real schema and the canned code passes
+the covenant engine's validator, so the whole pipeline can run end to end.
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from app.config import settings
+from app.services.covenant_engine import ENTRYPOINT
+
+FAKE_EXTRACTION = {
+    "ebitda_definition": {
+        "base_metric": "Consolidated Operating Profit",
+        "section_ref": "Clause 24.1",
+        "page": 1,
+        "add_backs": [
+            {"name": "depreciation", "section_ref": "Clause 24.1", "page": 1},
+            {"name": "amortisation", "section_ref": "Clause 24.1", "page": 1},
+            {"name": "impairment costs", "section_ref": "Clause 24.1", "page": 1},
+        ],
+        "deductions": [],
+        "caps": [],
+    },
+    "covenants": [
+        {
+            "name": "Leverage Ratio",
+            "formula": "Total Net Debt / EBITDA",
+            "legal_text": "Leverage shall not exceed 4.00:1.",
+            "section_ref": "Clause 24.2(a)",
+            "page": 1,
+            "limit_value": 4.0,
+            "limit_type": "max",
+        },
+        {
+            "name": "Interest Cover",
+            "formula": "EBITDA / Net Finance Charges",
+            "legal_text": "Interest Cover shall not be less than 4.00:1.",
+            "section_ref": "Clause 24.2(b)",
+            "page": 1,
+            "limit_value": 4.0,
+            "limit_type": "min",
+        },
+    ],
+}
+
+FAKE_CODE = f"""def ebitda(financials: dict) -> float:
+    return (
+        financials["consolidated_ebit"]
+        + financials["depreciation"]
+        + financials["amortisation"]
+        + financials["impairment_costs"]
+    )
+
+
+def ratio(numerator: float, denominator: float) -> float:
+    if denominator <= 0:
+        return float("inf")
+    return numerator / denominator
+
+
+def {ENTRYPOINT}(financials: dict) -> dict:
+    value = ebitda(financials)
+    leverage = ratio(financials["total_debt"], value)
+    interest_cover = ratio(value, financials["interest_expense"])
+    return {{
+        "ebitda": value,
+        "covenants": [
+            {{"name": "Leverage Ratio", "value": leverage, "limit": 4.0,
+              "limit_type": "max", "compliant": leverage <= 4.0,
+              "section_ref": "Clause 24.2(a)"}},
+            {{"name": "Interest Cover", "value": interest_cover, "limit": 4.0,
+              "limit_type": "min", "compliant": interest_cover >= 4.0,
+              "section_ref": "Clause 24.2(b)"}},
+        ],
+    }}
+"""
+
+
+@dataclass
+class FakeRunOutput:
+    content: str
+
+
+@dataclass
+class FakeRunEvent:
+    content: str
+    event: str = "RunContent"
+
+
+class FakeAgent:
+    """
+    Agent double answering with a canned response.
+
+    Args:
+        response: Text returned for every prompt
+        latency_ms: Simulated model latency per call
+            (default settings.llm_fake_latency_ms)
+    """
+
+    def __init__(self, response: str, latency_ms: Optional[int] = None):
+        self.response = response
+        self.latency_ms = (
+            settings.llm_fake_latency_ms if latency_ms is None else latency_ms
+        )
+
+    def run(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._stream()
+        time.sleep(self.latency_ms / 1000)
+        return FakeRunOutput(self.response)
+
+    def _stream(self, piece_size: int = 40) -> Iterator[FakeRunEvent]:
+        pieces = range(0, len(self.response), piece_size)
+        for start in pieces:
+            time.sleep(self.latency_ms / 1000 / len(pieces))
+            yield FakeRunEvent(self.response[start : start + piece_size])
+
+
+def fake_extraction_agent() -> FakeAgent:
+    return FakeAgent(json.dumps(FAKE_EXTRACTION, indent=2))
+
+
+def fake_code_generation_agent() -> FakeAgent:
+    return FakeAgent(f"```python\n{FAKE_CODE}```")
@@ -0,0 +1,215 @@
+"""
+Shared LLM plumbing: one keep-alive HTTP pool, reusable agents, limits.
+
+Building an agno Agent and Groq model per call meant a new GroqClient (and,
+without a shared transport, a new TLS handshake) for every extraction and
+code generation. Here everything long-lived is created once per process:
+
+- get_http_client(): one httpx.Client with keep-alive connection pooling,
+  handed to every Groq model (and installed as agno's default client)
+- AgentPool: idle agents are reused; a call checks one out, so an agent is
+  never used by two threads at once
+- LLMLimiter: a concurrency cap plus token buckets for requests and tokens
+  per minute, matched to the provider's quotas, so bursts wait locally
+  instead of failing with 429s
+
+settings.llm_provider = "fake" swaps Groq for the local fake in fake_llm.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import httpx
+
+from app.config import settings
+
+# Tokens reserved for the model's answer when charging the tokens bucket
+OUTPUT_TOKENS_RESERVE = 1024
+
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Process-wide httpx client with keep-alive pooling for LLM calls."""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        return _http_client
+
+    with _http_client_lock:
+        if _http_client is None or _http_client.is_closed:
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=settings.llm_max_connections,
+                    max_keepalive_connections=settings.llm_max_connections,
+                    keepalive_expiry=settings.llm_keepalive_seconds,
+                ),
+                timeout=httpx.Timeout(settings.llm_timeout_seconds, connect=10.0),
+                # HTTP/1.1: one request per connection, safe across threads
+                http2=False,
+            )
+            try:
+                from agno.utils.http import set_default_sync_client
+
+                set_default_sync_client(_http_client)
+            except ImportError:
+                pass
+        return _http_client
+
+
+def close_http_client() -> None:
+    """Close the pooled connections (on app shutdown)."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per minute, bursts up to `capacity`.
+
+    A request larger than the capacity waits for a full bucket and then
+    leaves it in debt, so it is slowed down rather than blocked forever.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens, sleeping until they are available. Returns wait."""
+        waited = 0.0
+        needed = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return waited
+                delay = (needed - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class LLMLimiter:
+    """
+    Concurrency cap and per-minute quotas shared by every LLM call.
+
+    Args:
+        max_concurrency: Calls in flight at once
+        requests_per_minute: Request quota (0 = unlimited)
+        tokens_per_minute: Token quota (0 = unlimited)
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+    ):
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    @contextmanager
+    def slot(self, estimated_tokens: int = 0) -> Iterator[None]:
+        """Hold a concurrency slot for one call, after waiting for quota."""
+        with self._slots:
+            if self._requests is not None:
+                self._requests.acquire(1)
+            if self._tokens is not None and estimated_tokens:
+                self._tokens.acquire(estimated_tokens)
+            yield
+
+
+class AgentPool:
+    """
+    Reusable agents built by `factory`, one per concurrent caller.
+
+    Why not share a single Agent?
+    - agno agents keep per-run state, so two threads must not run the same
+      instance at once
+    - Building one is cheap next to an LLM call, but not free; and the
+      model's client (and its connection pool) is kept with it
+    """
+
+    def __init__(self, factory: Callable[[], object]):
+        self._factory = factory
+        self._idle: list = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def agent(self, prompt: str = "") -> Iterator[object]:
+        """Check out an agent for one call, within the shared LLM limits."""
+        from app.services.context_packer import get_token_counter
+
+        estimated_tokens = (
+            get_token_counter()(prompt) + OUTPUT_TOKENS_RESERVE if prompt else 0
+        )
+        with get_llm_limiter().slot(estimated_tokens):
+            with self._lock:
+                agent = self._idle.pop() if self._idle else None
+            if agent is None:
+                agent = self._factory()
+            try:
+                yield agent
+            finally:
+                with self._lock:
+                    self._idle.append(agent)
+
+    def clear(self) -> None:
+        """Drop idle agents (after changing settings, or in tests)."""
+        with self._lock:
+            self._idle.clear()
+
+
+_llm_limiter: Optional[LLMLimiter] = None
+_llm_limiter_lock = threading.Lock()
+
+
+def get_llm_limiter() -> LLMLimiter:
+    """Process-wide limiter built from settings (created on first use)."""
+    global _llm_limiter
+    with _llm_limiter_lock:
+        if _llm_limiter is None:
+            _llm_limiter = LLMLimiter(
+                max_concurrency=settings.llm_max_concurrency,
+                requests_per_minute=settings.llm_requests_per_minute,
+                tokens_per_minute=settings.llm_tokens_per_minute,
+            )
+        return _llm_limiter
+
+
+def make_model(model_id: str, json_mode: bool = False):
+    """
+    The agno model for `model_id`, on the shared HTTP pool.
+
+    json_mode: the provider only returns syntactically valid JSON objects
+    (Groq's response_format json_object; not available while streaming)
+    """
+    from agno.models.groq import Groq
+
+    return Groq(
+        id=model_id,
+        http_client=get_http_client(),
+        max_retries=settings.llm_max_retries,
+        request_params=(
+            {"response_format": {"type": "json_object"}} if json_mode else None
+        ),
+    )
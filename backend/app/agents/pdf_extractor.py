@@ -1,14 +1,74 @@
 """Covenant extraction and code generation agents using Agno and Groq."""
 
 import json
+import re
+from functools import partial
+from typing import Any, Callable, Optional
 
 from agno.agent import Agent, RunOutput
-from agno.models.groq import Groq
-
-
-def create_extraction_agent() -> Agent:
-    """Create an agent for extracting covenant definitions from PDF text."""
-    extraction_prompt = """You are an expert legal document analyst specializing in LMA credit agreements.
+from agno.run.agent import RunEvent
+
+from app.agents.llm_client import AgentPool, make_model
+from app.config import settings
+from app.schemas.agreement import CovenantExtractionOutput
+from app.services.context_packer import PASSAGE_SEPARATOR
+from app.services.covenant_engine import ENTRYPOINT
+from app.services.covenant_sandbox import MAX_EXPONENT, MAX_RANGE
+from app.services.extraction_cache import get_extraction_cache, make_cache_key
+from app.services.extraction_schema import ValidatedExtraction
+from app.services.json_stream import loads_lenient
+
+EXTRACTION_MODEL_ID = "llama-3.3-70b-versatile"
+CODE_GENERATION_MODEL_ID = "llama-3.3-70b-versatile"
+
+# Bump whenever the extraction prompt changes so cached results are not reused
+EXTRACTION_PROMPT_VERSION = "3"
+# Same for the code generation prompt (memoized codegen stage)
+CODE_GENERATION_PROMPT_VERSION = "2"
+
+# Passage header written by context_packer.chunk_source
+PASSAGE_PAGES = re.compile(r"^\[Chunk from Pages? (\d+)(?:-(\d+))?")
+# "24.2" in "Clause 24.2(a)" or "Section 22.1"
+CLAUSE_NUMBER = re.compile(r"\d+(?:\.\d+)+")
+
+# Keys of FinancialDataInput passed to the generated entry point
+FINANCIAL_INPUT_KEYS = [
+    "consolidated_ebit",
+    "depreciation",
+    "amortisation",
+    "impairment_costs",
+    "senior_debt",
+    "total_debt",
+    "interest_expense",
+    "principal_payments",
+]
+
+
+def model_key(model_id: str) -> str:
+    """The model id as used in cache keys.
+
+    The fake provider's answers must never be served for the real model.
+    """
+    if settings.llm_provider == "groq":
+        return model_id
+    return f"{settings.llm_provider}:{model_id}"
+
+
+def create_extraction_agent(json_mode: bool = True) -> Agent:
+    """Create an agent for extracting covenant definitions from PDF text.
+
+    Args:
+        json_mode: Constrain the model to JSON output. Off for the streaming
+            agent, since JSON mode can't stream; its output goes through the
+            same repair and validation
+    """
+    if settings.llm_provider == "fake":
+        from app.agents.fake_llm import fake_extraction_agent
+
+        return fake_extraction_agent()
+
+    output_schema = json.dumps(CovenantExtractionOutput.model_json_schema())
+    extraction_prompt = f"""You are an expert legal document analyst specializing in LMA credit agreements.
 
 Extract covenant definitions from the agreement text. For each covenant, identify:
 - Name and formula
@@ -20,19 +80,52 @@ For EBITDA, extract:
 - Add-backs (depreciation, amortization, etc.)
 - Deductions and caps
 
-Respond in valid JSON format only."""
+Respond in valid JSON format only, matching this JSON schema:
+{output_schema}"""
 
     return Agent(
-        model=Groq(id="llama-3.3-70b-versatile"),
+        model=make_model(EXTRACTION_MODEL_ID, json_mode=json_mode),
         description="Covenant Definition Extractor",
         instructions=[extraction_prompt],
         markdown=False,
     )
 
 
-def extract_covenants_from_text(pdf_text: str) -> dict:
-    """Extract covenant definitions from PDF text using AI."""
-    agent = create_extraction_agent()
+def extract_covenants_from_text(
+    pdf_text: str,
+    use_cache: bool = True,
+    focus: Optional[str] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> dict:
+    """Extract covenant definitions from PDF text using AI.
+
+    Successful results are cached by (text, prompt version, model id, focus),
+    so the same retrieved text is only ever sent to the LLM once. The text is
+    sent whole: callers size it to a token budget (see context_packer).
+
+    The answer is parsed leniently (see json_stream) and validated item by
+    item into the agreement schemas (see extraction_schema). Items that fail
+    validation are sent back to the model on their own, with their errors,
+    instead of re-running the whole extraction; any still invalid after
+    settings.extraction_reask_attempts are dropped and listed in
+    "validation_errors".
+
+    Args:
+        focus: Restrict the extraction to one section, e.g. "interest cover
+            covenants" (see section_extraction); None extracts everything
+        on_delta: Called with each piece of the response as the model
+            streams it (a cached response arrives as a single piece), for
+            incremental parsing (see json_stream)
+    """
+    cache_key = make_cache_key(
+        pdf_text, EXTRACTION_PROMPT_VERSION, model_key(EXTRACTION_MODEL_ID), focus or ""
+    )
+    if use_cache:
+        cached = get_extraction_cache().get(cache_key)
+        if cached is not None:
+            if on_delta is not None and cached.get("raw_response"):
+                on_delta(cached["raw_response"])
+            return cached
 
     prompt = f"""Extract all covenant definitions from this LMA agreement text.
 
@@ -60,63 +153,187 @@ Return a JSON object with:
 }}
 
 Agreement text:
-{pdf_text[:50000]}
+{pdf_text}
+"""
+    if focus:
+        prompt += f"""
+Only extract {focus}. Use null for "ebitda_definition" and [] for "covenants"
+when they are outside this focus or not in the text.
 """
 
+    response_text = None
     try:
-        run_output: RunOutput = agent.run(prompt)
-        response_text = run_output.content
-
-        if "```json" in response_text:
-            json_start = response_text.find("```json") + 7
-            json_end = response_text.find("```", json_start)
-            response_text = response_text[json_start:json_end].strip()
-        elif "```" in response_text:
-            json_start = response_text.find("```") + 3
-            json_end = response_text.find("```", json_start)
-            response_text = response_text[json_start:json_end].strip()
-
-        result = json.loads(response_text)
-
-        return {
+        if on_delta is None:
+            with extraction_agents.agent(prompt) as agent:
+                run_output: RunOutput = agent.run(prompt)
+            response_text = run_output.content
+        else:
+            with streaming_extraction_agents.agent(prompt) as agent:
+                response_text = _run_streaming(agent, prompt, on_delta)
+
+        result = loads_lenient(response_text)
+        if not isinstance(result, dict):
+            raise ValueError("Expected a JSON object")
+
+        validated = ValidatedExtraction(result, partial=bool(focus))
+        for _ in range(settings.extraction_reask_attempts):
+            if not validated.invalid:
+                break
+            _reask_invalid(validated, pdf_text)
+
+        extraction = {
             "success": True,
-            "ebitda_definition": result.get("ebitda_definition"),
-            "covenants": result.get("covenants", []),
+            "ebitda_definition": validated.ebitda_definition,
+            "covenants": validated.covenants,
             "raw_response": response_text,
+            "validation_errors": validated.errors(),
         }
+        get_extraction_cache().set(cache_key, extraction)
+        return extraction
 
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         return {
             "success": False,
             "error": f"Failed to parse JSON: {str(e)}",
-            "raw_response": response_text if "response_text" in locals() else None,
+            "raw_response": response_text,
         }
     except Exception as e:
         return {"success": False, "error": str(e), "raw_response": None}
 
 
+def _reask_invalid(validated: ValidatedExtraction, pdf_text: str) -> None:
+    """
+    Ask the model to correct only the items that failed validation.
+
+    The answer is a few small objects, and the agreement text sent with them
+    is only the passages the items cite (see _reask_context), not the whole
+    retrieved context. A failed re-ask leaves the items invalid; it never
+    fails the extraction.
+    """
+    invalid_items = [
+        {"path": item.path, "value": item.value, "errors": item.errors}
+        for item in validated.invalid.values()
+    ]
+    context = _reask_context(
+        pdf_text, [item.value for item in validated.invalid.values()]
+    )
+    prompt = f"""These items from a covenant extraction failed schema validation:
+
+{json.dumps(invalid_items, indent=2, default=str)}
+
+Correct each item using the agreement text below: keep the values that were
+right and fill in or fix the fields named in its errors.
+
+Return a JSON object:
+{{"fixes": [{{"path": "<path of the item>", "value": {{<corrected item>}}}}]}}
+
+Agreement text:
+{context}
+"""
+    try:
+        with extraction_agents.agent(prompt) as agent:
+            run_output: RunOutput = agent.run(prompt)
+        fixes = loads_lenient(run_output.content)
+    except Exception:
+        return
+    if not isinstance(fixes, dict):
+        return
+
+    for fix in fixes.get("fixes") or []:
+        if isinstance(fix, dict) and isinstance(fix.get("path"), str):
+            validated.fix(fix["path"], fix.get("value"))
+
+
+def _reask_context(pdf_text: str, values: list[Any]) -> str:
+    """
+    The passages of packed context (see context_packer) the items point at.
+
+    A passage is kept if its header's page span holds an item's "page", or
+    it mentions the clause number of an item's "section_ref". Without any
+    match (items that cite nothing, text that isn't packed context) the
+    whole text is returned.
+    """
+    pages, clauses = set(), set()
+    for value in values:
+        if not isinstance(value, dict):
+            continue
+        if isinstance(value.get("page"), int):
+            pages.add(value["page"])
+        clauses.update(CLAUSE_NUMBER.findall(str(value.get("section_ref") or "")))
+    clause_patterns = [
+        re.compile(rf"(?<![\d.]){re.escape(clause)}(?!\d)") for clause in clauses
+    ]
+
+    passages = pdf_text.split(PASSAGE_SEPARATOR)
+    kept = []
+    for passage in passages:
+        match = PASSAGE_PAGES.match(passage)
+        if match:
+            first = int(match.group(1))
+            last = int(match.group(2) or first)
+            if any(first <= page <= last for page in pages):
+                kept.append(passage)
+                continue
+        if any(pattern.search(passage) for pattern in clause_patterns):
+            kept.append(passage)
+
+    if not kept:
+        return pdf_text
+    return PASSAGE_SEPARATOR.join(kept)
+
+
+def _run_streaming(agent: Agent, prompt: str, on_delta: Callable[[str], None]) -> str:
+    """Run the agent in streaming mode, passing content deltas to on_delta."""
+    pieces = []
+    for event in agent.run(prompt, stream=True):
+        if event.event == RunEvent.run_content.value and event.content:
+            pieces.append(event.content)
+            on_delta(event.content)
+        elif event.event == RunEvent.run_error.value:
+            raise RuntimeError(event.content or "Model run failed")
+    return "".join(pieces)
+
+
 def create_code_generation_agent() -> Agent:
     """Create an agent for generating Python code from covenant definitions."""
-    code_gen_prompt = """You are a Python developer specializing in financial calculations.
+    if settings.llm_provider == "fake":
+        from app.agents.fake_llm import fake_code_generation_agent
+
+        return fake_code_generation_agent()
+
+    code_gen_prompt = f"""You are a Python developer specializing in financial calculations.
 
 Convert covenant definitions into executable Python functions with:
 - Type hints and docstrings
 - Return dicts with 'value', 'trace' (contract refs), and 'compliant' boolean
 - Handle caps and complex calculations
 
+The code is executed in a sandbox:
+- No import statements; the `math` module is already available as `math`
+- No classes, lambdas, while loops, file or network access
+- No names or attributes starting with an underscore, no str.format
+- range() of at most {MAX_RANGE} items, exponents of at most {MAX_EXPONENT}
+
 Return ONLY Python code, no explanations."""
 
     return Agent(
-        model=Groq(id="llama-3.3-70b-versatile"),
+        model=make_model(CODE_GENERATION_MODEL_ID),
         description="Covenant Code Generator",
         instructions=[code_gen_prompt],
         markdown=False,
     )
 
 
+# Long-lived agents, reused across requests (see llm_client)
+extraction_agents = AgentPool(create_extraction_agent)
+streaming_extraction_agents = AgentPool(
+    partial(create_extraction_agent, json_mode=False)
+)
+code_generation_agents = AgentPool(create_code_generation_agent)
+
+
 def generate_python_code(covenant_data: dict) -> str:
     """Generate Python code from extracted covenant definitions."""
-    agent = create_code_generation_agent()
 
     prompt = f"""Generate Python code for covenant compliance based on:
 
@@ -125,10 +342,23 @@ def generate_python_code(covenant_data: dict) -> str:
 Create functions for:
 1. EBITDA calculation with add-backs and caps
 2. Each covenant ratio with compliance check
+3. An entry point `{ENTRYPOINT}(financials: dict) -> dict` that runs all of them
+
+`financials` has these float keys: {", ".join(FINANCIAL_INPUT_KEYS)}.
+The entry point must return:
+{{
+    "ebitda": <float>,
+    "covenants": [
+        {{"name": str, "value": float, "limit": float, "limit_type": "max" or "min",
+          "compliant": bool, "section_ref": str}}
+    ]
+}}
+Return float("inf") for ratios whose denominator is zero or negative.
 
 Return ONLY Python code."""
 
-    response = agent.run(prompt)
+    with code_generation_agents.agent(prompt) as agent:
+        response = agent.run(prompt)
     code = response.content if hasattr(response, "content") else str(response)
 
     if "```python" in code:
@@ -1,32 +1,43 @@
 """Agreement API routes for covenant extraction and compliance calculation."""
 
-import re
+import json
 import uuid
 from datetime import datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app.config import settings
 from app.schemas.agreement import (
     AgreementUploadResponse,
+    BatchCalculationResponse,
+    BatchFinancialDataInput,
     CalculationResponse,
     CertificateRequest,
     CovenantResult,
     ExtractionRequest,
     FinancialDataInput,
     GeneratedCodeResponse,
+    StageTimingsResponse,
 )
 from app.services import agreement_storage
-from app.services.pdf_service import PDFService
-from app.services.s3_service import S3Service
+from app.services.executors import run_cpu_bound, run_io_bound
+from app.services.s3_service import FileTooLargeError
+from app.workflows.covenant_pipeline import (
+    PipelineError,
+    pdf_service,
+    run_extract,
+    run_generate_code,
+    s3_service,
+    stream_extract,
+)
+from app.workflows.stages import get_stage_runs
 
 router = APIRouter()
 
-s3_service = S3Service()
-pdf_service = PDFService()
-
 
 class ManualCovenantUpdate(BaseModel):
     covenants: List[dict]
@@ -38,38 +49,84 @@ async def upload_agreement(
     file: UploadFile = File(..., description="LMA Agreement PDF file"),
 ):
     """Upload an LMA loan agreement PDF to S3 and extract metadata."""
-    if not file.filename.lower().endswith(".pdf"):
+    return await _store_agreement_pdf(f"agr_{uuid.uuid4().hex[:12]}", file)
+
+
+@router.post("/upload/{agreement_id}", response_model=AgreementUploadResponse)
+async def upload_amendment(
+    agreement_id: str,
+    file: UploadFile = File(..., description="Amended or restated agreement PDF"),
+):
+    """Replace an agreement's PDF with an amended or restated version.
+
+    The agreement keeps its id, so the next /extract updates its search
+    index in place: only clauses whose text changed are embedded again (see
+    RAGService.index_pages). Covenants and generated code extracted from the
+    previous version are dropped.
+    """
+    from app.services.covenant_store import delete_covenants
+
+    if await run_io_bound(agreement_storage.get_agreement, agreement_id) is None:
         raise HTTPException(
-            status_code=400,
-            detail="Only PDF files are accepted.",
+            status_code=404, detail=f"Agreement not found: {agreement_id}"
         )
 
-    contents = await file.read()
-    file_size_mb = len(contents) / (1024 * 1024)
+    response = await _store_agreement_pdf(agreement_id, file)
+    await run_io_bound(delete_covenants, agreement_id)
+    return response
+
 
-    if file_size_mb > settings.max_file_size_mb:
+async def _store_agreement_pdf(
+    agreement_id: str, file: UploadFile
+) -> AgreementUploadResponse:
+    """Upload a PDF to S3, parse it and point agreement_id at it."""
+    if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(
             status_code=400,
-            detail=f"File too large. Maximum size is {settings.max_file_size_mb}MB",
+            detail="Only PDF files are accepted.",
         )
 
+    max_bytes = settings.max_file_size_mb * 1024 * 1024
+
     try:
-        agreement_id = f"agr_{uuid.uuid4().hex[:12]}"
-        s3_key = s3_service.upload_file(
-            file_content=contents, original_filename=file.filename, folder="agreements"
+        # Streamed from the spooled temp file in parts: the size limit and the
+        # content hash are applied on the way, the PDF is never read into RAM.
+        # Starlette has already received the whole body into that temp file,
+        # so the limit keeps oversized files out of S3 and storage, but the
+        # receive itself is only bounded by the proxy's body size limit
+        upload = await s3_service.upload_stream(
+            file.file,
+            original_filename=file.filename,
+            folder="agreements",
+            max_bytes=max_bytes,
         )
 
-        # Store the mapping of agreement_id -> s3_key
-        agreement_storage.save_s3_key(agreement_id, s3_key)
+        # /extract and /generate-code then read it locally instead of from S3
+        await s3_service.cache_upload(upload.s3_key, file.file)
+
+        # Parsed once here; /extract and /generate-code reuse it by content hash
+        document = await run_cpu_bound(
+            pdf_service.parse_file, file.file, upload.content_hash
+        )
+        definitions = await run_cpu_bound(
+            pdf_service.extract_definitions_section, document
+        )
 
-        page_count = pdf_service.get_page_count(contents)
-        definitions = pdf_service.extract_definitions_section(contents)
+        # Store the mapping of agreement_id -> s3_key
+        await run_io_bound(
+            agreement_storage.save_s3_key,
+            agreement_id,
+            upload.s3_key,
+            content_hash=upload.content_hash,
+            filename=file.filename,
+            page_count=document.page_count,
+        )
 
         return AgreementUploadResponse(
             agreement_id=agreement_id,
             filename=file.filename,
-            page_count=page_count,
-            s3_key=s3_key,
+            page_count=document.page_count,
+            s3_key=upload.s3_key,
             upload_time=datetime.utcnow(),
             definitions_found=definitions["found"],
             definitions_page_range=f"{definitions['start_page']}-{definitions['end_page']}"
@@ -77,6 +134,11 @@ async def upload_agreement(
             else None,
         )
 
+    except FileTooLargeError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Maximum size is {settings.max_file_size_mb}MB",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to process agreement: {str(e)}"
@@ -85,69 +147,51 @@ async def upload_agreement(
 
 @router.post("/extract")
 async def extract_covenants(request: ExtractionRequest):
-    """Extract covenant definitions from an agreement using RAG and AI."""
-    from app.agents.pdf_extractor import extract_covenants_from_text
-    from app.services.rag_service import RAGService
+    """Extract covenant definitions from an agreement using RAG and AI.
 
+    Runs inside the request; POST /api/v1/jobs runs it in the background.
+    """
     try:
-        # Get the correct S3 key for this agreement
-        s3_key = agreement_storage.get_s3_key(request.agreement_id)
-        pdf_bytes = s3_service.download_file(s3_key)
-        full_text = pdf_service.extract_text_from_bytes(pdf_bytes)
-
-        rag = RAGService()
-        rag.index_document(request.agreement_id, full_text)
-
-        queries = [
-            "EBITDA definition calculation add backs deductions",
-            "leverage ratio covenant limit shall not exceed",
-            "interest coverage ratio financial covenant",
-            "debt service coverage ratio",
-            "financial definitions Section 24 Clause 24",
-            "conditions precedent financial covenants",
-            "capital expenditure capex limits",
-        ]
+        return await run_extract(request.agreement_id)
 
-        relevant_text = rag.get_relevant_text(
-            document_id=request.agreement_id,
-            queries=queries,
-            n_per_query=3,
+    except PipelineError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to extract covenants: {str(e)}"
         )
 
-        extraction_result = extract_covenants_from_text(relevant_text)
 
-        if not extraction_result["success"]:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Extraction failed: {extraction_result.get('error', 'Unknown error')}",
-            )
+@router.post("/extract/stream")
+async def extract_covenants_stream(request: ExtractionRequest):
+    """Server-sent-event variant of /extract.
 
-        # Save extracted covenants for use in /calculate
-        from app.services.covenant_store import save_covenants
+    Emits a "stage" event per pipeline stage (downloaded, parsed, indexed,
+    retrieved), "ebitda_definition" and one "covenant" event per covenant as
+    soon as the streamed model response contains it, then "done" with the
+    /extract response body, or "error" with a detail message.
+    """
 
-        save_covenants(
-            request.agreement_id,
-            {
-                "ebitda_definition": extraction_result.get("ebitda_definition"),
-                "covenants": extraction_result.get("covenants", []),
-            },
-        )
+    async def events():
+        try:
+            async for event, data in stream_extract(request.agreement_id):
+                yield _sse(event, data)
+        except PipelineError as e:
+            yield _sse("error", {"detail": str(e)})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Failed to extract covenants: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies (nginx, Cloud Run) must not buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        return {
-            "agreement_id": request.agreement_id,
-            "extraction_time": datetime.utcnow().isoformat(),
-            "success": True,
-            "ebitda_definition": extraction_result.get("ebitda_definition"),
-            "covenants": extraction_result.get("covenants", []),
-            "raw_response": extraction_result.get("raw_response"),
-        }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Failed to extract covenants: {str(e)}"
-        )
+def _sse(event: str, data) -> str:
+    """One server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
 
 
 @router.put("/covenants/{agreement_id}")
@@ -157,23 +201,16 @@ async def update_covenants(agreement_id: str, update_data: ManualCovenantUpdate)
     This endpoint allows users to manually correct AI-extracted data,
     implementing human-in-the-loop oversight for enterprise compliance.
     """
-    from app.services.covenant_store import get_covenants, save_covenants
+    from app.services.covenant_store import update_covenants as apply_update
 
     try:
-        # Get existing extraction data (defensive: handle misses)
-        existing_data = get_covenants(agreement_id) or {}
-
-        # Update the data with manually edited values
-        updated_data = {
-            **existing_data,
-            "covenants": update_data.covenants,
-        }
-
-        if update_data.ebitda_definition:
-            updated_data["ebitda_definition"] = update_data.ebitda_definition
-
-        # Save the updated data
-        save_covenants(agreement_id, updated_data)
+        # Merge the manual edits, re-classify limits and drop stale generated code
+        await run_io_bound(
+            apply_update,
+            agreement_id,
+            update_data.covenants,
+            ebitda_definition=update_data.ebitda_definition,
+        )
 
         return {
             "agreement_id": agreement_id,
@@ -192,94 +229,66 @@ async def update_covenants(agreement_id: str, update_data: ManualCovenantUpdate)
 
 @router.post("/generate-code", response_model=GeneratedCodeResponse)
 async def generate_code(request: ExtractionRequest):
-    """Generate executable Python code from extracted covenant definitions."""
-    from app.agents.pdf_extractor import (
-        extract_covenants_from_text,
-        generate_python_code,
-    )
-    from app.services.rag_service import RAGService
+    """Generate executable Python code from extracted covenant definitions.
 
+    Runs inside the request; POST /api/v1/jobs runs it in the background.
+    """
     try:
-        # Get the correct S3 key for this agreement
-        s3_key = agreement_storage.get_s3_key(request.agreement_id)
-        pdf_bytes = s3_service.download_file(s3_key)
-        full_text = pdf_service.extract_text_from_bytes(pdf_bytes)
-
-        rag = RAGService()
-        rag.index_document(request.agreement_id, full_text)
-
-        queries = [
-            "EBITDA definition calculation add backs deductions",
-            "leverage ratio covenant limit shall not exceed",
-            "interest coverage ratio financial covenant",
-            "debt service coverage ratio",
-            "financial definitions Section 24 Clause 24",
-            "conditions precedent financial covenants",
-            "capital expenditure capex limits",
-        ]
-
-        relevant_text = rag.get_relevant_text(
-            document_id=request.agreement_id,
-            queries=queries,
-            n_per_query=3,
-        )
+        return await run_generate_code(request.agreement_id)
 
-        extraction_result = extract_covenants_from_text(relevant_text)
-
-        if not extraction_result["success"]:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Extraction failed: {extraction_result.get('error', 'Unknown error')}",
-            )
-
-        covenant_data = {
-            "ebitda_definition": extraction_result.get("ebitda_definition"),
-            "covenants": extraction_result.get("covenants", []),
-        }
-
-        generated_code = generate_python_code(covenant_data)
-        function_names = re.findall(r"def (\w+)\(", generated_code)
-        contract_refs = list(
-            set(re.findall(r"Section [\d.]+\([a-z]\)?", generated_code))
+    except PipelineError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to generate code: {str(e)}"
         )
 
-        return GeneratedCodeResponse(
-            agreement_id=request.agreement_id,
-            code=generated_code,
-            functions=function_names,
-            generation_time=datetime.utcnow(),
-            contract_refs=contract_refs,
-        )
 
-    except HTTPException:
-        raise
-    except Exception as e:
+@router.get("/stages/{agreement_id}", response_model=StageTimingsResponse)
+async def get_stage_timings(agreement_id: str):
+    """Timing of each pipeline stage, from the latest run that reached it."""
+    if await run_io_bound(agreement_storage.get_agreement, agreement_id) is None:
         raise HTTPException(
-            status_code=500, detail=f"Failed to generate code: {str(e)}"
+            status_code=404, detail=f"Agreement not found: {agreement_id}"
         )
 
+    stages = await run_io_bound(get_stage_runs, agreement_id)
+    return StageTimingsResponse(agreement_id=agreement_id, stages=stages)
+
 
 @router.post("/calculate", response_model=CalculationResponse)
 async def calculate_covenants(data: FinancialDataInput):
-    """Calculate covenant compliance from financial data using extracted limits."""
-    from app.services.covenant_store import get_covenant_limits
+    """Calculate covenant compliance from financial data using extracted limits.
+
+    Uses the agreement's validated generated code when /generate-code produced
+    one, otherwise the built-in EBITDA, leverage and DSCR formulas.
+    """
+    from app.services.covenant_engine import get_compiled_covenants
+    from app.services.covenant_store import get_limit_index
 
+    engine_error = None
     try:
-        # Fetch dynamic limits from extracted covenants
-        limits = get_covenant_limits(data.agreement_id)
+        engine = await run_io_bound(get_compiled_covenants, data.agreement_id)
+        if engine is not None:
+            return await run_cpu_bound(_calculate_with_engine, engine, data)
+    except Exception as e:
+        # Fall back to the built-in formulas, but say why in the trace
+        engine_error = str(e)
 
-        # Use extracted limits or fall back to defaults
-        senior_limit = limits.get("senior_leverage", {}).get("value", 6.75)
-        super_senior_limit = limits.get("super_senior_leverage", {}).get("value", 7.50)
-        dscr_limit = limits.get("dscr", {}).get("value", 1.00)
+    try:
+        # Fetch dynamic limits from extracted covenants (indexed by kind)
+        limits = await run_io_bound(get_limit_index, data.agreement_id)
 
-        senior_section = limits.get("senior_leverage", {}).get(
-            "section", "Section 24.2(a)"
+        # Use extracted limits or fall back to defaults
+        senior_limit, senior_section = _limit_or_default(
+            limits, "senior_leverage", 6.75, "Section 24.2(a)"
+        )
+        super_senior_limit, super_senior_section = _limit_or_default(
+            limits, "super_senior_leverage", 7.50, "Section 24.2(b)"
         )
-        super_senior_section = limits.get("super_senior_leverage", {}).get(
-            "section", "Section 24.2(b)"
+        dscr_limit, dscr_section = _limit_or_default(
+            limits, "dscr", 1.00, "Section 24.2(c)"
         )
-        dscr_section = limits.get("dscr", {}).get("section", "Section 24.2(c)")
 
         # Calculate EBITDA
         ebitda = (
@@ -346,7 +355,10 @@ async def calculate_covenants(data: FinancialDataInput):
                 "interest_expense": data.interest_expense,
                 "principal_payments": data.principal_payments,
             },
+            "engine": "builtin",
         }
+        if engine_error:
+            trace["engine_error"] = engine_error
 
         return CalculationResponse(
             agreement_id=data.agreement_id,
@@ -362,6 +374,79 @@ async def calculate_covenants(data: FinancialDataInput):
         raise HTTPException(status_code=500, detail=f"Calculation failed: {str(e)}")
 
 
+@router.post("/calculate/batch", response_model=BatchCalculationResponse)
+async def calculate_covenants_batch(data: BatchFinancialDataInput):
+    """Calculate covenant compliance for many periods/scenarios/agreements at once.
+
+    Uses the built-in EBITDA, leverage and DSCR formulas, vectorized with
+    NumPy, against each agreement's extracted limits; rows of agreements
+    with validated generated code run that code instead, like /calculate.
+    """
+    from app.services.batch_calculator import calculate_batch
+
+    try:
+        columns = data.dict(exclude={"agreement_ids", "periods", "scenarios"})
+        result = await run_cpu_bound(calculate_batch, data.agreement_ids, columns)
+
+        return BatchCalculationResponse(
+            calculation_time=datetime.utcnow(),
+            periods=data.periods,
+            scenarios=data.scenarios,
+            **result,
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Batch calculation failed: {str(e)}"
+        )
+
+
+def _limit_or_default(
+    limits: dict, kind: str, default_value: float, default_section: str
+) -> tuple[float, str]:
+    """Extracted limit value and section for a covenant kind, or the defaults."""
+    limit = limits.get(kind)
+    if limit is None:
+        return default_value, default_section
+    return (
+        limit.value if limit.value is not None else default_value,
+        limit.section_ref or default_section,
+    )
+
+
+def _calculate_with_engine(engine, data: FinancialDataInput) -> CalculationResponse:
+    """Run an agreement's compiled covenant code and shape the response."""
+    financials = data.dict(exclude={"agreement_id"})
+    result = engine.run(financials)
+
+    covenants = [
+        CovenantResult(
+            name=str(c["name"]),
+            value=round(float(c.get("value", 0.0)), 2),
+            limit=float(c.get("limit") or 0.0),
+            limit_type=str(c.get("limit_type", "max")),
+            compliant=bool(c.get("compliant", False)),
+            section_ref=str(c.get("section_ref", "")),
+        )
+        for c in result["covenants"]
+    ]
+
+    return CalculationResponse(
+        agreement_id=data.agreement_id,
+        calculation_time=datetime.utcnow(),
+        ebitda=float(result.get("ebitda", 0.0)),
+        covenants=covenants,
+        all_compliant=all(c.compliant for c in covenants),
+        breached_covenants=[c.name for c in covenants if not c.compliant],
+        trace={
+            "inputs": financials,
+            "engine": "generated",
+            "code_hash": engine.code_hash,
+            **({"generated": result["trace"]} if "trace" in result else {}),
+        },
+    )
+
+
 @router.get("/download/{agreement_id}")
 async def download_agreement(agreement_id: str):
     """Get a presigned S3 URL for downloading an agreement."""
@@ -379,7 +464,7 @@ async def generate_compliance_certificate(request: CertificateRequest):
     from app.services.certificate_service import generate_certificate
 
     try:
-        pdf_bytes = generate_certificate(request.dict())
+        pdf_bytes = await run_cpu_bound(generate_certificate, request.dict())
 
         filename = f"Compliance_Certificate_{request.company_name.replace(' ', '_')}_{request.test_date.replace(' ', '_')}.pdf"
 
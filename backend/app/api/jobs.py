@@ -0,0 +1,62 @@
+"""Background job routes: run extraction or code generation without waiting."""
+
+from fastapi import APIRouter, HTTPException, Response
+
+from app.schemas.agreement import JobRequest, JobResponse
+from app.services import agreement_storage
+from app.services.executors import run_io_bound
+from app.services.job_queue import QueueFullError, get_job_queue
+from app.workflows.covenant_pipeline import (
+    CODEGEN_STAGES,
+    EXTRACT_STAGES,
+    run_extract,
+    run_generate_code,
+)
+
+router = APIRouter()
+
+# Job kind -> (pipeline, stages it reports)
+PIPELINES = {
+    "extract": (run_extract, EXTRACT_STAGES),
+    "generate-code": (run_generate_code, CODEGEN_STAGES),
+}
+
+
+@router.post("", response_model=JobResponse, status_code=202)
+async def submit_job(request: JobRequest, response: Response):
+    """Queue /extract or /generate-code for an agreement and return its job.
+
+    Returns 202 with a new job, or 200 with the job already queued or
+    running for the same agreement and kind. Poll GET /jobs/{job_id}.
+    """
+    agreement = await run_io_bound(
+        agreement_storage.get_agreement, request.agreement_id
+    )
+    if agreement is None:
+        raise HTTPException(
+            status_code=404, detail=f"Agreement not found: {request.agreement_id}"
+        )
+
+    run, stages = PIPELINES[request.kind]
+    try:
+        job, created = await get_job_queue().submit(
+            request.agreement_id, request.kind, run, stages
+        )
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "30"}
+        )
+
+    if not created:
+        response.status_code = 200
+    response.headers["Location"] = f"/api/v1/jobs/{job['job_id']}"
+    return job
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Status, per-stage progress and (once succeeded) the result of a job."""
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
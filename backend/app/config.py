@@ -8,6 +8,7 @@ Why Pydantic Settings?
 - Provides autocomplete in your IDE
 """
 
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -27,6 +28,11 @@ class Settings(BaseSettings):
     aws_region: str = "ap-south-1"  # Default to Mumbai region
     aws_s3_bucket_name: str
 
+    # Shared HTTP connection pool of the boto3 client (botocore default: 10)
+    s3_max_pool_connections: int = 32
+    s3_retry_mode: str = "adaptive"  # "legacy", "standard" or "adaptive"
+    s3_max_attempts: int = 5  # Including the first try
+
     @property
     def s3_bucket_name(self) -> str:
         """Alias for backward compatibility."""
@@ -42,6 +48,19 @@ class Settings(BaseSettings):
         """Alias for the Agno agent."""
         return self.gemini_api_key
 
+    # "groq", or "fake" for tests and offline demos (canned answers, no network)
+    llm_provider: str = "groq"
+    llm_max_concurrency: int = 4  # LLM calls in flight per process
+    # Provider quotas from its rate limit page (0 = unlimited)
+    llm_requests_per_minute: int = 0
+    llm_tokens_per_minute: int = 0
+    # Shared keep-alive HTTP pool for the LLM API
+    llm_max_connections: int = 16
+    llm_keepalive_seconds: float = 60.0
+    llm_timeout_seconds: float = 120.0
+    llm_max_retries: int = 2
+    llm_fake_latency_ms: int = 0  # Simulated latency of the fake provider
+
     # ============================================
     # Application Settings
     # ============================================
@@ -53,6 +72,98 @@ class Settings(BaseSettings):
     # ============================================
     max_file_size_mb: int = 50  # Max 50MB for PDFs
     allowed_extensions: str = ".pdf,.xlsx,.xls,.csv"
+    # Uploads are streamed to S3 in parts of this size (S3 minimum is 5MB)
+    s3_multipart_part_size_mb: int = 8
+
+    # ============================================
+    # PDF Processing Settings
+    # ============================================
+    pdf_cache_max_documents: int = 8  # Parsed PDFs kept in memory (by content hash)
+    # Extra headings to locate besides Section 22 / Definitions,
+    # comma-separated, e.g. "Clause 1.1,Financial Covenants"
+    definitions_extra_headings: str = ""
+    # Worker processes for page text extraction (1 = serial, 0 = one per CPU core)
+    pdf_extraction_workers: int = 1
+    pdf_parallel_min_pages: int = 50  # Smaller PDFs aren't worth a process pool
+
+    # ============================================
+    # RAG Settings
+    # ============================================
+    chroma_persist_directory: str = "./chroma_db"
+    embedding_model_name: str = "all-MiniLM-L6-v2"
+    # "clause" splits on clause/definition boundaries, "window" on fixed sizes
+    rag_chunker: str = "clause"
+    rag_chunk_max_chars: int = 2000
+    rag_chunk_min_chars: int = 400  # Clauses shorter than this are merged
+    # BM25 keyword index fused with vector search (exact legal terms, clauses)
+    rag_hybrid_search: bool = True
+    lexical_index_dir: str = "./bm25_index"
+    # Token budget for retrieved text in the extraction prompt, and the
+    # tokenizer to count it with (tokenizer.json path or Hugging Face repo id;
+    # empty = estimate at ~4 characters per token)
+    extraction_context_tokens: int = 12000
+    context_tokenizer: str = ""
+
+    # ============================================
+    # Extraction Settings
+    # ============================================
+    # "single": one LLM call over all retrieved text; "sections": one call per
+    # definition section (EBITDA, adjustments, each covenant), run concurrently
+    extraction_mode: str = "single"
+    extraction_max_concurrency: int = 4
+    extraction_section_tokens: int = 4000  # Context budget per section call
+    # Follow-up calls asking the model to correct only the items that failed
+    # schema validation (0 = drop invalid items and report them)
+    extraction_reask_attempts: int = 1
+
+    # ============================================
+    # Extraction Cache Settings
+    # ============================================
+    # Skips repeat LLM calls for identical (text, prompt version, model)
+    extraction_cache_backend: str = "disk"  # "memory" or "disk"
+    extraction_cache_dir: str = "./extraction_cache"
+    extraction_cache_ttl_seconds: int = 7 * 24 * 3600
+    extraction_cache_max_entries: int = 256
+    # Memoized pipeline stage outputs (retrieved text, extractions, code)
+    stage_cache_dir: str = "./stage_cache"
+
+    # ============================================
+    # Blob Cache Settings
+    # ============================================
+    # Local copies of agreement PDFs, so /extract doesn't re-download from S3
+    blob_cache_enabled: bool = True
+    blob_cache_dir: str = "./blob_cache"
+    blob_cache_max_mb: int = 1024
+
+    # ============================================
+    # Storage Settings
+    # ============================================
+    storage_backend: str = "sqlite"  # "sqlite" (persistent) or "memory"
+    sqlite_path: str = "./data/covenants.db"
+
+    # ============================================
+    # Background Job Settings
+    # ============================================
+    # POST /api/v1/jobs runs extraction/codegen outside the request
+    job_workers: int = 2  # Pipelines running at once per process
+    job_queue_max_pending: int = 32  # Queued jobs before 503
+    job_heartbeat_seconds: int = 15  # How often a process renews its jobs
+    job_lease_seconds: int = 120  # Active jobs not renewed this long are failed
+
+    # ============================================
+    # Generated Code Sandbox Settings
+    # ============================================
+    # /calculate runs generated covenant code in separate worker processes
+    sandbox_workers: int = 2  # Worker processes (one call at a time each)
+    sandbox_timeout_seconds: float = 2.0  # Wall-clock limit per call
+    sandbox_memory_mb: int = 256  # Memory a worker may allocate for the code
+
+    # ============================================
+    # Concurrency Settings
+    # ============================================
+    # Blocking work runs off the event loop in two bounded thread pools
+    cpu_pool_workers: int = 0  # PDF parsing, embedding (0 = one per CPU core)
+    io_pool_workers: int = 16  # S3 transfers, LLM calls
 
     class Config:
         """
@@ -68,6 +179,16 @@ class Settings(BaseSettings):
         case_sensitive = False
         extra = "ignore"  # Ignore extra env vars like DATABASE_URL
 
+    @model_validator(mode="after")
+    def check_chunk_sizes(self) -> "Settings":
+        """A clause chunker whose minimum isn't below its maximum never cuts."""
+        if self.rag_chunk_min_chars >= self.rag_chunk_max_chars:
+            raise ValueError(
+                f"rag_chunk_min_chars ({self.rag_chunk_min_chars}) must be "
+                f"less than rag_chunk_max_chars ({self.rag_chunk_max_chars})"
+            )
+        return self
+
 
 # Create a singleton settings instance
 # This is imported throughout the app: from app.config import settings
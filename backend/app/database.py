@@ -0,0 +1,84 @@
+"""
+SQLite connection management.
+
+Why SQLite in WAL mode?
+- No extra service to run: the database is a single file next to the app
+- WAL lets many readers (uvicorn workers, threads) run alongside one writer
+- Agreements and extractions survive restarts and deploys
+
+Each thread gets its own connection, because sqlite3 connections must not be
+shared across threads.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.config import settings
+from app.models import job
+from app.models.agreement import ADDED_COLUMNS, SCHEMA_STATEMENTS
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready: set[str] = set()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA busy_timeout=30000")
+
+    with _schema_lock:
+        if path not in _schema_ready:
+            for table, column, column_type in ADDED_COLUMNS:
+                existing = {
+                    row["name"]
+                    for row in connection.execute(f"PRAGMA table_info({table})")
+                }
+                # An empty result means the table doesn't exist yet
+                if existing and column not in existing:
+                    connection.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"
+                    )
+            for statement in SCHEMA_STATEMENTS + job.SCHEMA_STATEMENTS:
+                connection.execute(statement)
+            _schema_ready.add(path)
+
+    return connection
+
+
+def get_connection(path: Optional[str] = None) -> sqlite3.Connection:
+    """Return this thread's connection to the database (created on first use)."""
+    path = path or settings.sqlite_path
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    connection = connections.get(path)
+    if connection is None:
+        connection = connections[path] = _connect(path)
+    return connection
+
+
+@contextmanager
+def transaction(path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """
+    Run a block of statements atomically.
+
+    BEGIN IMMEDIATE takes the write lock up front, so two workers saving the
+    same agreement serialize instead of failing halfway through.
+    """
+    connection = get_connection(path)
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    else:
+        connection.execute("COMMIT")
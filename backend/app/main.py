@@ -8,7 +8,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.agreements import router as agreements_router
+from app.agents.llm_client import close_http_client
+from app.api.jobs import router as jobs_router
 from app.config import settings
+from app.services.blob_cache import get_blob_cache
+from app.services.covenant_engine import shutdown_sandbox
+from app.services.executors import run_cpu_bound, shutdown_executors
+from app.services.job_queue import get_job_queue
+from app.services.rag_service import close_rag_service, init_rag_service
 
 app = FastAPI(
     title=settings.app_name,
@@ -30,7 +37,14 @@ app.add_middleware(
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "app": settings.app_name, "version": "1.0.0"}
+    cache = get_blob_cache()
+    return {
+        "status": "healthy",
+        "app": settings.app_name,
+        "version": "1.0.0",
+        "blob_cache": cache.stats() if cache is not None else None,
+        "jobs": get_job_queue().stats(),
+    }
 
 
 @app.get("/", tags=["Root"])
@@ -44,6 +58,7 @@ async def root():
 
 
 app.include_router(agreements_router, prefix="/api/v1/agreements", tags=["Agreements"])
+app.include_router(jobs_router, prefix="/api/v1/jobs", tags=["Jobs"])
 
 
 @app.on_event("startup")
@@ -52,8 +67,23 @@ async def startup_event():
     print(f"🚀 {settings.app_name} is starting...")
     print("📄 API docs available at: http://localhost:8000/docs")
 
+    # Load the embedding model and Chroma client once, before the first request
+    try:
+        await run_cpu_bound(init_rag_service)
+        print("🧠 RAG engine ready")
+    except Exception as e:
+        # Not fatal: get_rag_service() retries on the first request that needs it
+        print(f"⚠️ RAG engine warm-up failed: {e}")
+
+    await get_job_queue().start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Server shutdown handler."""
     print(f"👋 {settings.app_name} is shutting down...")
+    await get_job_queue().stop()
+    close_rag_service()
+    shutdown_sandbox()
+    shutdown_executors()
+    close_http_client()
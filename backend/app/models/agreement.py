@@ -0,0 +1,84 @@
+"""
+SQLite table definitions for agreements and their extracted covenants.
+
+Covenants are stored one row per covenant (normalized) instead of one JSON
+blob per agreement, so they can be indexed and queried directly. Keys the
+LLM returns that don't have a column are kept in the `extra` JSON column.
+`kind` is the covenant classification computed once at save time (NULL in
+rows saved before the column existed; those are classified on read).
+`stage_runs` keeps the latest timing of each pipeline stage per agreement.
+"""
+
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS agreements (
+        agreement_id TEXT PRIMARY KEY,
+        s3_key       TEXT NOT NULL,
+        content_hash TEXT,
+        filename     TEXT,
+        page_count   INTEGER,
+        created_at   TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_agreements_content_hash
+        ON agreements (content_hash)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS extractions (
+        agreement_id      TEXT PRIMARY KEY,
+        ebitda_definition TEXT,
+        generated_code    TEXT,
+        extra             TEXT,
+        updated_at        TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS covenants (
+        agreement_id TEXT NOT NULL,
+        position     INTEGER NOT NULL,
+        name         TEXT,
+        formula      TEXT,
+        legal_text   TEXT,
+        section_ref  TEXT,
+        page         INTEGER,
+        limit_value  REAL,
+        limit_type   TEXT,
+        kind         TEXT,
+        extra        TEXT,
+        PRIMARY KEY (agreement_id, position)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_covenants_kind
+        ON covenants (agreement_id, kind)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stage_runs (
+        agreement_id TEXT NOT NULL,
+        stage        TEXT NOT NULL,
+        stage_key    TEXT NOT NULL,
+        cached       INTEGER NOT NULL,
+        duration_ms  REAL NOT NULL,
+        finished_at  TEXT NOT NULL,
+        PRIMARY KEY (agreement_id, stage)
+    )
+    """,
+]
+
+# Columns added after a table was first released: (table, column, type).
+# Applied on connect to databases created before the column existed.
+ADDED_COLUMNS = [
+    ("covenants", "kind", "TEXT"),
+]
+
+# Covenant keys that have their own column (everything else goes to `extra`)
+COVENANT_COLUMNS = [
+    "name",
+    "formula",
+    "legal_text",
+    "section_ref",
+    "page",
+    "limit_value",
+    "limit_type",
+]
@@ -0,0 +1,33 @@
+"""
+SQLite table for background extraction and code generation jobs.
+
+The partial unique index allows one queued or running job per job_key
+(agreement_id:kind), which is what makes submissions idempotent across
+uvicorn workers sharing the database. `heartbeat_at` is renewed by the
+process that owns an active job; a job whose heartbeat is older than the
+lease is failed, so a dead process can't hold its key forever.
+"""
+
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id       TEXT PRIMARY KEY,
+        job_key      TEXT NOT NULL,
+        agreement_id TEXT NOT NULL,
+        kind         TEXT NOT NULL,
+        status       TEXT NOT NULL,
+        stages       TEXT NOT NULL,
+        result       TEXT,
+        error        TEXT,
+        worker       TEXT,
+        heartbeat_at TEXT,
+        created_at   TEXT NOT NULL,
+        started_at   TEXT,
+        finished_at  TEXT
+    )
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_key
+        ON jobs (job_key) WHERE status IN ('queued', 'running')
+    """,
+]
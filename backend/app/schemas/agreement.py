@@ -7,16 +7,54 @@ Schemas define the structure of data for:
 - Type hints throughout the code
 """
 
+import re
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 # ============================================
 # Covenant Definition Schemas
 # ============================================
 
 
+def _parse_number(value):
+    """
+    Read a threshold the way agreements (and models) write it.
+
+    "4.00:1", "4.0x", "20%" (= 0.20) and "£10,000,000" become floats; any
+    other value is left for pydantic to validate.
+    """
+    if not isinstance(value, str):
+        return value
+    text = value.strip().replace(",", "").lstrip("£$€ ")
+    percentage = text.endswith("%")
+    match = re.match(r"-?\d+(?:\.\d+)?", text)
+    if match is None:
+        return value
+    number = float(match.group(0))
+    return number / 100 if percentage else number
+
+
+def _parse_page(value):
+    """
+    First page of a page reference: 290, "290", "pp. 290-291", [290, 291].
+
+    The page is only there for traceability, so a reference without a
+    number becomes None instead of failing the whole item.
+    """
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        match = re.search(r"\d+", value)
+        return int(match.group(0)) if match else None
+    return None
+
+
 class CovenantDefinition(BaseModel):
     """
     Represents a single covenant extracted from the agreement.
@@ -39,28 +77,67 @@ class CovenantDefinition(BaseModel):
     section_ref: str = Field(
         ..., description="Contract section reference, e.g., 'Section 22.3'"
     )
-    page: int = Field(..., description="PDF page number where this was found")
+    page: Optional[int] = Field(
+        None, description="PDF page number where this was found"
+    )
     limit_value: Optional[float] = Field(None, description="Threshold value, e.g., 5.0")
-    limit_type: str = Field("max", description="'max' for ≤ limits, 'min' for ≥ limits")
+    limit_type: Literal["max", "min"] = Field(
+        "max", description="'max' for ≤ limits, 'min' for ≥ limits"
+    )
+
+    @field_validator("page", mode="before")
+    @classmethod
+    def parse_page(cls, value):
+        return _parse_page(value)
+
+    @field_validator("limit_value", mode="before")
+    @classmethod
+    def parse_limit_value(cls, value):
+        return _parse_number(value)
+
+    @field_validator("limit_type", mode="before")
+    @classmethod
+    def normalize_limit_type(cls, value):
+        # "Maximum", "MIN" ...
+        if isinstance(value, str) and value.strip().lower()[:3] in ("max", "min"):
+            return value.strip().lower()[:3]
+        return value
 
 
-class EBITDAComponent(BaseModel):
+class EBITDAAdjustment(BaseModel):
     """
-    A component of the EBITDA calculation.
+    An add-back or deduction in the EBITDA definition.
 
-    EBITDA has many add-backs and adjustments defined in the agreement.
-    Each component needs to be tracked for traceability.
+    EBITDA has many adjustments defined in the agreement.
+    Each one is tracked with its clause for traceability.
     """
 
-    name: str = Field(..., description="Component name, e.g., 'Restructuring Costs'")
-    operation: str = Field(..., description="'add' or 'subtract'")
+    name: str = Field(..., description="Adjustment name, e.g., 'depreciation'")
     section_ref: str = Field(..., description="Contract clause reference")
-    page: int = Field(..., description="PDF page number")
-    cap: Optional[float] = Field(None, description="Cap amount if applicable")
-    cap_type: Optional[str] = Field(None, description="'fixed' or 'percentage'")
-    conditions: Optional[str] = Field(
-        None, description="Any conditions for this add-back"
+    page: Optional[int] = Field(None, description="PDF page number")
+
+    @field_validator("page", mode="before")
+    @classmethod
+    def parse_page(cls, value):
+        return _parse_page(value)
+
+
+class EBITDACap(BaseModel):
+    """
+    A cap on an EBITDA adjustment, e.g. synergies limited to 20% of EBITDA.
+    """
+
+    item: str = Field(..., description="The capped adjustment, e.g., 'synergies'")
+    cap_type: str = Field(..., description="'fixed' or 'percentage'")
+    cap_value: float = Field(
+        ..., description="Cap amount, or fraction for percentage caps (0.20)"
     )
+    section_ref: str = Field(..., description="Contract clause reference")
+
+    @field_validator("cap_value", mode="before")
+    @classmethod
+    def parse_cap_value(cls, value):
+        return _parse_number(value)
 
 
 class EBITDADefinition(BaseModel):
@@ -75,12 +152,32 @@ class EBITDADefinition(BaseModel):
         ..., description="Starting point, e.g., 'Operating Profit'"
     )
     section_ref: str = Field(..., description="Section reference for EBITDA definition")
-    page_range: str = Field(..., description="Page range, e.g., '285-287'")
-    components: list[EBITDAComponent] = Field(default_factory=list)
-    full_legal_text: str = Field(
-        ..., description="Complete legal text of EBITDA definition"
+    page: Optional[int] = Field(None, description="PDF page number of the definition")
+    add_backs: list[EBITDAAdjustment] = Field(default_factory=list)
+    deductions: list[EBITDAAdjustment] = Field(default_factory=list)
+    caps: list[EBITDACap] = Field(default_factory=list)
+    full_legal_text: Optional[str] = Field(
+        None, description="Complete legal text of EBITDA definition"
     )
 
+    @field_validator("page", mode="before")
+    @classmethod
+    def parse_page(cls, value):
+        return _parse_page(value)
+
+
+class CovenantExtractionOutput(BaseModel):
+    """
+    The JSON object the extraction model is asked to return.
+
+    Its JSON schema is part of the extraction agent's instructions, and the
+    answer is validated against these models item by item (see
+    extraction_schema).
+    """
+
+    ebitda_definition: Optional[EBITDADefinition] = None
+    covenants: list[CovenantDefinition] = Field(default_factory=list)
+
 
 # ============================================
 # Agreement Upload/Response Schemas
@@ -146,6 +243,13 @@ class GeneratedCodeResponse(BaseModel):
     functions: list[str] = Field(..., description="List of function names generated")
     generation_time: datetime = Field(default_factory=datetime.utcnow)
     contract_refs: list[str] = Field(..., description="Contract sections referenced")
+    executable: bool = Field(
+        False,
+        description="Whether the code passed validation and is used by /calculate",
+    )
+    validation_error: Optional[str] = Field(
+        None, description="Why the code can't be executed, if it can't"
+    )
 
     class Config:
         json_schema_extra = {
@@ -244,6 +348,110 @@ class CalculationResponse(BaseModel):
     )
 
 
+# ============================================
+# Batch Calculation Schemas
+# ============================================
+
+
+class BatchFinancialDataInput(BaseModel):
+    """
+    Columnar financial data for many periods × scenarios × agreements.
+
+    Every column has one value per row. `agreement_ids` may hold a single id
+    that applies to all rows; `periods` and `scenarios` are optional labels.
+    """
+
+    agreement_ids: list[str] = Field(
+        ..., min_length=1, description="Agreement of each row (or one for all rows)"
+    )
+    periods: Optional[list[str]] = Field(None, description="Period label per row")
+    scenarios: Optional[list[str]] = Field(None, description="Scenario label per row")
+
+    consolidated_ebit: list[float] = Field(..., min_length=1)
+    depreciation: Optional[list[float]] = None
+    amortisation: Optional[list[float]] = None
+    impairment_costs: Optional[list[float]] = None
+    senior_debt: list[float]
+    total_debt: list[float]
+    interest_expense: list[float]
+    principal_payments: Optional[list[float]] = None
+
+    @model_validator(mode="after")
+    def check_column_lengths(self):
+        rows = len(self.consolidated_ebit)
+        for name in (
+            "depreciation",
+            "amortisation",
+            "impairment_costs",
+            "senior_debt",
+            "total_debt",
+            "interest_expense",
+            "principal_payments",
+            "periods",
+            "scenarios",
+        ):
+            values = getattr(self, name)
+            if values is not None and len(values) != rows:
+                raise ValueError(f"'{name}' has {len(values)} values, expected {rows}")
+        if len(self.agreement_ids) not in (1, rows):
+            raise ValueError(f"'agreement_ids' must have 1 or {rows} values")
+        return self
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "agreement_ids": ["agr_abc123"],
+                "periods": ["2025Q4", "2025Q4"],
+                "scenarios": ["base", "downside"],
+                "consolidated_ebit": [50000000, 35000000],
+                "depreciation": [5000000, 5000000],
+                "senior_debt": [200000000, 200000000],
+                "total_debt": [350000000, 350000000],
+                "interest_expense": [15000000, 18000000],
+                "principal_payments": [10000000, 10000000],
+            }
+        }
+
+
+class BatchCovenantColumn(BaseModel):
+    """Results for one covenant across all rows."""
+
+    name: str
+    limit_type: str  # "max" or "min"
+    values: list[Optional[float]] = Field(
+        ...,
+        description="Ratio per row (null when the denominator is not positive, "
+        "or the row's engine doesn't report this covenant)",
+    )
+    limits: list[Optional[float]]
+    section_refs: dict[str, str] = Field(
+        ..., description="Contract section per agreement_id"
+    )
+    breached: list[bool] = Field(..., description="Breach mask per row")
+
+
+class BatchCalculationResponse(BaseModel):
+    """
+    Columnar covenant results, row-aligned with the request.
+    """
+
+    calculation_time: datetime = Field(default_factory=datetime.utcnow)
+    rows: int
+    periods: Optional[list[str]] = None
+    scenarios: Optional[list[str]] = None
+    ebitda: list[Optional[float]]
+    covenants: dict[str, BatchCovenantColumn]
+    any_breach: list[bool] = Field(..., description="True where any covenant breached")
+    breach_count: int
+    engines: list[str] = Field(
+        ..., description="'generated' or 'builtin' per row, as in /calculate"
+    )
+    engine_errors: dict[str, str] = Field(
+        default_factory=dict,
+        description="Generated code errors per agreement_id (built-in used instead)",
+    )
+
+
 # ============================================
 # Certificate Generation Schema
 # ============================================
@@ -284,3 +492,82 @@ class CertificateRequest(BaseModel):
                 "signature_image": "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNk+A8AAQUBAScY42YAAAAASUVORK5CYII=",
             }
         }
+
+
+# ============================================
+# Background Job Schemas
+# ============================================
+
+
+class JobRequest(BaseModel):
+    """
+    Request to run extraction or code generation in the background.
+
+    Submitting the same (agreement_id, kind) while a job for it is queued or
+    running returns that job instead of starting another one.
+    """
+
+    agreement_id: str = Field(..., description="The agreement to process")
+    kind: Literal["extract", "generate-code"] = Field(
+        "extract", description="Pipeline to run"
+    )
+
+
+class JobStage(BaseModel):
+    """Progress of one pipeline stage."""
+
+    name: str = Field(
+        ..., description="fetch, parse, index, retrieve, extract, save, ..."
+    )
+    status: str = Field(..., description="pending, running, done, skipped or failed")
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class JobResponse(BaseModel):
+    """
+    State of a background job, as returned by POST /jobs and GET /jobs/{id}.
+    """
+
+    job_id: str
+    job_key: str = Field(..., description="agreement_id:kind, the idempotency key")
+    agreement_id: str
+    kind: str
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    stages: list[JobStage] = Field(default_factory=list)
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[dict] = Field(
+        None, description="The /extract or /generate-code response, once succeeded"
+    )
+    error: Optional[str] = None
+
+
+# ============================================
+# Pipeline Stage Schemas
+# ============================================
+
+
+class StageTiming(BaseModel):
+    """Latest run of one pipeline stage for an agreement."""
+
+    stage: str = Field(
+        ..., description="fetch, parse, index, retrieve, extract or codegen"
+    )
+    stage_key: str = Field(..., description="Hash of the stage's inputs (memo key)")
+    cached: bool = Field(..., description="Served from the stage's memo")
+    duration_ms: float
+    finished_at: datetime
+
+
+class StageTimingsResponse(BaseModel):
+    """
+    Stage timings of an agreement's pipeline runs.
+
+    Stages that never ran for the agreement (e.g. fetch and parse once
+    retrieval is memoized) are absent.
+    """
+
+    agreement_id: str
+    stages: list[StageTiming] = Field(default_factory=list)
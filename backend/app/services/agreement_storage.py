@@ -1,25 +1,50 @@
 """
-Simple in-memory store to map agreement_id -> s3_key
-This should ideally be in a database, but for the hackathon demo,
-we'll use an in-memory dictionary.
+Store that maps agreement_id -> s3_key (plus upload metadata).
+
+Backed by app.services.storage: SQLite by default so mappings survive
+restarts and are shared across workers, or in-memory for tests.
 """
 
-# In-memory storage: agreement_id -> s3_key
-_agreement_storage = {}
+from typing import Optional
+
+from app.services.storage import get_storage
 
 
-def save_s3_key(agreement_id: str, s3_key: str):
+def save_s3_key(
+    agreement_id: str,
+    s3_key: str,
+    content_hash: Optional[str] = None,
+    filename: Optional[str] = None,
+    page_count: Optional[int] = None,
+):
     """Save the mapping of agreement_id to s3_key."""
-    _agreement_storage[agreement_id] = s3_key
+    get_storage().save_agreement(
+        agreement_id,
+        s3_key,
+        content_hash=content_hash,
+        filename=filename,
+        page_count=page_count,
+    )
 
 
 def get_s3_key(agreement_id: str) -> str:
     """Get the s3_key for an agreement_id."""
-    if agreement_id not in _agreement_storage:
+    agreement = get_storage().get_agreement(agreement_id)
+    if agreement is None:
         raise KeyError(f"No S3 key found for agreement_id: {agreement_id}")
-    return _agreement_storage[agreement_id]
+    return agreement["s3_key"]
+
+
+def get_agreement(agreement_id: str) -> Optional[dict]:
+    """Get everything stored about an agreement, or None."""
+    return get_storage().get_agreement(agreement_id)
+
+
+def find_agreements_by_hash(content_hash: str) -> list[dict]:
+    """All agreements uploaded with identical PDF content (oldest first)."""
+    return get_storage().find_agreements_by_hash(content_hash)
 
 
 def clear_storage():
     """Clear all stored mappings (useful for testing)."""
-    _agreement_storage.clear()
+    get_storage().clear_agreements()
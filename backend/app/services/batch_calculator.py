@@ -0,0 +1,275 @@
+"""
+Vectorized covenant calculations for many periods, scenarios and agreements.
+
+Agent banks re-test every loan every quarter, and stress tests run thousands
+of scenarios. Building one FinancialDataInput and a handful of Pydantic
+objects per row is slow, so here every input is a NumPy column and EBITDA,
+leverage and DSCR are computed for all rows in one pass.
+
+Each row uses the extracted limits of its own agreement (looked up once per
+distinct agreement, then broadcast back to the rows).
+
+Rows of an agreement with validated generated code (/generate-code) are run
+through that code instead, like /calculate: they report the covenants the
+code returns, not the built-in three. All of an agreement's rows are sent
+to the sandbox together (CompiledCovenants.run_many), not one call per row.
+"""
+
+import numpy as np
+
+from app.services.covenant_store import classify_covenant, get_limit_index
+
+# (key, display name, limit type, default limit, default section)
+BUILTIN_COVENANTS = [
+    ("senior_leverage", "Senior Leverage Ratio", "max", 6.75, "Section 24.2(a)"),
+    (
+        "super_senior_leverage",
+        "Total Leverage Ratio (Super Senior)",
+        "max",
+        7.50,
+        "Section 24.2(b)",
+    ),
+    ("dscr", "Debt Service Coverage Ratio", "min", 1.00, "Section 24.2(c)"),
+]
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """numerator / denominator, or inf where the denominator isn't positive."""
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.full_like(numerator, np.inf),
+        where=denominator > 0,
+    )
+
+
+def _to_json_list(values: np.ndarray) -> list:
+    """Column as a list, with non-finite values (e.g. inf ratios) as None."""
+    column = values.astype(object)
+    column[~np.isfinite(values)] = None
+    return column.tolist()
+
+
+def _empty_column(name: str, limit_type: str, rows: int) -> dict:
+    """A covenant column with no result in any row yet."""
+    return {
+        "name": name,
+        "limit_type": limit_type,
+        "values": np.full(rows, np.nan),
+        "limits": np.full(rows, np.nan),
+        "section_refs": {},
+        "breached": np.zeros(rows, dtype=bool),
+    }
+
+
+def _kind(kinds: dict, covenant: dict) -> str:
+    """classify_covenant, memoized by name and section for one agreement."""
+    key = (covenant.get("name"), covenant.get("section_ref"))
+    kind = kinds.get(key)
+    if kind is None:
+        kind = kinds[key] = classify_covenant(covenant)
+    return kind
+
+
+def _run_generated(
+    unique_ids: np.ndarray,
+    row_index: np.ndarray,
+    inputs: dict[str, np.ndarray],
+    ebitda: np.ndarray,
+    covenants: dict[str, dict],
+) -> tuple[np.ndarray, dict[str, str]]:
+    """
+    Overwrite the rows of agreements with generated code with its results.
+
+    Covenants are put in the column of their kind, so a generated "Senior
+    Leverage Ratio" lands in senior_leverage; built-in results of those rows
+    are blanked. A row whose code fails keeps its built-in results, as
+    /calculate falls back to them.
+
+    Returns:
+        Mask of the rows computed by generated code, and the last error per
+        agreement whose code failed
+    """
+    from app.services.covenant_engine import get_compiled_covenants
+
+    generated = np.zeros(ebitda.shape[0], dtype=bool)
+    errors = {}
+
+    for position, agreement_id in enumerate(unique_ids):
+        try:
+            engine = get_compiled_covenants(agreement_id)
+        except Exception as e:
+            errors[str(agreement_id)] = str(e)
+            continue
+        if engine is None:
+            continue
+
+        rows = np.flatnonzero(row_index == position)
+        # All of the agreement's rows go to the sandbox together (run_many)
+        row_inputs = {name: values[rows].tolist() for name, values in inputs.items()}
+        financials = [
+            {name: float(values[i]) for name, values in row_inputs.items()}
+            for i in range(rows.shape[0])
+        ]
+
+        converted = {}
+        kinds = {}  # The same covenants come back for every row
+        for row, (result, error) in zip(rows, engine.run_many(financials)):
+            if error is None:
+                try:
+                    # Converted as /calculate does, before anything is overwritten
+                    converted[row] = (
+                        float(result.get("ebitda", 0.0)),
+                        [
+                            (
+                                _kind(kinds, c),
+                                str(c["name"]),
+                                float(c.get("value", 0.0)),
+                                float(c.get("limit") or 0.0),
+                                str(c.get("limit_type", "max")),
+                                bool(c.get("compliant", False)),
+                                str(c.get("section_ref", "")),
+                            )
+                            for c in result["covenants"]
+                        ],
+                    )
+                    continue
+                except Exception as e:
+                    error = str(e)
+            errors[str(agreement_id)] = error
+
+        done = np.fromiter(converted, dtype=np.intp, count=len(converted))
+        generated[done] = True
+        for column in covenants.values():
+            column["values"][done] = np.nan
+            column["limits"][done] = np.nan
+            column["breached"][done] = False
+
+        for row, (row_ebitda, results) in converted.items():
+            ebitda[row] = row_ebitda
+            for kind, name, value, limit, limit_type, compliant, section in results:
+                column = covenants.get(kind)
+                if column is None:
+                    column = covenants[kind] = _empty_column(
+                        name, limit_type, ebitda.shape[0]
+                    )
+                column["values"][row] = value
+                column["limits"][row] = limit
+                column["breached"][row] = not compliant
+                if section:
+                    column["section_refs"][str(agreement_id)] = section
+
+    return generated, errors
+
+
+def calculate_batch(agreement_ids: list[str], columns: dict[str, list[float]]) -> dict:
+    """
+    Compute EBITDA, leverage and DSCR for every row at once.
+
+    Args:
+        agreement_ids: Agreement of each row (length n, or 1 to broadcast)
+        columns: Financial input columns of length n; missing optional
+            columns are treated as zeros
+
+    Returns:
+        Columnar results: "ebitda", one entry per covenant under "covenants"
+        (values, limits, breach mask), an "any_breach" mask, the engine of
+        each row ("builtin" or "generated") and generated-code errors per
+        agreement
+    """
+    ebit = np.asarray(columns["consolidated_ebit"], dtype=np.float64)
+    rows = ebit.shape[0]
+
+    def column(name: str) -> np.ndarray:
+        values = columns.get(name)
+        if values is None:
+            return np.zeros(rows)
+        return np.asarray(values, dtype=np.float64)
+
+    ebitda = (
+        ebit
+        + column("depreciation")
+        + column("amortisation")
+        + column("impairment_costs")
+    )
+    debt_service = column("interest_expense") + column("principal_payments")
+
+    values = {
+        "senior_leverage": _ratio(column("senior_debt"), ebitda),
+        "super_senior_leverage": _ratio(column("total_debt"), ebitda),
+        "dscr": _ratio(ebitda, debt_service),
+    }
+
+    # One limit lookup per distinct agreement, broadcast back to the rows
+    unique_ids, row_index = np.unique(
+        np.broadcast_to(np.asarray(agreement_ids, dtype=object), (rows,)).astype(str),
+        return_inverse=True,
+    )
+    agreement_limits = [get_limit_index(agreement_id) for agreement_id in unique_ids]
+
+    covenants = {}
+
+    for key, name, limit_type, default_limit, default_section in BUILTIN_COVENANTS:
+        limit_by_agreement = np.array(
+            [
+                (
+                    stored[key].value
+                    if key in stored and stored[key].value is not None
+                    else default_limit
+                )
+                for stored in agreement_limits
+            ],
+            dtype=np.float64,
+        )
+        limits = limit_by_agreement[row_index]
+
+        if limit_type == "max":
+            breached = values[key] > limits
+        else:
+            breached = values[key] < limits
+
+        covenants[key] = {
+            "name": name,
+            "limit_type": limit_type,
+            "values": values[key],
+            "limits": limits,
+            "section_refs": {
+                str(agreement_id): (
+                    stored[key].section_ref
+                    if key in stored and stored[key].section_ref
+                    else default_section
+                )
+                for agreement_id, stored in zip(unique_ids, agreement_limits)
+            },
+            "breached": breached,
+        }
+
+    generated, engine_errors = _run_generated(
+        unique_ids,
+        row_index,
+        {name: column(name) for name in columns},
+        ebitda,
+        covenants,
+    )
+
+    any_breach = np.zeros(rows, dtype=bool)
+    for result in covenants.values():
+        any_breach |= result["breached"]
+
+    return {
+        "rows": rows,
+        "ebitda": _to_json_list(ebitda),
+        "covenants": {
+            key: {
+                **result,
+                "values": _to_json_list(np.round(result["values"], 2)),
+                "limits": _to_json_list(result["limits"]),
+                "breached": result["breached"].tolist(),
+            }
+            for key, result in covenants.items()
+        },
+        "any_breach": any_breach.tolist(),
+        "breach_count": int(any_breach.sum()),
+        "engines": np.where(generated, "generated", "builtin").tolist(),
+        "engine_errors": engine_errors,
+    }
@@ -0,0 +1,264 @@
+"""
+Local read-through cache for S3 objects (agreement PDFs).
+
+Agreements never change once uploaded, and every upload gets a unique key,
+so /extract and /generate-code don't need a full get_object each time. The
+first read downloads the object into a local directory; later reads are
+served from disk (or memory-mapped for parsing).
+
+- Size-bounded: least recently used files are evicted past the byte limit
+- Single-flight: concurrent misses on one key share a single download
+- Metrics: hits, misses, coalesced waits, evictions, downloaded bytes, and
+  the directory's size, kept as running totals updated by every write; the
+  directory is only listed at startup and when a write takes it past the
+  limit (which also picks up files written by other processes)
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+from app.config import settings
+
+
+class _Flight:
+    """A download in progress that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class BlobCache:
+    """
+    One file per S3 key in a directory.
+
+    File mtime is the last-access time: hits touch it and eviction removes
+    the oldest files once the directory exceeds max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._inflight: dict[str, _Flight] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "bytes_downloaded": 0,
+        }
+        self._entries = 0
+        self._bytes_cached = 0
+        # Counts files left by an earlier run (and enforces max_bytes on them)
+        self._evict(recount=True)
+
+    def _path(self, key: str) -> Path:
+        # Keys contain "/" and user file names, so name files by their hash
+        return (
+            self.directory / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.blob"
+        )
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def get_path(self, key: str, fetch: Callable[[BinaryIO], None]) -> Path:
+        """
+        Local path of a cached object, downloading it first on a miss.
+
+        Args:
+            key: S3 key of the object
+            fetch: Writes the object's bytes into the given binary file
+
+        Returns:
+            Path of the cached file
+
+        Only one thread downloads a given key; the others wait for it and
+        then read the same file (or get the same exception).
+        """
+        path = self._path(key)
+
+        with self._lock:
+            if path.exists():
+                self._stats["hits"] += 1
+                leader = False
+                flight = None
+            else:
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+                    self._stats["misses"] += 1
+                else:
+                    self._stats["coalesced"] += 1
+
+        if flight is None:
+            try:
+                os.utime(path)
+                return path
+            except FileNotFoundError:
+                # Evicted between the check and the touch: fetch it again
+                return self.get_path(key, fetch)
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return path
+
+        try:
+            self._count("bytes_downloaded", self._store(path, fetch))
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+        self._evict()
+        return path
+
+    def _store(self, path: Path, fetch: Callable[[BinaryIO], None]) -> int:
+        """Write a file and add it to the running totals; returns its size."""
+        # Write to a temp file and rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                fetch(f)
+                size = f.tell()
+            try:
+                replaced = path.stat().st_size
+            except FileNotFoundError:
+                replaced = None
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            if replaced is None:
+                self._entries += 1
+            self._bytes_cached += size - (replaced or 0)
+        return size
+
+    def put(self, key: str, fileobj: BinaryIO) -> None:
+        """Store an object we already have locally (e.g. right after upload)."""
+        fileobj.seek(0)
+        self._store(self._path(key), lambda f: shutil.copyfileobj(fileobj, f))
+        self._evict()
+
+    def discard(self, key: str) -> None:
+        """Forget one object (e.g. after it was deleted from S3)."""
+        path = self._path(key)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._entries -= 1
+            self._bytes_cached -= size
+
+    def read_bytes(self, key: str, fetch: Callable[[BinaryIO], None]) -> bytes:
+        """Whole object as bytes."""
+        return self.get_path(key, fetch).read_bytes()
+
+    def open_mmap(self, key: str, fetch: Callable[[BinaryIO], None]) -> mmap.mmap:
+        """
+        Read-only memory map of the object. The caller closes it once done
+        (mmap objects are context managers).
+
+        Why mmap?
+        - PdfReader and hashlib read it like bytes without a heap copy
+        - Pages are loaded lazily by the OS and shared between requests
+        - The map stays valid even if the file is evicted meanwhile
+        """
+        path = self.get_path(key, fetch)
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _evict(self, recount: bool = False) -> None:
+        """
+        Evict past max_bytes, recounting the directory for stats().
+
+        Without `recount`, the directory is only listed when the running
+        total is past max_bytes.
+        """
+        with self._lock:
+            if not recount and self._bytes_cached <= self.max_bytes:
+                return
+
+        entries = []
+        total = 0
+        for path in self.directory.glob("*.blob"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        # Never evict the newest file: it's the one a caller is about to read
+        entries.sort()
+        evicted = 0
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+
+        # Other processes sharing the directory are picked up here too
+        with self._lock:
+            self._stats["evictions"] += evicted
+            self._entries = len(entries) - evicted
+            self._bytes_cached = total
+
+    def stats(self) -> dict:
+        """Hit/miss counters and the size of the cache directory."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._entries
+            stats["bytes_cached"] = self._bytes_cached
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (
+            round((stats["hits"] + stats["coalesced"]) / lookups, 3)
+            if lookups
+            else None
+        )
+        return stats
+
+    def clear(self) -> None:
+        for path in self.directory.glob("*.blob"):
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._entries = 0
+            self._bytes_cached = 0
+
+
+_blob_cache: Optional[BlobCache] = None
+_blob_cache_lock = threading.Lock()
+
+
+def get_blob_cache() -> Optional[BlobCache]:
+    """Return the process-wide blob cache, or None if disabled in settings."""
+    global _blob_cache
+    if not settings.blob_cache_enabled:
+        return None
+    with _blob_cache_lock:
+        if _blob_cache is None:
+            _blob_cache = BlobCache(
+                settings.blob_cache_dir,
+                max_bytes=settings.blob_cache_max_mb * 1024 * 1024,
+            )
+        return _blob_cache
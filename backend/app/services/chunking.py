@@ -0,0 +1,253 @@
+"""
+Structure-aware chunking for LMA agreements.
+
+Fixed 2000-character windows cut clauses like "24.2(a)" in half and only
+know the first [PAGE n] marker they contain. Here chunks follow the document:
+
+- A new chunk starts at a clause heading ("24.2 Financial condition") or a
+  definition ("“Consolidated EBITDA” means ...") once the current chunk has
+  some substance
+- When a chunk gets too long it is cut at the last paragraph ("(a)", "(ii)")
+  or page boundary, and only falls back to a sentence cut inside a paragraph
+- Every chunk carries the page span it covers, looked up from a
+  character-offset -> page index instead of the first marker in its text
+
+Offsets refer to the same "[PAGE n]"-joined layout as PDFService.text(), so
+chunks from either chunker can be compared and diffed by position.
+"""
+
+import re
+from bisect import bisect_right
+from typing import Iterable, Iterator, Optional
+
+# "24.2 Financial condition", "39.3 Transaction Security and Guarantees"
+# (not "26.10 (Unlawfulness)", which is a wrapped cross-reference)
+CLAUSE_HEADING = re.compile(r"^(\d{1,2}(?:\.\d{1,2}){1,2})\.?\s+[A-Z]")
+# "24. FINANCIAL COVENANTS", "22 DEFINITIONS"
+TOP_LEVEL_HEADING = re.compile(r"^(\d{1,2})\.?\s+[A-Z][A-Z ,&\-]{3,}$")
+# "Section 22", "ARTICLE 5" on a line of its own
+SECTION_HEADING = re.compile(
+    r"^(?:Section|SECTION|Article|ARTICLE)\s+(\d+(?:\.\d+)*)\b"
+)
+# “Consolidated EBITDA” means ... (PDFs use straight or curly quotes)
+DEFINITION = re.compile(
+    r"^[“\"]([^”\"]{1,80}?)\s*[”\"]\s+(?:means|includes|has the meaning|shall mean)\b"
+)
+# (a), (ii), (B), (1)
+PARAGRAPH = re.compile(r"^\((?:[a-z]{1,2}|[ivxl]{1,5}|[A-Z]|\d{1,2})\)\s")
+PAGE_MARKER = re.compile(r"^\[PAGE (\d+)\]$")
+
+# Sentence ends to fall back on inside an over-long paragraph
+SENTENCE_BOUNDARIES = [". ", ".\n", ";\n", "\n\n", "\n"]
+
+
+def classify_line(line: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    Boundary kind of one line and its label.
+
+    Returns:
+        ("clause", "24.2"), ("definition", "Consolidated EBITDA"),
+        ("paragraph", None), ("page", None) or (None, None)
+    """
+    stripped = line.strip()
+    if not stripped:
+        return None, None
+
+    if PAGE_MARKER.match(stripped):
+        return "page", None
+
+    match = DEFINITION.match(stripped)
+    if match:
+        return "definition", match.group(1).strip()
+
+    match = CLAUSE_HEADING.match(stripped) or TOP_LEVEL_HEADING.match(stripped)
+    if match:
+        return "clause", match.group(1)
+
+    if len(stripped) < 80:
+        match = SECTION_HEADING.match(stripped)
+        if match:
+            return "clause", match.group(1)
+
+    if PARAGRAPH.match(stripped):
+        return "paragraph", None
+
+    return None, None
+
+
+class PageIndex:
+    """
+    Character offset -> page number, by binary search over page starts.
+
+    Built once per document (or incrementally while streaming), so a chunk's
+    page span costs two bisects instead of scanning its text for markers.
+    """
+
+    def __init__(self):
+        self._starts: list[int] = []
+        self._pages: list[int] = []
+
+    def add_page(self, start_offset: int, page_number: int) -> None:
+        """Register a page that begins at start_offset (in increasing order)."""
+        self._starts.append(start_offset)
+        self._pages.append(page_number)
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[tuple[int, str]]) -> "PageIndex":
+        """Index for the [PAGE n]-joined text of (page_number, text) pages."""
+        index = cls()
+        offset = 0
+        for i, (page_number, page_text) in enumerate(pages):
+            if i:
+                offset += 2  # "\n\n" separator
+            index.add_page(offset, page_number)
+            offset += len(f"[PAGE {page_number}]\n") + len(page_text)
+        return index
+
+    def page_at(self, offset: int) -> Optional[int]:
+        """Page containing the character at offset (None before the first page)."""
+        position = bisect_right(self._starts, offset) - 1
+        if position < 0:
+            return None
+        return self._pages[position]
+
+    def page_span(self, start: int, end: int) -> tuple[Optional[int], Optional[int]]:
+        """First and last page of the text in [start, end)."""
+        return self.page_at(start), self.page_at(max(start, end - 1))
+
+
+class ClauseChunker:
+    """
+    Chunk a stream of pages along clause, definition and paragraph boundaries.
+
+    Args:
+        max_chars: Hard upper bound on a chunk's length
+        min_chars: A clause or definition only starts a new chunk once the
+            current one is at least this long (keeps short definitions together)
+        overlap: Characters repeated after a cut inside a paragraph; cuts at
+            a boundary don't need any. At most a quarter of max_chars, so each
+            cut moves on by at least a quarter of a chunk
+    """
+
+    def __init__(self, max_chars: int = 2000, min_chars: int = 400, overlap: int = 200):
+        if min_chars >= max_chars:
+            raise ValueError(
+                f"min_chars ({min_chars}) must be less than max_chars ({max_chars})"
+            )
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self.overlap = min(overlap, max_chars // 4)
+
+    def chunk_pages(self, pages: Iterable[tuple[int, str]]) -> Iterator[dict]:
+        """
+        Yield chunks for (page_number, text) pages, buffering about one chunk.
+
+        Yields:
+            Dicts with "text", "start_char", "end_char", "page" (first page),
+            "page_start", "page_end" and "clause" (the clause or defined term
+            the chunk belongs to, "" if none seen yet)
+        """
+        page_index = PageIndex()
+        offset = 0
+
+        # The chunk being built: text from chunk_start, plus candidate cuts as
+        # (position in text, clause in effect from there) for lines that start
+        # a clause, definition, paragraph or page
+        text = ""
+        chunk_start = 0
+        cuts: list[tuple[int, str]] = []
+        chunk_clause = ""
+        current_clause = ""
+
+        def emit(length: int) -> Iterator[dict]:
+            chunk = self._make_chunk(
+                text[:length], chunk_start, chunk_clause, page_index
+            )
+            if chunk is not None:
+                yield chunk
+
+        for i, (page_number, page_text) in enumerate(pages):
+            piece = ("\n\n" if i else "") + f"[PAGE {page_number}]\n{page_text}"
+            page_index.add_page(offset + (2 if i else 0), page_number)
+
+            for line in piece.splitlines(keepends=True):
+                kind, label = classify_line(line)
+
+                if kind in ("clause", "definition"):
+                    if len(text.strip()) >= self.min_chars:
+                        yield from emit(len(text))
+                        chunk_start += len(text)
+                        text, cuts = "", []
+                    current_clause = label
+                    if not text.strip():
+                        chunk_clause = label
+
+                if kind is not None and text.strip():
+                    cuts.append((len(text), current_clause))
+
+                text += line
+                offset += len(line)
+
+                # Too long: cut at the last boundary, else inside a sentence
+                while len(text) > self.max_chars:
+                    cut = self._boundary_cut(cuts)
+                    if cut is not None:
+                        keep_from = cut
+                    else:
+                        cut = self._sentence_cut(text)
+                        keep_from = cut - min(self.overlap, cut - 1)
+
+                    yield from emit(cut)
+
+                    # The rest belongs to the clause in effect where it starts
+                    for position, clause in cuts:
+                        if position <= keep_from:
+                            chunk_clause = clause
+                    chunk_start += keep_from
+                    text = text[keep_from:]
+                    cuts = [
+                        (position - keep_from, clause)
+                        for position, clause in cuts
+                        if position > keep_from
+                    ]
+
+        if text:
+            yield from emit(len(text))
+
+    def _boundary_cut(self, cuts: list[tuple[int, str]]) -> Optional[int]:
+        """Last boundary that leaves a chunk between min_chars and max_chars."""
+        for position, _ in reversed(cuts):
+            if self.min_chars <= position <= self.max_chars:
+                return position
+        return None
+
+    def _sentence_cut(self, text: str) -> int:
+        """Cut inside a paragraph, at a sentence end past half the window."""
+        window = text[: self.max_chars]
+        for boundary in SENTENCE_BOUNDARIES:
+            last_boundary = window.rfind(boundary)
+            if last_boundary > self.max_chars * 0.5:
+                return last_boundary + len(boundary)
+        return self.max_chars
+
+    def _make_chunk(
+        self, text: str, start: int, clause: str, page_index: PageIndex
+    ) -> Optional[dict]:
+        """Trim surrounding whitespace and attach offsets and pages."""
+        stripped = text.strip()
+        if not stripped:
+            return None
+
+        start += len(text) - len(text.lstrip())
+        end = start + len(stripped)
+        page_start, page_end = page_index.page_span(start, end)
+
+        return {
+            "text": stripped,
+            "start_char": start,
+            "end_char": end,
+            "page": page_start,
+            "page_start": page_start,
+            "page_end": page_end,
+            "clause": clause or "",
+        }
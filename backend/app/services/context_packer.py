@@ -0,0 +1,225 @@
+"""
+Token-budgeted context assembly for the extraction prompt.
+
+The extractor used to cut whatever retrieval returned at 50,000 characters:
+relevant chunks near the end were dropped while irrelevant ones still cost
+tokens, and the 200-character overlap between neighbouring chunks was sent
+twice. Here retrieved chunks are packed instead:
+
+1. In rank order (most relevant first), each chunk contributes only the part
+   of the document no higher-ranked chunk already covers
+2. Pieces are added while they fit the token budget, counted with the target
+   model's tokenizer when one is configured (chars / 4 otherwise)
+3. The kept pieces are emitted in document order, and pieces that touch are
+   merged back into one passage under a single header
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.config import settings
+
+# Between passages that don't touch (pack_context's default)
+PASSAGE_SEPARATOR = "\n\n---\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English legal text)."""
+    return len(text) // 4 + 1
+
+
+_token_counter: Optional[Callable[[str], int]] = None
+_token_counter_lock = threading.Lock()
+
+
+def get_token_counter() -> Callable[[str], int]:
+    """
+    Token counter for the extraction model.
+
+    settings.context_tokenizer may name a tokenizer.json file or a Hugging
+    Face repo id. The `tokenizers` package ships with sentence-transformers;
+    if it or the tokenizer can't be loaded, estimate_tokens is used.
+    """
+    global _token_counter
+    with _token_counter_lock:
+        if _token_counter is not None:
+            return _token_counter
+
+        _token_counter = estimate_tokens
+        name = settings.context_tokenizer
+        if name:
+            try:
+                from tokenizers import Tokenizer
+
+                tokenizer = (
+                    Tokenizer.from_file(name)
+                    if os.path.exists(name)
+                    else Tokenizer.from_pretrained(name)
+                )
+                _token_counter = lambda text: len(
+                    tokenizer.encode(text, add_special_tokens=False).ids
+                )
+            except Exception as e:
+                print(f"⚠️ Tokenizer '{name}' unavailable, estimating tokens: {e}")
+
+        return _token_counter
+
+
+@dataclass
+class PackedContext:
+    """Prompt context plus what it cost and what was left out."""
+
+    text: str
+    tokens: int
+    chunks_used: int
+    chunks_dropped: int
+
+
+def chunk_source(metadata: dict, last: Optional[dict] = None) -> str:
+    """
+    Header for a retrieved chunk, e.g. "Chunk from Pages 285-286, Clause 24.2".
+
+    `last` is the metadata of the final chunk when several touching chunks
+    are emitted as one passage.
+    """
+    page = metadata.get("page")
+    page_end = (last or metadata).get("page_end") or (last or metadata).get("page")
+    page_end = page_end or page
+    source = (
+        f"Chunk from Page {page}"
+        if page_end == page
+        else f"Chunk from Pages {page}-{page_end}"
+    )
+    clause = metadata.get("clause")
+    if clause:
+        # Clause numbers ("24.2") or defined terms ("Consolidated EBITDA")
+        source += f", Clause {clause}" if clause[0].isdigit() else f', "{clause}"'
+    return source
+
+
+def _uncovered(start: int, end: int, covered: list[tuple[int, int]]) -> list:
+    """Parts of [start, end) outside the (sorted, disjoint) covered ranges."""
+    parts = []
+    position = start
+    for covered_start, covered_end in covered:
+        if covered_end <= position:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > position:
+            parts.append((position, covered_start))
+        position = max(position, covered_end)
+    if position < end:
+        parts.append((position, end))
+    return parts
+
+
+def _cover(covered: list[tuple[int, int]], start: int, end: int) -> None:
+    """Add [start, end) to the covered ranges, merging neighbours."""
+    covered.append((start, end))
+    covered.sort()
+    merged = [covered[0]]
+    for range_start, range_end in covered[1:]:
+        if range_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+        else:
+            merged.append((range_start, range_end))
+    covered[:] = merged
+
+
+def pack_context(
+    ranked_chunks: list[dict],
+    max_tokens: Optional[int] = None,
+    separator: str = PASSAGE_SEPARATOR,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> PackedContext:
+    """
+    Fill a token budget with retrieved chunks, most relevant first.
+
+    Args:
+        ranked_chunks: Chunks as returned by RAGService queries ("text" and
+            "metadata" with start_char/end_char/page), highest priority first
+        max_tokens: Budget for the whole context (None = no limit)
+        separator: Placed between passages that don't touch
+        count_tokens: Token counter (defaults to get_token_counter())
+
+    Returns:
+        PackedContext with the text in document order
+    """
+    count_tokens = count_tokens or get_token_counter()
+    separator_tokens = count_tokens(separator)
+
+    covered: list[tuple[int, int]] = []
+    pieces = []
+    used = 0
+    dropped = 0
+
+    for chunk in ranked_chunks:
+        metadata = chunk["metadata"]
+        start, end = metadata["start_char"], metadata["end_char"]
+        text = chunk["text"]
+
+        # Offsets only line up if the stored text is exactly [start, end);
+        # otherwise the chunk is sent whole
+        if end - start != len(text):
+            parts = [(start, end)]
+            texts = [text]
+        else:
+            parts = _uncovered(start, end, covered)
+            texts = [
+                text[part_start - start : part_end - start]
+                for part_start, part_end in parts
+            ]
+        if not parts:
+            continue
+
+        new_pieces = [
+            {
+                "start": part_start,
+                "end": part_end,
+                "text": piece_text,
+                "metadata": metadata,
+            }
+            for (part_start, part_end), piece_text in zip(parts, texts)
+        ]
+        cost = sum(
+            count_tokens(piece["text"])
+            + count_tokens(f"[{chunk_source(metadata)}]\n")
+            + separator_tokens
+            for piece in new_pieces
+        )
+        if max_tokens is not None and used + cost > max_tokens:
+            dropped += 1
+            continue
+
+        used += cost
+        pieces.extend(new_pieces)
+        for part_start, part_end in parts:
+            _cover(covered, part_start, part_end)
+
+    # Document order; pieces that touch become one passage again
+    pieces.sort(key=lambda piece: piece["start"])
+    passages = []
+    for piece in pieces:
+        if passages and passages[-1]["end"] == piece["start"]:
+            passages[-1]["text"] += piece["text"]
+            passages[-1]["end"] = piece["end"]
+            passages[-1]["last"] = piece["metadata"]
+        else:
+            passages.append(
+                {**piece, "first": piece["metadata"], "last": piece["metadata"]}
+            )
+
+    text = separator.join(
+        f"[{chunk_source(passage['first'], passage['last'])}]\n{passage['text']}"
+        for passage in passages
+    )
+
+    return PackedContext(
+        text=text,
+        tokens=count_tokens(text) if text else 0,
+        chunks_used=len(ranked_chunks) - dropped,
+        chunks_dropped=dropped,
+    )
@@ -0,0 +1,489 @@
+"""
+Covenant engine: validates, compiles and runs AI-generated covenant code.
+
+/generate-code returns Python written by the LLM. Instead of only displaying
+it, we check it against an AST allow-list, compile it once per distinct
+source (cached by hash) and let /calculate call its entry point:
+
+    def calculate_covenants(financials: dict) -> dict:
+        return {
+            "ebitda": float,
+            "covenants": [
+                {"name", "value", "limit", "limit_type", "compliant", "section_ref"},
+            ],
+        }
+
+Why an allow-list?
+- The code comes from a model, so it is untrusted input (a PDF can carry a
+  prompt injection)
+- Only arithmetic, comparisons, plain functions and `math` are needed
+- No imports (`math` is provided), no dunder names, and attributes only
+  from the public API of `math` and the builtin value types, so there is no
+  path to modules, frames or globals
+
+Why also a sandbox process?
+- An allow-list can't bound running time or memory: `for` over a huge
+  range or `10 ** 10 ** 10` validates fine
+- Code runs in worker processes (see covenant_sandbox) with no environment,
+  an address space limit and a wall-clock limit; a worker that overruns is
+  killed and replaced
+"""
+
+import ast
+import hashlib
+import json
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from types import ModuleType
+from typing import Optional
+
+from app.config import settings
+from app.services import covenant_sandbox
+from app.services.covenant_sandbox import SANDBOX_MODULES
+
+ENTRYPOINT = "calculate_covenants"
+
+# Largest sandbox response read back (a result is a few covenants)
+MAX_RESULT_BYTES = 1024 * 1024
+# Rows sent to the sandbox in one call by run_many (each call has the
+# normal time limit, so a batch doesn't lift it)
+BATCH_ROWS = 256
+
+ALLOWED_NODES = (
+    # Structure
+    ast.Module,
+    ast.FunctionDef,
+    ast.arguments,
+    ast.arg,
+    ast.Return,
+    ast.Expr,
+    ast.Pass,
+    ast.If,
+    ast.For,
+    ast.Break,
+    ast.Continue,
+    ast.Raise,
+    ast.Try,
+    ast.ExceptHandler,
+    ast.keyword,
+    # Assignment
+    ast.Assign,
+    ast.AugAssign,
+    ast.AnnAssign,
+    # Expressions
+    ast.Call,
+    ast.Name,
+    ast.Attribute,
+    ast.Constant,
+    ast.Subscript,
+    ast.Slice,
+    ast.Dict,
+    ast.List,
+    ast.Tuple,
+    ast.Set,
+    ast.Starred,
+    ast.IfExp,
+    ast.ListComp,
+    ast.DictComp,
+    ast.SetComp,
+    ast.GeneratorExp,
+    ast.comprehension,
+    ast.JoinedStr,
+    ast.FormattedValue,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.BoolOp,
+    ast.Compare,
+    ast.Load,
+    ast.Store,
+    ast.Del,
+    # Operators
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.UAdd,
+    ast.USub,
+    ast.Not,
+    ast.And,
+    ast.Or,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+    ast.In,
+    ast.NotIn,
+    ast.Is,
+    ast.IsNot,
+)
+
+# Attributes generated code may use: the public methods of the builtin value
+# types and exceptions. str.format is left out because its "{0.attr}" fields
+# read attributes the validator never sees.
+ALLOWED_ATTRIBUTES = {
+    name
+    for value_type in (bool, int, float, str, list, tuple, dict, set, Exception)
+    for name in dir(value_type)
+    if not name.startswith("_")
+} - {"format", "format_map"}
+
+BLOCKED_NAMES = {
+    "eval",
+    "exec",
+    "compile",
+    "open",
+    "input",
+    "globals",
+    "locals",
+    "vars",
+    "getattr",
+    "setattr",
+    "delattr",
+    "type",
+    "object",
+    "breakpoint",
+    "help",
+    "memoryview",
+    "super",
+}
+
+
+class CovenantCodeError(ValueError):
+    """Generated code failed validation or does not follow the contract."""
+
+
+def _check_attribute(node: ast.Attribute) -> None:
+    """Allow public attributes of the builtin value types and sandbox modules."""
+    if node.attr.startswith("_"):
+        raise CovenantCodeError(f"Disallowed attribute '{node.attr}'")
+    if isinstance(node.value, ast.Name) and node.value.id in SANDBOX_MODULES:
+        module = SANDBOX_MODULES[node.value.id]
+        if not hasattr(module, node.attr) or isinstance(
+            getattr(module, node.attr), ModuleType
+        ):
+            raise CovenantCodeError(
+                f"Disallowed attribute '{node.value.id}.{node.attr}'"
+            )
+        return
+    if node.attr not in ALLOWED_ATTRIBUTES:
+        raise CovenantCodeError(
+            f"Disallowed attribute '{node.attr}' at line {node.lineno}"
+        )
+
+
+def validate_code(code: str) -> ast.Module:
+    """
+    Parse generated code and reject anything outside the allow-list.
+
+    Returns:
+        The parsed AST, ready to compile
+
+    Raises:
+        CovenantCodeError: on syntax errors or disallowed constructs
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise CovenantCodeError(f"Generated code has a syntax error: {e}")
+
+    # Module names may only appear as `math.<name>`, never bound or passed on
+    module_bases = {
+        id(node.value)
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Attribute)
+        and isinstance(node.value, ast.Name)
+        and node.value.id in SANDBOX_MODULES
+    }
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            raise CovenantCodeError(
+                f"Imports are not allowed (line {node.lineno}); "
+                f"{', '.join(sorted(SANDBOX_MODULES))} is available without one"
+            )
+        if not isinstance(node, ALLOWED_NODES):
+            raise CovenantCodeError(
+                f"Disallowed construct '{type(node).__name__}' at line "
+                f"{getattr(node, 'lineno', '?')}"
+            )
+        if isinstance(node, ast.Name):
+            if node.id in BLOCKED_NAMES or node.id.startswith("__"):
+                raise CovenantCodeError(f"Disallowed name '{node.id}'")
+            if node.id in SANDBOX_MODULES and id(node) not in module_bases:
+                raise CovenantCodeError(
+                    f"Module '{node.id}' may only be used as {node.id}.<name> "
+                    f"(line {node.lineno})"
+                )
+        if isinstance(node, ast.Attribute):
+            _check_attribute(node)
+
+    defined = {n.name for n in tree.body if isinstance(n, ast.FunctionDef)}
+    if ENTRYPOINT not in defined:
+        raise CovenantCodeError(f"Generated code must define {ENTRYPOINT}(financials)")
+
+    return tree
+
+
+class SandboxProcess:
+    """
+    One sandbox worker process (see covenant_sandbox), serving one call at a
+    time. Responses are JSON, never pickles: the process runs untrusted code,
+    so nothing it sends back may be able to execute in the server.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-I",
+                covenant_sandbox.__file__,
+                str(settings.sandbox_memory_mb),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env={},
+        )
+        self._buffer = b""
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def call(self, request: dict, timeout: float) -> dict:
+        """
+        Send one request and wait up to `timeout` seconds for its response.
+
+        Raises:
+            CovenantCodeError: on timeout, oversized output or a dead worker;
+                the process is then unusable and must be killed
+        """
+        try:
+            self.process.stdin.write(json.dumps(request).encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+        except OSError:
+            raise CovenantCodeError("Sandbox process exited")
+
+        deadline = time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise CovenantCodeError(
+                    f"Generated code ran longer than {timeout:g}s and was stopped"
+                )
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise CovenantCodeError("Sandbox process exited")
+            self._buffer += chunk
+            if len(self._buffer) > MAX_RESULT_BYTES:
+                raise CovenantCodeError("Generated code returned too much output")
+
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return json.loads(line)
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.wait()
+
+
+class SandboxPool:
+    """
+    A fixed number of sandbox processes, started on demand and reused.
+
+    A process that fails a call (timeout, crash) is killed; the next call
+    starts a fresh one in its place.
+    """
+
+    def __init__(self, size: int):
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: "queue.SimpleQueue[SandboxProcess]" = queue.SimpleQueue()
+
+    def call(self, request: dict, timeout: float) -> dict:
+        with self._slots:
+            worker = self._take()
+            try:
+                response = worker.call(request, timeout)
+            except BaseException:
+                worker.kill()
+                raise
+            self._idle.put(worker)
+        return response
+
+    def _take(self) -> SandboxProcess:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return SandboxProcess()
+            if worker.alive():
+                return worker
+            worker.kill()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+_sandbox_pool: Optional[SandboxPool] = None
+_sandbox_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """Return the process-wide sandbox pool, built from settings on first use."""
+    global _sandbox_pool
+    with _sandbox_pool_lock:
+        if _sandbox_pool is None:
+            _sandbox_pool = SandboxPool(settings.sandbox_workers)
+        return _sandbox_pool
+
+
+def shutdown_sandbox() -> None:
+    """Kill the idle sandbox processes (called on app shutdown)."""
+    global _sandbox_pool
+    with _sandbox_pool_lock:
+        if _sandbox_pool is not None:
+            _sandbox_pool.close()
+        _sandbox_pool = None
+
+
+class CompiledCovenants:
+    """A validated covenant module with a single entry point, run sandboxed."""
+
+    def __init__(self, code: str, code_hash: str):
+        tree = validate_code(code)
+        # Compiled here only to surface compile errors; it runs in the sandbox
+        compile(tree, f"<covenants:{code_hash[:12]}>", "exec")
+        self.code = code
+        self.code_hash = code_hash
+
+    def _call(self, financials: Optional[dict] = None, **request) -> dict:
+        response = get_sandbox_pool().call(
+            {
+                "code_hash": self.code_hash,
+                "code": self.code,
+                "entrypoint": ENTRYPOINT,
+                "financials": financials,
+                **request,
+            },
+            timeout=settings.sandbox_timeout_seconds,
+        )
+        if not response.get("ok"):
+            raise CovenantCodeError(f"Generated code failed: {response.get('error')}")
+        return response["result"]
+
+    def load(self) -> None:
+        """
+        Run the module's top level in the sandbox.
+
+        Raises:
+            CovenantCodeError: if it fails or doesn't define the entry point
+        """
+        self._call(None)
+
+    def run(self, financials: dict) -> dict:
+        """
+        Call the entry point in the sandbox and check the shape of its result.
+
+        Raises:
+            CovenantCodeError: if the code fails, overruns its limits, or the
+                result doesn't follow the contract
+        """
+        return _check_result(self._call(dict(financials)))
+
+    def run_many(self, rows: list[dict]) -> list[tuple[Optional[dict], Optional[str]]]:
+        """
+        Call the entry point for many rows, BATCH_ROWS per sandbox call.
+
+        Returns:
+            (result, None) or (None, error) per row, in order. A row that
+            fails doesn't affect the others; a call that fails as a whole
+            (timeout, crash) fails all of its rows.
+        """
+        outcomes = []
+        for start in range(0, len(rows), BATCH_ROWS):
+            batch = [dict(row) for row in rows[start : start + BATCH_ROWS]]
+            try:
+                responses = self._call(rows=batch)
+                if not isinstance(responses, list) or len(responses) != len(batch):
+                    raise CovenantCodeError("Sandbox returned the wrong number of rows")
+            except CovenantCodeError as e:
+                outcomes.extend((None, str(e)) for _ in batch)
+                continue
+            for response in responses:
+                try:
+                    if not response.get("ok"):
+                        raise CovenantCodeError(
+                            f"Generated code failed: {response.get('error')}"
+                        )
+                    outcomes.append((_check_result(response["result"]), None))
+                except CovenantCodeError as e:
+                    outcomes.append((None, str(e)))
+        return outcomes
+
+
+def _check_result(result) -> dict:
+    """The entry point's result, if it follows the contract."""
+    if not isinstance(result, dict) or not isinstance(result.get("covenants"), list):
+        raise CovenantCodeError(
+            f"{ENTRYPOINT} must return a dict with a 'covenants' list"
+        )
+    for covenant in result["covenants"]:
+        if not isinstance(covenant, dict) or "name" not in covenant:
+            raise CovenantCodeError("Each covenant result needs at least a 'name'")
+    return result
+
+
+# Compiled modules keyed by SHA-256 of the source (least recently used first)
+_compiled: "OrderedDict[str, CompiledCovenants]" = OrderedDict()
+_compiled_lock = threading.Lock()
+_MAX_COMPILED = 128
+
+
+def compile_covenants(code: str) -> CompiledCovenants:
+    """Validate and compile code once; identical source reuses the module."""
+    code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    with _compiled_lock:
+        compiled = _compiled.get(code_hash)
+        if compiled is not None:
+            _compiled.move_to_end(code_hash)
+            return compiled
+
+    compiled = CompiledCovenants(code, code_hash)
+
+    with _compiled_lock:
+        _compiled[code_hash] = compiled
+        while len(_compiled) > _MAX_COMPILED:
+            _compiled.popitem(last=False)
+
+    return compiled
+
+
+def get_compiled_covenants(agreement_id: str) -> Optional[CompiledCovenants]:
+    """Compiled module for an agreement's stored generated code, if any."""
+    from app.services.covenant_store import get_generated_code
+
+    code = get_generated_code(agreement_id)
+    if not code:
+        return None
+    return compile_covenants(code)
+
+
+def clear_compiled() -> None:
+    """Drop all compiled modules (useful for testing)."""
+    with _compiled_lock:
+        _compiled.clear()
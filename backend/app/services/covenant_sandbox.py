@@ -0,0 +1,211 @@
+"""
+Sandbox worker: runs validated covenant code in its own interpreter.
+
+covenant_engine starts this file as a script (`python -I covenant_sandbox.py
+<memory_mb>`) with an empty environment, then talks to it over stdin/stdout,
+one JSON request and one JSON response per line:
+
+    {"code_hash", "code", "entrypoint", "financials"}
+    -> {"ok": true, "result": {...}} or {"ok": false, "error": "..."}
+
+A request with "rows" (a list of financials) instead of "financials" runs
+the entry point once per row, and its result is a list with one
+{"ok", "result" | "error"} per row.
+
+Why a separate process?
+- The AST allow-list (covenant_engine.validate_code) is the first line of
+  defence; if something slips through, it runs here, without the server's
+  credentials, modules or memory
+- A runaway loop or allocation can only be stopped from outside: the
+  engine kills this process when a call passes its wall-clock limit, and
+  the address space limit set below turns huge allocations into MemoryError
+
+Within the process, `range` and `**` are bounded so that an ordinary
+mistake fails fast instead of waiting for the timeout.
+
+Only the standard library may be imported here: the script runs in
+isolated mode, outside the app package.
+"""
+
+import ast
+import builtins
+import copy
+import json
+import math
+import os
+import sys
+from collections import OrderedDict
+
+# Longest range() generated code may build
+MAX_RANGE = 100_000
+# Largest absolute exponent for **, and largest integer result it may build
+MAX_EXPONENT = 1_000
+MAX_POW_BITS = 4_096
+
+# Compiled modules kept per worker (the engine sends the same code repeatedly)
+MAX_MODULES = 32
+
+# Modules generated code may use, put into its namespace (it cannot import)
+SANDBOX_MODULES = {"math": math}
+
+SAFE_BUILTIN_NAMES = (
+    "abs",
+    "all",
+    "any",
+    "bool",
+    "dict",
+    "enumerate",
+    "float",
+    "int",
+    "isinstance",
+    "len",
+    "list",
+    "max",
+    "min",
+    "range",
+    "round",
+    "sorted",
+    "str",
+    "sum",
+    "tuple",
+    "zip",
+    "ArithmeticError",
+    "Exception",
+    "KeyError",
+    "TypeError",
+    "ValueError",
+    "ZeroDivisionError",
+)
+
+_POW = "__sandbox_pow__"
+
+
+def bounded_range(*args) -> range:
+    """range() refusing more than MAX_RANGE items."""
+    values = range(*args)
+    if len(values) > MAX_RANGE:
+        raise ValueError(f"range() longer than {MAX_RANGE} items")
+    return values
+
+
+def guarded_pow(base, exponent):
+    """`base ** exponent`, refusing huge exponents and integer results."""
+    if isinstance(exponent, (int, float)) and abs(exponent) > MAX_EXPONENT:
+        raise ValueError(f"Exponent larger than {MAX_EXPONENT}")
+    if (
+        isinstance(base, int)
+        and isinstance(exponent, int)
+        and exponent > 0
+        and base.bit_length() * exponent > MAX_POW_BITS
+    ):
+        raise ValueError(f"Integer power larger than {MAX_POW_BITS} bits")
+    return base**exponent
+
+
+class _GuardPow(ast.NodeTransformer):
+    """Rewrite `a ** b` and `a **= b` into calls to guarded_pow."""
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        if not isinstance(node.op, ast.Pow):
+            return node
+        return ast.copy_location(
+            ast.Call(
+                func=ast.Name(id=_POW, ctx=ast.Load()),
+                args=[node.left, node.right],
+                keywords=[],
+            ),
+            node,
+        )
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> ast.AST:
+        self.generic_visit(node)
+        if not isinstance(node.op, ast.Pow):
+            return node
+        current = copy.deepcopy(node.target)
+        current.ctx = ast.Load()
+        value = ast.Call(
+            func=ast.Name(id=_POW, ctx=ast.Load()),
+            args=[current, node.value],
+            keywords=[],
+        )
+        return ast.copy_location(ast.Assign(targets=[node.target], value=value), node)
+
+
+def load(code: str, filename: str) -> dict:
+    """Execute the module's code and return its namespace."""
+    tree = ast.fix_missing_locations(_GuardPow().visit(ast.parse(code)))
+    safe_builtins = {name: getattr(builtins, name) for name in SAFE_BUILTIN_NAMES}
+    safe_builtins["range"] = bounded_range
+    namespace = {
+        "__name__": "generated_covenants",
+        "__builtins__": safe_builtins,
+        _POW: guarded_pow,
+        **SANDBOX_MODULES,
+    }
+    exec(compile(tree, filename, "exec"), namespace)
+    return namespace
+
+
+def _limit_memory(memory_mb: int) -> None:
+    """Cap this process's address space at its current size plus memory_mb."""
+    try:
+        import resource
+    except ImportError:  # Not on POSIX: rely on the wall-clock limit alone
+        return
+
+    baseline = 0
+    try:
+        with open("/proc/self/statm") as f:
+            baseline = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    limit = baseline + memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _handle(request: dict, modules: "OrderedDict[str, dict]") -> dict:
+    code_hash = request["code_hash"]
+    namespace = modules.get(code_hash)
+    if namespace is None:
+        namespace = load(request["code"], f"<covenants:{code_hash[:12]}>")
+        modules[code_hash] = namespace
+        while len(modules) > MAX_MODULES:
+            modules.popitem(last=False)
+    modules.move_to_end(code_hash)
+
+    entrypoint = namespace.get(request["entrypoint"])
+    if not callable(entrypoint):
+        raise TypeError(f"{request['entrypoint']} is not a function")
+    if "rows" in request:
+        return [_call_row(entrypoint, row) for row in request["rows"]]
+    if request.get("financials") is None:
+        # Load only: the module runs and defines its entry point
+        return {}
+    return entrypoint(dict(request["financials"]))
+
+
+def _call_row(entrypoint, financials: dict) -> dict:
+    """One row of a "rows" request: a failing row doesn't fail the others."""
+    try:
+        return {"ok": True, "result": entrypoint(dict(financials))}
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def main() -> None:
+    _limit_memory(int(sys.argv[1]))
+    modules: "OrderedDict[str, dict]" = OrderedDict()
+
+    for line in sys.stdin:
+        try:
+            response = {"ok": True, "result": _handle(json.loads(line), modules)}
+            payload = json.dumps(response, default=str)
+        except Exception as e:  # MemoryError and RecursionError included
+            payload = json.dumps({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        sys.stdout.write(payload + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
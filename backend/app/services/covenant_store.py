@@ -1,78 +1,217 @@
-"""In-memory store for extracted covenant data."""
+"""Store for extracted covenant data (persistent, see app.services.storage).
 
+Covenants are classified into kinds ("senior_leverage", "dscr", ...) once,
+when they are saved. /calculate then reads a typed limit index keyed by kind
+instead of string-matching every covenant name on every request.
+"""
+
+import re
+import threading
+from datetime import datetime
 from typing import Optional
 
-# Simple in-memory store: agreement_id -> extraction result
-_covenant_store: dict = {}
+from app.services.agreement_storage import find_agreements_by_hash, get_agreement
+from app.services.storage import get_storage
+
+
+class CovenantLimit:
+    """One covenant threshold, as used by /calculate."""
+
+    __slots__ = ("kind", "name", "value", "limit_type", "section_ref")
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        value: Optional[float],
+        limit_type: str,
+        section_ref: str,
+    ):
+        self.kind = kind
+        self.name = name
+        self.value = value
+        self.limit_type = limit_type
+        self.section_ref = section_ref
+
+    def as_dict(self) -> dict:
+        return {
+            "value": self.value,
+            "type": self.limit_type,
+            "section": self.section_ref,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"CovenantLimit({self.kind!r}, value={self.value!r}, "
+            f"limit_type={self.limit_type!r}, section_ref={self.section_ref!r})"
+        )
+
+
+def classify_covenant(covenant: dict) -> str:
+    """
+    Map a covenant to its kind.
+
+    The leverage/DSCR/interest-cover rules match what /calculate has always
+    recognised. Anything else gets a kind derived from its name, e.g.
+    "Capital Expenditure" -> "capital_expenditure", so new covenant types
+    are indexed too.
+    """
+    name = (covenant.get("name") or "").lower()
+    section_ref = covenant.get("section_ref") or ""
+
+    if "leverage" in name and "senior" in name:
+        # Check if it's super senior or regular senior
+        if "super" in name or "24.2(b)" in section_ref:
+            return "super_senior_leverage"
+        return "senior_leverage"
+    if "leverage" in name:
+        # Generic leverage - check section ref
+        if "24.2(a)" in section_ref:
+            return "senior_leverage"
+        if "24.2(b)" in section_ref:
+            return "super_senior_leverage"
+    elif "debt service" in name or "dscr" in name:
+        return "dscr"
+    elif "interest coverage" in name:
+        return "interest_coverage"
+
+    return re.sub(r"[^a-z0-9]+", "_", name).strip("_") or "unclassified"
+
+
+# Per-process limit indexes: agreement_id -> (storage version, kind -> limit)
+_limit_indexes: dict[str, tuple[str, dict[str, CovenantLimit]]] = {}
+_limit_indexes_lock = threading.Lock()
+
+
+def _invalidate_limits(agreement_id: str) -> None:
+    with _limit_indexes_lock:
+        _limit_indexes.pop(agreement_id, None)
 
 
 def save_covenants(agreement_id: str, extraction_result: dict) -> None:
-    """Save extracted covenants for an agreement."""
-    _covenant_store[agreement_id] = extraction_result
+    """Save extracted covenants for an agreement (and classify them)."""
+    kinds = [classify_covenant(c) for c in extraction_result.get("covenants") or []]
+    get_storage().save_extraction(agreement_id, extraction_result, kinds)
+    _invalidate_limits(agreement_id)
+
+
+def update_covenants(
+    agreement_id: str, covenants: list[dict], ebitda_definition: Optional[dict] = None
+) -> dict:
+    """Apply manual edits on top of the stored extraction and re-classify.
+
+    Generated code is dropped, since it was written for the old definitions.
+    The extraction is marked as edited, so it is never copied to other
+    uploads of the same PDF.
+    """
+    # Get existing extraction data (defensive: handle misses)
+    updated_data = {**(get_covenants(agreement_id) or {}), "covenants": covenants}
+
+    if ebitda_definition:
+        updated_data["ebitda_definition"] = ebitda_definition
+
+    updated_data.pop("generated_code", None)
+    updated_data["edited_at"] = datetime.utcnow().isoformat()
+
+    save_covenants(agreement_id, updated_data)
+    return updated_data
 
 
 def get_covenants(agreement_id: str) -> Optional[dict]:
     """Retrieve stored covenants by agreement ID."""
-    return _covenant_store.get(agreement_id)
+    return get_storage().get_extraction(agreement_id)
 
 
-def get_covenant_limits(agreement_id: str) -> dict:
-    """Get covenant limits as a structured dict for calculation."""
-    data = _covenant_store.get(agreement_id)
-    if not data:
-        return {}
+def find_covenants_by_content(agreement_id: str) -> Optional[dict]:
+    """Extraction of an earlier upload of the same PDF, if there is one.
 
-    limits = {}
-    for covenant in data.get("covenants", []):
-        name = covenant.get("name", "").lower()
-        limit_value = covenant.get("limit_value")
-        limit_type = covenant.get("limit_type", "max")
-        section_ref = covenant.get("section_ref", "")
-
-        if "leverage" in name and "senior" in name.lower():
-            # Check if it's super senior or regular senior
-            if "super" in name.lower() or "24.2(b)" in section_ref:
-                limits["super_senior_leverage"] = {
-                    "value": limit_value,
-                    "type": limit_type,
-                    "section": section_ref,
-                }
-            else:
-                limits["senior_leverage"] = {
-                    "value": limit_value,
-                    "type": limit_type,
-                    "section": section_ref,
-                }
-        elif "leverage" in name:
-            # Generic leverage - check section ref
-            if "24.2(a)" in section_ref:
-                limits["senior_leverage"] = {
-                    "value": limit_value,
-                    "type": limit_type,
-                    "section": section_ref,
-                }
-            elif "24.2(b)" in section_ref:
-                limits["super_senior_leverage"] = {
-                    "value": limit_value,
-                    "type": limit_type,
-                    "section": section_ref,
-                }
-        elif "debt service" in name.lower() or "dscr" in name.lower():
-            limits["dscr"] = {
-                "value": limit_value,
-                "type": limit_type,
-                "section": section_ref,
-            }
-        elif "interest coverage" in name.lower():
-            limits["interest_coverage"] = {
-                "value": limit_value,
-                "type": limit_type,
-                "section": section_ref,
+    Re-uploading an identical agreement (same content hash) then costs no
+    LLM call: its covenants are copied from the first extraction. Only
+    extractions as the model returned them qualify; manual edits (PUT
+    /covenants) belong to the agreement they were made on.
+
+    Returns ebitda_definition, covenants and copied_from (the agreement the
+    covenants come from), or None.
+    """
+    agreement = get_agreement(agreement_id)
+    if not agreement or not agreement.get("content_hash"):
+        return None
+
+    for other in find_agreements_by_hash(agreement["content_hash"]):
+        if other["agreement_id"] == agreement_id:
+            continue
+        data = get_covenants(other["agreement_id"])
+        if data and data.get("covenants") and not data.get("edited_at"):
+            return {
+                "ebitda_definition": data.get("ebitda_definition"),
+                "covenants": data["covenants"],
+                "copied_from": other["agreement_id"],
             }
+    return None
+
+
+def delete_covenants(agreement_id: str) -> None:
+    """Forget an agreement's extraction and generated code (e.g. new PDF)."""
+    get_storage().delete_extraction(agreement_id)
+    _invalidate_limits(agreement_id)
+
+
+def get_generated_code(agreement_id: str) -> Optional[str]:
+    """An agreement's validated generated code (without reading its covenants)."""
+    return get_storage().get_generated_code(agreement_id)
+
 
-    return limits
+def save_generated_code(agreement_id: str, code: str) -> None:
+    """Attach generated calculation code to an agreement's stored extraction."""
+    get_storage().save_generated_code(agreement_id, code)
+
+
+def get_limit_index(agreement_id: str) -> dict[str, CovenantLimit]:
+    """
+    Typed covenant limits keyed by kind, for O(1) lookups in /calculate.
+
+    Built from the kinds stored at save time (covenants stored before
+    classification existed are classified here) and cached per process. The
+    storage version is checked on every call, so an update made by another
+    worker is picked up immediately.
+    """
+    storage = get_storage()
+    version = storage.get_extraction_version(agreement_id)
+    if version is None:
+        return {}
+
+    with _limit_indexes_lock:
+        cached = _limit_indexes.get(agreement_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    index = {}
+    for row in storage.get_classified_covenants(agreement_id):
+        # Rows saved before covenants were classified have no kind yet
+        kind = row["kind"] or classify_covenant(row)
+        # Later covenants of the same kind win, as they always have
+        index[kind] = CovenantLimit(
+            kind=kind,
+            name=row.get("name") or "",
+            value=row.get("limit_value"),
+            limit_type=row.get("limit_type") or "max",
+            section_ref=row.get("section_ref") or "",
+        )
+
+    with _limit_indexes_lock:
+        _limit_indexes[agreement_id] = (version, index)
+    return index
+
+
+def get_covenant_limits(agreement_id: str) -> dict:
+    """Get covenant limits as a structured dict for calculation."""
+    return {
+        kind: limit.as_dict() for kind, limit in get_limit_index(agreement_id).items()
+    }
 
 
 def clear_store() -> None:
     """Clear all stored covenants (useful for testing)."""
-    _covenant_store.clear()
+    get_storage().clear_extractions()
+    with _limit_indexes_lock:
+        _limit_indexes.clear()
@@ -0,0 +1,75 @@
+"""
+Bounded executors for blocking work called from async route handlers.
+
+PyPDF2, boto3, ChromaDB, SentenceTransformer and the Groq/agno agents are all
+synchronous. Calling them directly inside an `async def` handler freezes the
+event loop, so /health and every other request wait behind one /extract.
+
+Two separate pools keep the kinds of work from starving each other:
+- CPU pool: PDF parsing, chunking, embedding, certificate rendering
+- I/O pool: S3 transfers and LLM calls (mostly waiting on the network)
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from app.config import settings
+
+_cpu_executor: Optional[ThreadPoolExecutor] = None
+_io_executor: Optional[ThreadPoolExecutor] = None
+_executors_lock = threading.Lock()
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    """Pool for CPU-bound stages (0 in settings = one thread per core)."""
+    global _cpu_executor
+    with _executors_lock:
+        if _cpu_executor is None:
+            _cpu_executor = ThreadPoolExecutor(
+                max_workers=settings.cpu_pool_workers or os.cpu_count() or 1,
+                thread_name_prefix="cpu-pool",
+            )
+        return _cpu_executor
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Pool for I/O-bound stages (S3, LLM)."""
+    global _io_executor
+    with _executors_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=settings.io_pool_workers,
+                thread_name_prefix="io-pool",
+            )
+        return _io_executor
+
+
+async def run_cpu_bound(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking CPU-bound call on the CPU pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_cpu_executor(), partial(func, *args, **kwargs)
+    )
+
+
+async def run_io_bound(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking I/O-bound call on the I/O pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_io_executor(), partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_executors() -> None:
+    """Stop both pools (called on app shutdown)."""
+    global _cpu_executor, _io_executor
+    with _executors_lock:
+        for executor in (_cpu_executor, _io_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        _cpu_executor = None
+        _io_executor = None
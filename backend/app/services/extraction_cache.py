@@ -0,0 +1,199 @@
+"""
+Content-addressed cache for LLM covenant extractions.
+
+The same agreement text sent with the same prompt to the same model gives us
+the same extraction, so there is no reason to pay for a second 50k-character
+Groq call. Entries are keyed by SHA-256 of (prompt version, model id, text).
+
+Two layers:
+- In-memory LRU with TTL (fast, per process)
+- Optional on-disk JSON files (survive restarts, shared by workers)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+
+
+def make_cache_key(
+    text: str, prompt_version: str, model_id: str, focus: str = ""
+) -> str:
+    """Hash everything that determines the extraction result."""
+    digest = hashlib.sha256()
+    # focus is only hashed when set, so whole-text keys stay unchanged
+    for part in (prompt_version, model_id, text) + ((focus,) if focus else ()):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class MemoryCacheBackend:
+    """Thread-safe LRU dict with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCacheBackend:
+    """
+    One JSON file per entry in a directory.
+
+    File mtime is the last-access time: reads touch it, expired files are
+    removed on read, and the least recently used files are pruned on write.
+    """
+
+    def __init__(self, directory: str, max_entries: int, ttl_seconds: int):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if entry.get("created_at", 0) + self.ttl_seconds < time.time():
+            path.unlink(missing_ok=True)
+            return None
+
+        os.utime(path)
+        return entry.get("value")
+
+    def set(self, key: str, value: dict) -> None:
+        # Write to a temp file and rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "value": value}, f)
+        os.replace(tmp_path, self._path(key))
+        self._prune()
+
+    def _prune(self) -> None:
+        files = list(self.directory.glob("*.json"))
+        if len(files) <= self.max_entries:
+            return
+
+        def mtime(path: Path) -> float:
+            try:
+                return path.stat().st_mtime
+            except FileNotFoundError:
+                return 0.0
+
+        files.sort(key=mtime)
+        for path in files[: len(files) - self.max_entries]:
+            path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        for path in self.directory.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+
+class ExtractionCache:
+    """Memory LRU in front of an optional disk backend."""
+
+    def __init__(self, memory: MemoryCacheBackend, disk: Optional[DiskCacheBackend]):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: dict) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+def _build_cache(directory: str) -> ExtractionCache:
+    """A cache with the extraction cache settings, on disk under `directory`."""
+    disk = None
+    if settings.extraction_cache_backend == "disk":
+        disk = DiskCacheBackend(
+            directory,
+            max_entries=settings.extraction_cache_max_entries,
+            ttl_seconds=settings.extraction_cache_ttl_seconds,
+        )
+    return ExtractionCache(
+        MemoryCacheBackend(
+            max_entries=settings.extraction_cache_max_entries,
+            ttl_seconds=settings.extraction_cache_ttl_seconds,
+        ),
+        disk,
+    )
+
+
+_extraction_cache: Optional[ExtractionCache] = None
+_stage_cache: Optional[ExtractionCache] = None
+_extraction_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Return the process-wide cache, built from settings on first use."""
+    global _extraction_cache
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = _build_cache(settings.extraction_cache_dir)
+        return _extraction_cache
+
+
+def get_stage_cache() -> ExtractionCache:
+    """
+    Outputs of memoized pipeline stages, keyed by stage key (see
+    workflows.stages). Same layers and limits as the extraction cache, in
+    its own directory.
+    """
+    global _stage_cache
+    with _extraction_cache_lock:
+        if _stage_cache is None:
+            _stage_cache = _build_cache(settings.stage_cache_dir)
+        return _stage_cache
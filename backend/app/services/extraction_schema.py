@@ -0,0 +1,217 @@
+"""
+Validation of the extraction model's answer against the agreement schemas.
+
+The parsed answer is validated item by item: each covenant as a
+CovenantDefinition, each add-back, deduction and cap as an EBITDAAdjustment
+or EBITDACap, and the rest of the EBITDA definition as an EBITDADefinition.
+
+Why not validate the whole answer as one CovenantExtractionOutput?
+- One covenant with a missing page would fail the whole extraction, and
+  the user would re-run the expensive call
+- Item by item, the valid items are kept and only the invalid ones, with
+  their errors, go back to the model (see pdf_extractor's re-ask)
+
+Valid items are stored as model dumps, so lenient input ("4.00:1", "Max",
+"290") comes out normalized (4.0, "max", 290).
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from pydantic import BaseModel, ValidationError
+
+from app.schemas.agreement import (
+    CovenantDefinition,
+    EBITDAAdjustment,
+    EBITDACap,
+    EBITDADefinition,
+)
+
+EBITDA_ITEM_MODELS: dict[str, type[BaseModel]] = {
+    "add_backs": EBITDAAdjustment,
+    "deductions": EBITDAAdjustment,
+    "caps": EBITDACap,
+}
+
+# "covenants[2]", "ebitda_definition", "ebitda_definition.caps[0]"
+_PATH = re.compile(
+    r"^(?:covenants\[(?P<covenant>\d+)\]"
+    r"|ebitda_definition(?:\.(?P<field>add_backs|deductions|caps)\[(?P<item>\d+)\])?)$"
+)
+
+
+@dataclass
+class InvalidItem:
+    """An item of the answer that failed validation."""
+
+    path: str
+    value: Any
+    errors: list[str]
+
+
+def _error_messages(error: ValidationError) -> list[str]:
+    return [
+        f"{'.'.join(str(part) for part in detail['loc']) or 'value'}: {detail['msg']}"
+        for detail in error.errors()
+    ]
+
+
+class ValidatedExtraction:
+    """
+    An extraction answer validated into the agreement schemas.
+
+    Args:
+        data: The parsed answer ({"ebitda_definition": ..., "covenants": ...})
+        partial: The answer covers one section only (a focused extraction),
+            so the EBITDA definition may lack its base metric; only its
+            add-backs, deductions and caps are validated
+
+    Invalid items are left out of `ebitda_definition` and `covenants` and
+    listed in `invalid` until fix() replaces them with a valid value. An
+    invalid EBITDA header only loses its failed fields (see
+    _validate_header).
+    """
+
+    def __init__(self, data: dict, partial: bool = False):
+        self.partial = partial
+        self.invalid: dict[str, InvalidItem] = {}
+
+        covenants = data.get("covenants") or []
+        if isinstance(covenants, dict):
+            covenants = [covenants]
+        elif not isinstance(covenants, list):
+            covenants = []
+        self._covenants: list[Optional[dict]] = [
+            self._validate(f"covenants[{index}]", CovenantDefinition, covenant)
+            for index, covenant in enumerate(covenants)
+        ]
+
+        definition = data.get("ebitda_definition")
+        self._has_ebitda = bool(definition)
+        self._ebitda_items: dict[str, list[Optional[dict]]] = {
+            field: [] for field in EBITDA_ITEM_MODELS
+        }
+        self._ebitda_header: Optional[dict] = None
+        if not self._has_ebitda:
+            return
+        if not isinstance(definition, dict):
+            self.invalid["ebitda_definition"] = InvalidItem(
+                "ebitda_definition", definition, ["value: must be an object"]
+            )
+            return
+
+        for field, model in EBITDA_ITEM_MODELS.items():
+            self._ebitda_items[field] = [
+                self._validate(f"ebitda_definition.{field}[{index}]", model, item)
+                for index, item in enumerate(definition.get(field) or [])
+            ]
+        header = {
+            key: value
+            for key, value in definition.items()
+            if key not in EBITDA_ITEM_MODELS
+        }
+        self._ebitda_header = (
+            header if partial else self._validate_header("ebitda_definition", header)
+        )
+
+    def _validate(
+        self, path: str, model: type[BaseModel], value: Any
+    ) -> Optional[dict]:
+        try:
+            validated = model.model_validate(value).model_dump()
+        except ValidationError as e:
+            self.invalid[path] = InvalidItem(path, value, _error_messages(e))
+            return None
+        self.invalid.pop(path, None)
+        return validated
+
+    def _validate_header(self, path: str, header: Any) -> dict:
+        """
+        The EBITDA definition without its item lists (validated apart).
+
+        An invalid header stays listed in `invalid`, but the fields that did
+        not fail are kept as given, so a definition missing its section_ref
+        still carries its valid add-backs, deductions and caps.
+        """
+        if isinstance(header, dict):
+            header = {
+                key: value
+                for key, value in header.items()
+                if key not in EBITDA_ITEM_MODELS
+            }
+        try:
+            validated = EBITDADefinition.model_validate(header).model_dump()
+        except ValidationError as e:
+            self.invalid[path] = InvalidItem(path, header, _error_messages(e))
+            if not isinstance(header, dict):
+                return {}
+            failed = {detail["loc"][0] for detail in e.errors() if detail["loc"]}
+            return {key: value for key, value in header.items() if key not in failed}
+        self.invalid.pop(path, None)
+        return {
+            key: value
+            for key, value in validated.items()
+            if key not in EBITDA_ITEM_MODELS
+        }
+
+    def fix(self, path: str, value: Any) -> bool:
+        """Replace the invalid item at `path`. True if the new value is valid."""
+        if path not in self.invalid:
+            return False
+        match = _PATH.match(path)
+        if match is None:
+            return False
+
+        if match["covenant"] is not None:
+            index = int(match["covenant"])
+            self._covenants[index] = self._validate(path, CovenantDefinition, value)
+            return self._covenants[index] is not None
+        if match["field"] is not None:
+            field, index = match["field"], int(match["item"])
+            self._ebitda_items[field][index] = self._validate(
+                path, EBITDA_ITEM_MODELS[field], value
+            )
+            return self._ebitda_items[field][index] is not None
+
+        self._ebitda_header = self._validate_header(path, value)
+        return path not in self.invalid
+
+    @property
+    def covenants(self) -> list[dict]:
+        return [covenant for covenant in self._covenants if covenant is not None]
+
+    @property
+    def ebitda_definition(self) -> Optional[dict]:
+        if not self._has_ebitda or self._ebitda_header is None:
+            return None
+        definition = dict(self._ebitda_header)
+        for field, items in self._ebitda_items.items():
+            definition[field] = [item for item in items if item is not None]
+        if not any(definition.values()):
+            # Nothing of it validated
+            return None
+        return definition
+
+    def errors(self) -> list[str]:
+        """Problems left, one line per invalid item."""
+        return [
+            f"{item.path}: {'; '.join(item.errors)}" for item in self.invalid.values()
+        ]
+
+
+def validate_piece(kind: str, value: Any) -> Optional[dict]:
+    """
+    A piece of a streamed answer ("covenant" or "ebitda_definition", see
+    json_stream), validated and normalized the way the whole answer will
+    be, or None if it fails.
+
+    /extract/stream only sends pieces that pass, so every covenant a client
+    is shown also appears, unchanged, in the final result.
+    """
+    if kind == "covenant":
+        covenants = ValidatedExtraction({"covenants": [value]}).covenants
+        return covenants[0] if covenants else None
+    if kind == "ebitda_definition":
+        return ValidatedExtraction({"ebitda_definition": value}).ebitda_definition
+    return None
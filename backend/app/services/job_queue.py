@@ -0,0 +1,344 @@
+"""
+In-process background jobs for extraction and code generation.
+
+/extract and /generate-code download, parse, embed, retrieve and call the
+LLM inside the HTTP request, which takes tens of seconds and runs into load
+balancer timeouts. POST /jobs instead records a job, puts it on a bounded
+queue and returns its id at once; GET /jobs/{id} reports status, per-stage
+progress and, when done, the result.
+
+Why not Celery/RQ?
+- No broker to deploy: job state lives in the same SQLite file (or memory)
+  as the agreements, and the heavy stages already run on the executors
+- Workers are asyncio tasks in the API process: they only orchestrate, so a
+  small number of them bounds how many pipelines run at once
+
+A job key (agreement_id:kind) makes submissions idempotent: while a job for
+the key is queued or running, submitting again returns that job.
+
+Active jobs belong to the process that queued them, which renews their
+heartbeat every job_heartbeat_seconds. A job is failed as interrupted when
+its process is known to be gone (same host, dead pid, or this very host:pid
+at startup, e.g. a restarted container whose server is PID 1 again), or when
+its heartbeat is older than job_lease_seconds (any host). Otherwise a
+crashed process would hold its job keys forever.
+
+Every job-store call goes through run_io_bound: SQLite waits up to its
+30 s busy timeout for a lock, which must not stall the event loop. The
+synchronous progress callback hands each stage snapshot to a write task
+that runs after the previous one, so stages are stored in order.
+"""
+
+import asyncio
+import copy
+import os
+import socket
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Sequence
+
+from fastapi.encoders import jsonable_encoder
+
+from app.config import settings
+from app.services.executors import run_io_bound
+from app.services.job_store import get_job_store
+
+JobRunner = Callable[[str, Callable[[str], None]], Awaitable]
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the bounded job queue has no room for another job."""
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+class JobQueue:
+    """
+    Bounded queue of pipeline runs, drained by a fixed set of worker tasks.
+
+    Args:
+        store: Job store (default: get_job_store())
+        workers: Pipelines run at once (default settings.job_workers)
+        max_pending: Queued jobs accepted before QueueFullError
+            (default settings.job_queue_max_pending)
+        heartbeat_seconds: How often this process renews its active jobs
+            (default settings.job_heartbeat_seconds)
+        lease_seconds: Age of a heartbeat after which a job is failed
+            (default settings.job_lease_seconds)
+    """
+
+    def __init__(
+        self,
+        store=None,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        heartbeat_seconds: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+    ):
+        self.store = store or get_job_store()
+        self.workers = workers or settings.job_workers
+        self.max_pending = max_pending or settings.job_queue_max_pending
+        self.heartbeat_seconds = heartbeat_seconds or settings.job_heartbeat_seconds
+        self.lease_seconds = lease_seconds or settings.job_lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._running = 0
+
+    async def start(self) -> None:
+        """Start the worker tasks (on app startup)."""
+        if self._tasks:
+            return
+        # Nothing has been queued yet, so active jobs carrying this host:pid
+        # were left by a previous process that had the same pid
+        await self._fail_interrupted(include_own=True)
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._heartbeat(), name="job-heartbeat"))
+
+    async def stop(self) -> None:
+        """Cancel the workers (on app shutdown); unfinished jobs are failed."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._fail_interrupted(include_own=True)
+
+    async def submit(
+        self,
+        agreement_id: str,
+        kind: str,
+        run: JobRunner,
+        stages: Sequence[str],
+    ) -> tuple[dict, bool]:
+        """
+        Record a job and queue it, or return the active job for the same key.
+
+        Args:
+            agreement_id: Agreement the pipeline runs for
+            kind: Pipeline name ("extract", "generate-code")
+            run: Coroutine function called as run(agreement_id, progress)
+            stages: Stage names the pipeline reports, in order
+
+        Returns:
+            (job, created); created is False for an existing active job
+
+        Raises:
+            QueueFullError: max_pending jobs are already waiting
+        """
+        if self._queue is None:
+            raise RuntimeError("Job queue is not started")
+
+        job_key = f"{agreement_id}:{kind}"
+        if self._queue.full():
+            # Still answer duplicate submissions of a job that is waiting
+            active = [
+                j
+                for j in await run_io_bound(self.store.list_active)
+                if j["job_key"] == job_key
+            ]
+            if active:
+                return active[0], False
+            raise QueueFullError(
+                f"Job queue is full ({self.max_pending} pending), retry later"
+            )
+
+        job, created = await self._create(
+            {
+                "job_id": f"job_{uuid.uuid4().hex[:16]}",
+                "job_key": job_key,
+                "agreement_id": agreement_id,
+                "kind": kind,
+                "status": "queued",
+                "stages": [
+                    {
+                        "name": name,
+                        "status": "pending",
+                        "started_at": None,
+                        "finished_at": None,
+                    }
+                    for name in stages
+                ],
+                "result": None,
+                "error": None,
+                "worker": self.worker_id,
+                "heartbeat_at": _now(),
+                "created_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+            }
+        )
+        if created:
+            self._queue.put_nowait((job["job_id"], run))
+        return job, created
+
+    async def _create(self, job: dict) -> tuple[dict, bool]:
+        """store.create, first failing an expired job that holds the key."""
+        existing, created = await run_io_bound(self.store.create, job)
+        if created or not self._expired(existing):
+            return existing, created
+        await self._fail(existing["job_id"])
+        return await run_io_bound(self.store.create, job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Current state of a job, or None."""
+        return await run_io_bound(self.store.get, job_id)
+
+    def stats(self) -> dict:
+        """Queue depth and busy workers, for /health."""
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_pending": self.max_pending,
+        }
+
+    async def _heartbeat(self) -> None:
+        """Renew this process's jobs and fail the ones whose process is gone."""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await run_io_bound(self.store.heartbeat, self.worker_id, _now())
+                await self._fail_interrupted()
+            except Exception:
+                # A busy database must not stop the heartbeat for good
+                traceback.print_exc()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, run = await self._queue.get()
+            self._running += 1
+            try:
+                await self._run(job_id, run)
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, run: JobRunner) -> None:
+        job = await run_io_bound(self.store.get, job_id)
+        if job is None:
+            return
+        stages = job["stages"]
+        last_write: list[Optional[asyncio.Task]] = [None]
+
+        def progress(stage: str) -> None:
+            """Mark `stage` running and the stage before it done."""
+            now = _now()
+            for entry in stages:
+                if entry["status"] == "running":
+                    entry["status"] = "done"
+                    entry["finished_at"] = now
+            for entry in stages:
+                if entry["name"] == stage and entry["status"] == "pending":
+                    entry["status"] = "running"
+                    entry["started_at"] = now
+                    break
+            last_write[0] = asyncio.ensure_future(
+                self._write_progress(last_write[0], job_id, copy.deepcopy(stages))
+            )
+
+        await run_io_bound(
+            self.store.update, job_id, status="running", started_at=_now()
+        )
+        try:
+            result = await run(job["agreement_id"], progress)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            error = str(e) or type(e).__name__
+            outcome = {"status": "failed", "error": error}
+        else:
+            outcome = {"status": "succeeded", "result": jsonable_encoder(result)}
+        if last_write[0] is not None:
+            # The final state must not be overwritten by a late progress write
+            await last_write[0]
+        await self._finish(job_id, stages, **outcome)
+
+    async def _write_progress(
+        self, previous: Optional[asyncio.Task], job_id: str, stages: list[dict]
+    ) -> None:
+        """Store a stage snapshot once the previous snapshot is stored."""
+        if previous is not None:
+            await previous
+        try:
+            await run_io_bound(self.store.update, job_id, stages=stages)
+        except Exception:
+            # Progress is informational: a busy database must not fail the job
+            traceback.print_exc()
+
+    async def _finish(
+        self, job_id: str, stages: list[dict], status: str, **fields
+    ) -> None:
+        now = _now()
+        for entry in stages:
+            if entry["status"] == "running":
+                entry["status"] = "done" if status == "succeeded" else "failed"
+                entry["finished_at"] = now
+            elif entry["status"] == "pending":
+                # Not needed (e.g. covenants already stored) or never reached
+                entry["status"] = "skipped"
+        await run_io_bound(
+            self.store.update,
+            job_id,
+            status=status,
+            stages=stages,
+            finished_at=now,
+            **fields,
+        )
+
+    async def _fail_interrupted(self, include_own: bool = False) -> None:
+        """Fail active jobs whose process is gone or whose lease expired."""
+        host = socket.gethostname()
+        for job in await run_io_bound(self.store.list_active):
+            if job.get("worker") == self.worker_id:
+                if include_own:
+                    await self._fail(job["job_id"])
+                continue
+            worker_host, _, pid = (job.get("worker") or "").rpartition(":")
+            if (worker_host == host and not _process_alive(pid)) or self._expired(job):
+                await self._fail(job["job_id"])
+
+    def _expired(self, job: dict) -> bool:
+        """Whether the job's heartbeat is older than the lease."""
+        if job.get("worker") == self.worker_id:
+            return False
+        renewed = job.get("heartbeat_at") or job.get("started_at") or job["created_at"]
+        age = datetime.utcnow() - datetime.fromisoformat(renewed)
+        return age > timedelta(seconds=self.lease_seconds)
+
+    async def _fail(self, job_id: str) -> None:
+        await run_io_bound(
+            self.store.update,
+            job_id,
+            status="failed",
+            error="Interrupted: the worker process stopped",
+            finished_at=_now(),
+        )
+
+
+def _process_alive(pid: str) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue (created on first use)."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
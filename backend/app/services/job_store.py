@@ -0,0 +1,178 @@
+"""
+Persistence for background jobs (see job_queue).
+
+Backends follow settings.storage_backend:
+- "sqlite": job state is visible to every uvicorn worker, so GET /jobs/{id}
+  works whichever worker answers, and the active-key index keeps two workers
+  from starting the same job
+- "memory": process-local, for tests and quick demos
+
+Jobs are plain dicts; `stages` is a list of {name, status, started_at,
+finished_at} dicts and `result` any JSON-serializable value.
+"""
+
+import copy
+import json
+import sqlite3
+import threading
+from typing import Optional
+
+from app.config import settings
+from app.database import get_connection, transaction
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Columns stored as JSON text in SQLite
+_JSON_FIELDS = ("stages", "result")
+
+
+class MemoryJobStore:
+    """Process-local job storage."""
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._active: dict[str, str] = {}  # job_key -> job_id
+        self._lock = threading.Lock()
+
+    def create(self, job: dict) -> tuple[dict, bool]:
+        """Insert a job unless one with its key is active; returns (job, created)."""
+        with self._lock:
+            active_id = self._active.get(job["job_key"])
+            if active_id is not None:
+                return copy.deepcopy(self._jobs[active_id]), False
+            self._jobs[job["job_id"]] = copy.deepcopy(job)
+            self._active[job["job_key"]] = job["job_id"]
+            return copy.deepcopy(job), True
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(copy.deepcopy(fields))
+            if job["status"] not in ACTIVE_STATUSES:
+                if self._active.get(job["job_key"]) == job_id:
+                    del self._active[job["job_key"]]
+
+    def heartbeat(self, worker: str, at: str) -> None:
+        """Renew the active jobs owned by worker."""
+        with self._lock:
+            for job_id in self._active.values():
+                if self._jobs[job_id]["worker"] == worker:
+                    self._jobs[job_id]["heartbeat_at"] = at
+
+    def list_active(self) -> list[dict]:
+        with self._lock:
+            return [
+                copy.deepcopy(self._jobs[job_id]) for job_id in self._active.values()
+            ]
+
+
+class SQLiteJobStore:
+    """Job storage in the shared SQLite database."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.sqlite_path
+
+    def create(self, job: dict) -> tuple[dict, bool]:
+        """Insert a job unless one with its key is active; returns (job, created)."""
+        row = {
+            key: json.dumps(value) if key in _JSON_FIELDS else value
+            for key, value in job.items()
+        }
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        try:
+            with transaction(self.path) as db:
+                db.execute(
+                    f"INSERT INTO jobs ({columns}) VALUES ({placeholders})",
+                    tuple(row.values()),
+                )
+            return job, True
+        except sqlite3.IntegrityError:
+            # Another request or worker already has this key queued/running
+            existing = self._get_active(job["job_key"])
+            if existing is None:
+                raise
+            return existing, False
+
+    def _get_active(self, job_key: str) -> Optional[dict]:
+        row = (
+            get_connection(self.path)
+            .execute(
+                f"SELECT * FROM jobs WHERE job_key = ? AND status IN "
+                f"({', '.join('?' for _ in ACTIVE_STATUSES)})",
+                (job_key, *ACTIVE_STATUSES),
+            )
+            .fetchone()
+        )
+        return self._row_to_job(row) if row is not None else None
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = (
+            get_connection(self.path)
+            .execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+            .fetchone()
+        )
+        return self._row_to_job(row) if row is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        values = [
+            json.dumps(value) if key in _JSON_FIELDS else value
+            for key, value in fields.items()
+        ]
+        with transaction(self.path) as db:
+            db.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*values, job_id)
+            )
+
+    def heartbeat(self, worker: str, at: str) -> None:
+        """Renew the active jobs owned by worker."""
+        with transaction(self.path) as db:
+            db.execute(
+                f"UPDATE jobs SET heartbeat_at = ? WHERE worker = ? AND status IN "
+                f"({', '.join('?' for _ in ACTIVE_STATUSES)})",
+                (at, worker, *ACTIVE_STATUSES),
+            )
+
+    def list_active(self) -> list[dict]:
+        rows = (
+            get_connection(self.path)
+            .execute(
+                f"SELECT * FROM jobs WHERE status IN "
+                f"({', '.join('?' for _ in ACTIVE_STATUSES)})",
+                ACTIVE_STATUSES,
+            )
+            .fetchall()
+        )
+        return [self._row_to_job(row) for row in rows]
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        for key in _JSON_FIELDS:
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """Return the job store for settings.storage_backend (created on first use)."""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            if settings.storage_backend == "memory":
+                _job_store = MemoryJobStore()
+            elif settings.storage_backend == "sqlite":
+                _job_store = SQLiteJobStore()
+            else:
+                raise ValueError(f"Unknown storage backend: {settings.storage_backend}")
+        return _job_store
@@ -0,0 +1,367 @@
+"""
+Incremental parsing of the extraction model's JSON while it streams.
+
+The extraction response is one JSON object:
+
+    {"ebitda_definition": {...}, "covenants": [{...}, {...}, ...]}
+
+Waiting for the closing brace means waiting for the whole generation. This
+parser is fed the text deltas as they arrive and reports each covenant the
+moment its object closes (and the EBITDA definition when its object closes),
+so /extract/stream can show the first covenant after a few seconds.
+
+It tracks only what it needs: nesting depth, whether it is inside a string,
+and the last key seen at the top level. Text before the first "{" (a
+```json fence, a sentence) is skipped.
+
+Model output is not always valid JSON: trailing commas, Python literals,
+single quotes, unescaped quotes inside legal text, or an answer cut off at
+the token limit. loads_lenient() parses the usual case with json.loads and
+only falls back to repair_json(), which rewrites the text into valid JSON in
+one pass, closing whatever was left open.
+"""
+
+import json
+import re
+from typing import Any, Iterator, Optional
+
+_LITERALS = {
+    "true": "true",
+    "True": "true",
+    "false": "false",
+    "False": "false",
+    "null": "null",
+    "None": "null",
+    "NaN": "null",
+    "undefined": "null",
+}
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_HEX = re.compile(r"[0-9a-fA-F]{4}")
+_ESCAPES = set('"\\/bfnrt')
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _json_start(text: str) -> int:
+    """Index of the first "{" or "[" in text."""
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        raise ValueError("No JSON object found in the response")
+    return min(starts)
+
+
+def loads_lenient(text: str) -> Any:
+    """
+    Parse the JSON value in a model response.
+
+    Fences and prose around the value are ignored. Valid JSON costs one
+    json.loads; anything else goes through repair_json.
+    """
+    start = _json_start(text)
+    end = text.rfind(_CLOSERS[text[start]])
+    if end > start:
+        try:
+            return json.loads(text[start : end + 1])
+        except json.JSONDecodeError:
+            pass
+    return json.loads(repair_json(text))
+
+
+def repair_json(text: str) -> str:
+    """
+    Rewrite the first JSON object or array in text as valid JSON.
+
+    Fixes what models get wrong: missing or trailing commas, single-quoted
+    strings, unquoted keys, Python/JS literals (True, None, NaN), comments,
+    raw newlines and unescaped quotes inside strings, and truncation (open
+    strings, objects and arrays are closed, a dangling key gets null).
+    """
+    return _JSONRepairer(text).run(_json_start(text))
+
+
+class _JSONRepairer:
+    """One pass over the text, tracking the open objects and arrays."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.out: list[str] = []
+        # [opener, state]: objects go key -> colon -> value -> after,
+        # arrays go value -> after
+        self.stack: list[list[str]] = []
+        # A "," was read; it is written only if another item follows
+        self.comma = False
+
+    def run(self, index: int) -> str:
+        text = self.text
+        while index < len(text):
+            char = text[index]
+            if char in "{[":
+                self._begin(keyable=False)
+                self.stack.append([char, "key" if char == "{" else "value"])
+                self.out.append(char)
+                index += 1
+            elif char in "}]":
+                index += 1
+                opener = "{" if char == "}" else "["
+                # A mismatched closer also closes what was left open inside
+                if any(frame[0] == opener for frame in self.stack):
+                    while True:
+                        frame = self.stack.pop()
+                        self._close(frame)
+                        if frame[0] == opener:
+                            break
+                    if not self.stack:
+                        break
+            elif char in "\"'":
+                is_key = self._begin(keyable=True)
+                index = self._string(index)
+                if not is_key:
+                    self._end_value()
+            elif char == ":":
+                frame = self.stack[-1] if self.stack else None
+                if frame is not None and frame[1] == "colon":
+                    self.out.append(":")
+                    frame[1] = "value"
+                index += 1
+            elif char == ",":
+                frame = self.stack[-1] if self.stack else None
+                if frame is not None and frame[1] == "after":
+                    frame[1] = "key" if frame[0] == "{" else "value"
+                    self.comma = True
+                index += 1
+            elif char in "-+.0123456789":
+                end = index
+                while end < len(text) and text[end] in "+-.0123456789eE":
+                    end += 1
+                match = _NUMBER.match(text[index:end].lstrip("+"))
+                self._begin(keyable=False)
+                self.out.append(match.group(0) if match else "null")
+                self._end_value()
+                index = end
+            elif char.isalpha() or char == "_":
+                end = index
+                while end < len(text) and (text[end].isalnum() or text[end] == "_"):
+                    end += 1
+                word = text[index:end]
+                is_key = self._begin(keyable=word not in _LITERALS)
+                self.out.append(_LITERALS.get(word) or json.dumps(word))
+                if not is_key:
+                    self._end_value()
+                index = end
+            elif text.startswith("//", index):
+                newline = text.find("\n", index)
+                index = len(text) if newline == -1 else newline
+            elif text.startswith("/*", index):
+                close = text.find("*/", index + 2)
+                index = len(text) if close == -1 else close + 2
+            else:
+                # Whitespace, and stray characters such as "..."
+                index += 1
+
+        while self.stack:
+            self._close(self.stack.pop())
+        return "".join(self.out)
+
+    def _begin(self, keyable: bool) -> bool:
+        """Start a key or value: add a missing "," or ":". True for a key."""
+        if not self.stack:
+            return False
+        frame = self.stack[-1]
+        if frame[1] == "after":
+            # Two items with no comma between them
+            self.comma = True
+            frame[1] = "key" if frame[0] == "{" else "value"
+        if self.comma:
+            self.out.append(",")
+            self.comma = False
+
+        if frame[0] == "{":
+            if frame[1] == "key":
+                if keyable:
+                    frame[1] = "colon"
+                    return True
+                self.out.append('"":')
+            elif frame[1] == "colon":
+                self.out.append(":")
+            frame[1] = "value"
+        return False
+
+    def _end_value(self) -> None:
+        if self.stack:
+            self.stack[-1][1] = "after"
+
+    def _close(self, frame: list[str]) -> None:
+        """Write the closer for frame, giving a dangling key a null value."""
+        self.comma = False
+        if frame[0] == "{":
+            if frame[1] == "colon":
+                self.out.append(":null")
+            elif frame[1] == "value":
+                self.out.append("null")
+        self.out.append(_CLOSERS[frame[0]])
+        self._end_value()
+
+    def _string(self, index: int) -> int:
+        """Copy the string starting at index as a JSON string; return its end."""
+        text = self.text
+        quote = text[index]
+        pieces = ['"']
+        index += 1
+        while index < len(text):
+            char = text[index]
+            if char == "\\":
+                following = text[index + 1 : index + 2]
+                if following == "u" and _HEX.fullmatch(text[index + 2 : index + 6]):
+                    pieces.append(text[index : index + 6])
+                    index += 6
+                    continue
+                if following == "'":
+                    pieces.append("'")
+                elif following in _ESCAPES and following:
+                    pieces.append("\\" + following)
+                elif following:
+                    pieces.append("\\\\" + following)
+                index += 2
+                continue
+            if char == quote and self._closes_string(index + 1, quote):
+                index += 1
+                break
+            if char == '"':
+                pieces.append('\\"')
+            elif char < " ":
+                pieces.append(json.dumps(char)[1:-1])
+            else:
+                pieces.append(char)
+            index += 1
+        pieces.append('"')
+        self.out.append("".join(pieces))
+        return index
+
+    def _closes_string(self, index: int, quote: str = '"') -> bool:
+        """
+        Whether a quote ends its string, judged by what follows it.
+
+        Legal text quotes defined terms ("the "Borrower" shall") and uses
+        apostrophes ('the Borrower's'); a quote followed by anything but
+        , : } ] (or a new line and the next key) is taken as part of the text.
+        """
+        rest = self.text[index:]
+        stripped = rest.lstrip()
+        if not stripped or stripped[0] in ",:}]":
+            return True
+        return stripped[0] in ('"', quote) and "\n" in rest[: len(rest) - len(stripped)]
+
+
+class ExtractionStreamParser:
+    """
+    Feed text deltas, get back completed (key, value) pieces.
+
+    Yields ("ebitda_definition", dict) once and ("covenant", dict) per
+    covenant, each as soon as its closing brace has been seen.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+        # Last string at depth 1 and whether a ":" followed it (= it is a key)
+        self._last_string_start: Optional[int] = None
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._in_covenants = False
+        self._object_start: Optional[int] = None
+
+    def feed(self, delta: str) -> Iterator[tuple[str, dict]]:
+        """Consume a chunk of model output and yield completed pieces."""
+        self._buffer += delta
+
+        while self._position < len(self._buffer):
+            index = self._position
+            char = self._buffer[index]
+            self._position += 1
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._last_string_start is not None:
+                        self._last_string = self._buffer[
+                            self._last_string_start : index + 1
+                        ]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._last_string_start = index if self._depth == 1 else None
+            elif char == ":" and self._depth == 1 and self._last_string is not None:
+                try:
+                    self._current_key = json.loads(self._last_string)
+                except json.JSONDecodeError:
+                    self._current_key = None
+                self._last_string = None
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2:
+                    self._in_covenants = self._current_key == "covenants"
+                elif char == "{" and (
+                    (self._depth == 2 and self._current_key == "ebitda_definition")
+                    or (self._depth == 3 and self._in_covenants)
+                ):
+                    self._object_start = index
+            elif char in "}]":
+                self._depth -= 1
+                if char == "}" and self._object_start is not None:
+                    if (self._depth == 1 and not self._in_covenants) or (
+                        self._depth == 2 and self._in_covenants
+                    ):
+                        piece = self._decode(self._object_start, index + 1)
+                        self._object_start = None
+                        if piece is not None:
+                            kind = (
+                                "covenant" if self._in_covenants else self._current_key
+                            )
+                            yield kind, piece
+                if self._depth == 1:
+                    self._in_covenants = False
+                    self._current_key = None
+                if self._depth == 0:
+                    self._started = False
+            elif char == "," and self._depth == 1:
+                self._current_key = None
+
+        self._compact()
+
+    def _decode(self, start: int, end: int) -> Optional[dict]:
+        try:
+            value = loads_lenient(self._buffer[start:end])
+        except ValueError:
+            return None
+        return value if isinstance(value, dict) else None
+
+    def _compact(self) -> None:
+        """Drop consumed text that no open object or key string still needs."""
+        keep_from = self._position
+        if self._object_start is not None:
+            keep_from = min(keep_from, self._object_start)
+        if self._in_string and self._last_string_start is not None:
+            keep_from = min(keep_from, self._last_string_start)
+        if keep_from == 0:
+            return
+
+        self._buffer = self._buffer[keep_from:]
+        self._position -= keep_from
+        if self._object_start is not None:
+            self._object_start -= keep_from
+        if self._last_string_start is not None:
+            self._last_string_start -= keep_from
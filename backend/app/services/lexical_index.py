@@ -0,0 +1,188 @@
+"""
+BM25 keyword index kept alongside each Chroma collection.
+
+MiniLM embeddings are good at paraphrases but weak on exact legal terms:
+"Senior Secured Net Leverage Ratio", "Consolidated EBITDA" or a clause
+number like "24.2" can rank below vaguely similar boilerplate. A BM25 index
+over the same chunks finds those verbatim, and RAGService fuses both
+rankings (reciprocal rank fusion) in get_relevant_text.
+
+The index is an inverted index (term -> chunk id -> term frequency) saved as
+JSON next to the Chroma directory, so it reloads without re-tokenizing.
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+# Keeps clause numbers like "24.2" and "22.1.3" as single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and any are as at be by for from has have in is it its of on or "
+    "such that the this to was which with".split()
+)
+
+INDEX_FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word and clause-number tokens, without stopwords."""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a document's chunks, updated as chunks are added/removed.
+
+    Args:
+        k1: Term frequency saturation
+        b: Length normalisation (0 = none, 1 = full)
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.signature: dict = {}
+        self._postings: dict[str, dict[str, int]] = {}
+        self._lengths: dict[str, int] = {}
+        # Distinct terms per chunk, so removal only touches its own postings
+        self._chunk_terms: dict[str, list[str]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._lengths
+
+    def add(self, chunk_id: str, text: str) -> None:
+        """Index one chunk (replacing it if already present)."""
+        tokens = tokenize(text)
+        frequencies: dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+
+        with self._lock:
+            self._remove_locked(chunk_id)
+            for token, count in frequencies.items():
+                self._postings.setdefault(token, {})[chunk_id] = count
+            self._lengths[chunk_id] = len(tokens)
+            self._chunk_terms[chunk_id] = list(frequencies)
+            self._total_length += len(tokens)
+
+    def remove(self, chunk_id: str) -> None:
+        """Drop one chunk from the index, if present."""
+        with self._lock:
+            self._remove_locked(chunk_id)
+
+    def _remove_locked(self, chunk_id: str) -> None:
+        length = self._lengths.pop(chunk_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for token in self._chunk_terms.pop(chunk_id, []):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[token]
+
+    def search(self, query: str, n_results: int = 10) -> list[tuple[str, float]]:
+        """Top chunks for a query as (chunk_id, score), best first."""
+        terms = set(tokenize(query))
+
+        with self._lock:
+            count = len(self._lengths)
+            if not count or not terms:
+                return []
+            average_length = self._total_length / count or 1.0
+
+            scores: dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(
+                    1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for chunk_id, frequency in postings.items():
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._lengths[chunk_id] / average_length
+                    )
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * (
+                        frequency * (self.k1 + 1) / (frequency + norm)
+                    )
+
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    def save(self, path: Path) -> None:
+        """Write the index as JSON (atomically, via a temp file and rename)."""
+        with self._lock:
+            payload = {
+                "version": INDEX_FORMAT_VERSION,
+                "signature": self.signature,
+                "lengths": self._lengths,
+                "postings": self._postings,
+            }
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        """Read a saved index; None if missing, corrupt or an old format."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if payload.get("version") != INDEX_FORMAT_VERSION:
+            return None
+
+        index = cls()
+        index.signature = payload.get("signature") or {}
+        index._lengths = payload["lengths"]
+        index._postings = payload["postings"]
+        index._total_length = sum(index._lengths.values())
+        for token, postings in index._postings.items():
+            for chunk_id in postings:
+                index._chunk_terms.setdefault(chunk_id, []).append(token)
+        return index
+
+    @classmethod
+    def build(cls, chunks: Iterable[tuple[str, str]]) -> "BM25Index":
+        """Index (chunk_id, text) pairs from scratch."""
+        index = cls()
+        for chunk_id, text in chunks:
+            index.add(chunk_id, text)
+        return index
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[list[str]], k: int = 60
+) -> list[tuple[str, float]]:
+    """
+    Fuse several rankings of ids: score = sum of 1 / (k + rank).
+
+    Why RRF?
+    - Cosine similarities and BM25 scores live on unrelated scales
+    - Ranks are comparable, and k dampens the weight of the very top ranks
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
@@ -7,12 +7,113 @@ This service handles:
 3. Finding Section 22 (Definitions) where covenants live
 """
 
+import hashlib
+import mmap
+import multiprocessing
+import os
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from io import BytesIO
-from typing import Optional
+from typing import BinaryIO, Iterator, Optional, Union
 
 from PyPDF2 import PdfReader
 
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class ParsedDocument:
+    """
+    A PDF parsed once: the text of every page plus its content hash.
+
+    Why keep this around?
+    - A 350-page agreement takes seconds to extract with PyPDF2
+    - Upload, /extract and /generate-code all need the same page texts
+    - Agreements never change once uploaded, so the hash is a safe cache key
+    """
+
+    content_hash: str
+    page_texts: tuple[str, ...]
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_texts)
+
+    def text(self, start_page: int = 1, end_page: Optional[int] = None) -> str:
+        """Join pages (1-indexed, inclusive) with [PAGE n] markers."""
+        if end_page is None:
+            end_page = self.page_count
+
+        return "\n\n".join(
+            f"[PAGE {page_num + 1}]\n{self.page_texts[page_num]}"
+            for page_num in range(max(start_page - 1, 0), min(end_page, self.page_count))
+        )
+
+
+# Parsed documents keyed by SHA-256 of the PDF bytes (least recently used first)
+_parsed_documents: "OrderedDict[str, ParsedDocument]" = OrderedDict()
+_parsed_documents_lock = threading.Lock()
+
+
+def compute_content_hash(pdf_bytes: bytes) -> str:
+    """SHA-256 hex digest used to identify a PDF by its content."""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+# Common headings for the definitions clause, in priority order
+DEFINITIONS_HEADINGS = [
+    "Section 22",
+    "Definitions",
+    "Interpretation and Definitions",
+]
+
+
+def definitions_headings() -> list[str]:
+    """Default definitions headings plus any configured extras."""
+    extras = [
+        heading.strip()
+        for heading in settings.definitions_extra_headings.split(",")
+        if heading.strip()
+    ]
+    return DEFINITIONS_HEADINGS + extras
+
+
+def clear_parse_cache() -> None:
+    """Drop all cached parsed documents (useful for testing)."""
+    with _parsed_documents_lock:
+        _parsed_documents.clear()
+
+
+# Each process-pool worker opens the PDF once and keeps its own reader
+_worker_reader: Optional[PdfReader] = None
+
+
+def _init_extraction_worker(pdf_bytes: bytes) -> None:
+    """Process-pool initializer: build this worker's PdfReader."""
+    global _worker_reader
+    _worker_reader = PdfReader(BytesIO(pdf_bytes))
+
+
+def _extract_page_range(start: int, end: int) -> list[str]:
+    """Extract pages [start, end) (0-indexed) with the worker's reader."""
+    return [_worker_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _open_reader(source: Union[bytes, mmap.mmap, BinaryIO]) -> PdfReader:
+    """PdfReader over bytes, a memory map (see S3Service.open_file) or a file."""
+    if isinstance(source, (bytes, bytearray)):
+        return PdfReader(BytesIO(source))
+    source.seek(0)
+    return PdfReader(source)
+
+
+def extraction_worker_count() -> int:
+    """Configured worker processes for page extraction (0 = one per core)."""
+    return settings.pdf_extraction_workers or os.cpu_count() or 1
+
 
 class PDFService:
     """
@@ -23,32 +124,171 @@ class PDFService:
     2. We extract text from the PDF
     3. We find Section 22 (Definitions)
     4. We pass that text to the AI agent for covenant extraction
+
+    Every method is served from a single parse per PDF (see `parse`).
     """
 
-    def extract_text_from_bytes(self, pdf_bytes: bytes) -> str:
+    def parse(self, pdf_bytes: Union[bytes, mmap.mmap]) -> ParsedDocument:
         """
-        Extract all text from a PDF file.
+        Parse a PDF once and cache the result by content hash.
 
         Args:
-            pdf_bytes: Raw bytes of the PDF file
+            pdf_bytes: Raw bytes of the PDF file, or a memory map of it
 
         Returns:
-            Full text content of the PDF
+            ParsedDocument with page texts, page count and content hash
+        """
+        content_hash = compute_content_hash(pdf_bytes)
+
+        cached = self._get_cached(content_hash)
+        if cached is not None:
+            return cached
+
+        return self._parse_and_cache(pdf_bytes, content_hash)
+
+    def parse_file(self, fileobj: BinaryIO, content_hash: str) -> ParsedDocument:
+        """
+        Parse a PDF straight from a seekable file, e.g. an upload's temp file.
+
+        Args:
+            fileobj: Binary file positioned anywhere (it is rewound)
+            content_hash: SHA-256 of the file, already computed while streaming
+
+        Returns:
+            ParsedDocument, cached under content_hash like `parse`
+
+        Why a file instead of bytes?
+        - The upload route never holds the whole PDF in memory
+        - PdfReader reads pages from the file as it goes
+        """
+        cached = self._get_cached(content_hash)
+        if cached is not None:
+            return cached
+
+        fileobj.seek(0)
+        return self._parse_and_cache(fileobj, content_hash)
+
+    def _parse_and_cache(
+        self, source: Union[bytes, mmap.mmap, BinaryIO], content_hash: str
+    ) -> ParsedDocument:
+        # Parse outside the lock so other documents are not blocked
+        document = ParsedDocument(
+            content_hash=content_hash,
+            page_texts=self._extract_page_texts(source),
+        )
+
+        with _parsed_documents_lock:
+            _parsed_documents[content_hash] = document
+            _parsed_documents.move_to_end(content_hash)
+            while len(_parsed_documents) > settings.pdf_cache_max_documents:
+                _parsed_documents.popitem(last=False)
+
+        return document
+
+    def get_parsed(self, content_hash: str) -> Optional[ParsedDocument]:
+        """The parsed document for a content hash, if it is still cached."""
+        return self._get_cached(content_hash)
+
+    def _get_cached(self, content_hash: str) -> Optional[ParsedDocument]:
+        """Look up a parsed document and mark it as recently used."""
+        with _parsed_documents_lock:
+            cached = _parsed_documents.get(content_hash)
+            if cached is not None:
+                _parsed_documents.move_to_end(content_hash)
+            return cached
+
+    def iter_pages(
+        self, pdf_bytes: Union[bytes, mmap.mmap]
+    ) -> Iterator[tuple[int, str]]:
+        """
+        Lazily yield (page_number, text) for every page (1-indexed).
+
+        Args:
+            pdf_bytes: Raw bytes of the PDF file, or a memory map of it
+
+        Yields:
+            One (page_number, page_text) tuple at a time
+
+        Why a generator?
+        - Consumers like RAGService can chunk and embed page by page
+        - Only a window of pages is in memory instead of the whole document
+        - Already parsed documents are served straight from the cache
+        """
+        cached = self._get_cached(compute_content_hash(pdf_bytes))
+        if cached is not None:
+            yield from enumerate(cached.page_texts, start=1)
+            return
+
+        reader = _open_reader(pdf_bytes)
+        for page_num, page in enumerate(reader.pages, start=1):
+            yield page_num, page.extract_text() or ""
+
+    def _extract_page_texts(
+        self, source: Union[bytes, mmap.mmap, BinaryIO]
+    ) -> tuple[str, ...]:
+        """
+        Run PyPDF2 over every page, in parallel for large documents.
 
         Why BytesIO?
         - PdfReader expects a file-like object
-        - BytesIO wraps bytes to behave like a file
+        - BytesIO wraps bytes to behave like a file; files and memory maps
+          are read directly
+        """
+        reader = _open_reader(source)
+        page_count = len(reader.pages)
+        workers = min(extraction_worker_count(), page_count)
+
+        if workers <= 1 or page_count < settings.pdf_parallel_min_pages:
+            return tuple(page.extract_text() or "" for page in reader.pages)
+
+        # Worker processes each need their own copy of the bytes anyway
+        if not isinstance(source, (bytes, bytearray)):
+            source.seek(0)
+            source = source.read()
+
+        return tuple(self._extract_page_texts_parallel(source, page_count, workers))
+
+    def _extract_page_texts_parallel(
+        self, pdf_bytes: bytes, page_count: int, workers: int
+    ) -> list[str]:
         """
-        pdf_file = BytesIO(pdf_bytes)
-        reader = PdfReader(pdf_file)
+        Split the pages into ranges and extract them across a process pool.
 
-        text_content = []
-        for page_num, page in enumerate(reader.pages):
-            page_text = page.extract_text() or ""
-            # Add page markers for traceability
-            text_content.append(f"[PAGE {page_num + 1}]\n{page_text}")
+        Why processes?
+        - PyPDF2 is pure Python, so threads would serialize on the GIL
+        - Each worker receives the bytes once (initializer) and keeps one reader
 
-        return "\n\n".join(text_content)
+        Ranges are smaller than page_count / workers so that slow, dense pages
+        don't leave the other workers idle; results come back in page order.
+        """
+        range_size = max(1, -(-page_count // (workers * 4)))
+        starts = list(range(0, page_count, range_size))
+        ends = [min(start + range_size, page_count) for start in starts]
+
+        # "spawn" avoids forking a process that already runs server threads
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_extraction_worker,
+            initargs=(pdf_bytes,),
+        ) as pool:
+            page_texts = []
+            for texts in pool.map(_extract_page_range, starts, ends):
+                page_texts.extend(texts)
+
+        return page_texts
+
+    def extract_text_from_bytes(self, pdf_bytes: bytes) -> str:
+        """
+        Extract all text from a PDF file.
+
+        Args:
+            pdf_bytes: Raw bytes of the PDF file
+
+        Returns:
+            Full text content of the PDF, with [PAGE n] markers for traceability
+        """
+        return self.parse(pdf_bytes).text()
 
     def extract_pages(self, pdf_bytes: bytes, start_page: int, end_page: int) -> str:
         """
@@ -66,17 +306,7 @@ class PDFService:
         - Section 22 (Definitions) is typically pages 280-320
         - We don't need to process the entire 350-page document
         """
-        pdf_file = BytesIO(pdf_bytes)
-        reader = PdfReader(pdf_file)
-
-        text_content = []
-        # Convert to 0-indexed
-        for page_num in range(start_page - 1, min(end_page, len(reader.pages))):
-            page = reader.pages[page_num]
-            page_text = page.extract_text() or ""
-            text_content.append(f"[PAGE {page_num + 1}]\n{page_text}")
-
-        return "\n\n".join(text_content)
+        return self.parse(pdf_bytes).text(start_page, end_page)
 
     def get_page_count(self, pdf_bytes: bytes) -> int:
         """
@@ -88,9 +318,7 @@ class PDFService:
         Returns:
             Number of pages
         """
-        pdf_file = BytesIO(pdf_bytes)
-        reader = PdfReader(pdf_file)
-        return len(reader.pages)
+        return self.parse(pdf_bytes).page_count
 
     def find_section(self, pdf_bytes: bytes, section_name: str) -> Optional[dict]:
         """
@@ -108,17 +336,13 @@ class PDFService:
         - Section 22 contains all covenant definitions
         - Finding it automatically saves manual searching
         """
-        pdf_file = BytesIO(pdf_bytes)
-        reader = PdfReader(pdf_file)
-
+        document = self.parse(pdf_bytes)
         section_pattern = re.compile(rf"{re.escape(section_name)}", re.IGNORECASE)
 
         found_pages = []
         section_text = []
 
-        for page_num, page in enumerate(reader.pages):
-            page_text = page.extract_text() or ""
-
+        for page_num, page_text in enumerate(document.page_texts):
             if section_pattern.search(page_text):
                 found_pages.append(page_num + 1)
                 section_text.append(f"[PAGE {page_num + 1}]\n{page_text}")
@@ -134,7 +358,68 @@ class PDFService:
             "text": "\n\n".join(section_text),
         }
 
-    def extract_definitions_section(self, pdf_bytes: bytes) -> dict:
+    def locate_sections(
+        self, pdf_bytes: bytes, headings: Optional[list[str]] = None
+    ) -> dict[str, dict]:
+        """
+        Find every candidate heading in a single pass over the pages.
+
+        Args:
+            pdf_bytes: Raw bytes of the PDF file
+            headings: Headings to look for (defaults to DEFINITIONS_HEADINGS
+                plus settings.definitions_extra_headings)
+
+        Returns:
+            Dict of heading -> {"section_name", "pages", "start_page", "end_page"}
+            for each heading that appears at least once
+
+        Why one combined pattern?
+        - Looping find_section over five names scans a 350-page PDF five times
+        - A single alternation regex visits each page exactly once
+        """
+        if headings is None:
+            headings = definitions_headings()
+        return self._locate_headings(self.parse(pdf_bytes), headings)
+
+    def _locate_headings(
+        self, document: ParsedDocument, headings: list[str]
+    ) -> dict[str, dict]:
+        """Single-pass heading scan over an already parsed document."""
+        # Case-insensitive matching makes "SECTION 22" the same as "Section 22"
+        by_key: dict[str, str] = {}
+        for heading in headings:
+            by_key.setdefault(heading.lower(), heading)
+
+        # Longest first so "Interpretation and Definitions" wins over "Definitions"
+        # at the same position; the lookahead lets overlapping headings all match.
+        alternatives = sorted(by_key, key=len, reverse=True)
+        pattern = re.compile(
+            "(?=(" + "|".join(re.escape(key) for key in alternatives) + "))",
+            re.IGNORECASE,
+        )
+
+        pages_by_key: dict[str, list[int]] = {}
+        for page_num, page_text in enumerate(document.page_texts):
+            page_keys = set()
+            for match in pattern.finditer(page_text):
+                matched = match.group(1).lower()
+                # Shorter headings that are a prefix of the match also occur here
+                page_keys.update(key for key in alternatives if matched.startswith(key))
+
+            for key in page_keys:
+                pages_by_key.setdefault(key, []).append(page_num + 1)
+
+        return {
+            by_key[key]: {
+                "section_name": by_key[key],
+                "pages": pages,
+                "start_page": pages[0],
+                "end_page": pages[-1],
+            }
+            for key, pages in pages_by_key.items()
+        }
+
+    def extract_definitions_section(self, pdf: Union[bytes, ParsedDocument]) -> dict:
         """
         Specifically extract Section 22 (Definitions) from an LMA agreement.
 
@@ -144,29 +429,43 @@ class PDFService:
         - Leverage Ratio definition
         - All add-backs and caps
 
+        Args:
+            pdf: Raw bytes of the PDF file, or an already parsed document
+
         Returns:
-            Dict with definitions text and metadata
-        """
-        # Try common section names for definitions
-        section_names = [
-            "Section 22",
-            "SECTION 22",
-            "Definitions",
-            "DEFINITIONS",
-            "Interpretation and Definitions",
-        ]
-
-        for section_name in section_names:
-            result = self.find_section(pdf_bytes, section_name)
-            if result:
-                return {
-                    "found": True,
-                    "section": result["section_name"],
-                    "start_page": result["start_page"],
-                    "end_page": result["end_page"],
-                    "page_count": len(result["pages"]),
-                    "text": result["text"],
-                }
+            Dict with definitions text and metadata. "hits" holds the page
+            range of every candidate heading that was found.
+        """
+        document = pdf if isinstance(pdf, ParsedDocument) else self.parse(pdf)
+        headings = definitions_headings()
+        hits = self._locate_headings(document, headings)
+
+        if hits:
+            # Score by heading priority first, then by how many pages it covers
+            priority = {heading: rank for rank, heading in enumerate(headings)}
+            best = min(
+                hits.values(),
+                key=lambda hit: (priority[hit["section_name"]], -len(hit["pages"])),
+            )
+            return {
+                "found": True,
+                "section": best["section_name"],
+                "start_page": best["start_page"],
+                "end_page": best["end_page"],
+                "page_count": len(best["pages"]),
+                "text": "\n\n".join(
+                    f"[PAGE {page}]\n{document.page_texts[page - 1]}"
+                    for page in best["pages"]
+                ),
+                "hits": {
+                    name: {
+                        "start_page": hit["start_page"],
+                        "end_page": hit["end_page"],
+                        "pages": hit["pages"],
+                    }
+                    for name, hit in hits.items()
+                },
+            }
 
         # If no specific section found, return full document
         # (let the AI agent figure it out)
@@ -174,7 +473,8 @@ class PDFService:
             "found": False,
             "section": "Full Document",
             "start_page": 1,
-            "end_page": self.get_page_count(pdf_bytes),
-            "page_count": self.get_page_count(pdf_bytes),
-            "text": self.extract_text_from_bytes(pdf_bytes),
+            "end_page": document.page_count,
+            "page_count": document.page_count,
+            "text": document.text(),
+            "hits": {},
         }
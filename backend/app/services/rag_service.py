@@ -1,21 +1,75 @@
 """RAG service for document indexing and semantic search using ChromaDB."""
 
 import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
 
 import chromadb
+from chromadb.errors import NotFoundError
 from chromadb.utils import embedding_functions
 
+from app.config import settings
+from app.services.chunking import ClauseChunker
+from app.services.context_packer import pack_context
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
+
+
+def chunk_id(text: str, occurrences: dict[str, int]) -> str:
+    """
+    Content-derived chunk id: the same text always gets the same id.
+
+    Why not chunk_0, chunk_1, ...?
+    - An amendment that changes one clause shifts every later position
+    - With content ids, unchanged chunks keep their id (and embedding) and
+      only new or edited text has to be embedded again
+
+    `occurrences` counts ids already issued for this document, so repeated
+    boilerplate chunks still get distinct ids ("<hash>", "<hash>-1", ...).
+    """
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+    seen = occurrences.get(digest, 0)
+    occurrences[digest] = seen + 1
+    return digest if seen == 0 else f"{digest}-{seen}"
+
 
 class RAGService:
-    """Vector store service for indexing and querying large documents."""
+    """Vector store service for indexing and querying large documents.
+
+    One instance is shared by the whole process (see get_rag_service): it owns
+    the Chroma client and the loaded embedding model, both of which are
+    expensive to create.
+    """
 
-    def __init__(self, persist_directory: str = "./chroma_db"):
-        self.client = chromadb.PersistentClient(path=persist_directory)
+    def __init__(
+        self,
+        persist_directory: Optional[str] = None,
+        model_name: Optional[str] = None,
+    ):
+        self.client = chromadb.PersistentClient(
+            path=persist_directory or settings.chroma_persist_directory
+        )
         self.embedding_function = (
             embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name="all-MiniLM-L6-v2"
+                model_name=model_name or settings.embedding_model_name
             )
         )
+        # Guards the per-document lock table below
+        self._locks_guard = threading.Lock()
+        # One lock per document so concurrent requests don't index it twice
+        self._document_locks: dict[str, threading.Lock] = {}
+        # Opened collections by name, reused across queries
+        self._collections: dict = {}
+        # BM25 indexes by collection name (persisted in lexical_index_dir)
+        self._lexical_indexes: dict[str, BM25Index] = {}
+
+    def warm_up(self) -> None:
+        """Load the embedding model and run one forward pass before traffic."""
+        self.embedding_function(["warm up"])
+
+    def _document_lock(self, document_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._document_locks.setdefault(document_id, threading.Lock())
 
     def create_collection(self, collection_name: str):
         """Create or get a collection for storing document chunks."""
@@ -29,15 +83,73 @@ class RAGService:
         self, text: str, chunk_size: int = 2000, overlap: int = 200
     ) -> list[dict]:
         """Split text into overlapping chunks for embedding."""
-        chunks = []
+        return list(self.iter_chunks([text], chunk_size=chunk_size, overlap=overlap))
+
+    def chunk_pages(
+        self, pages: Iterable[tuple[int, str]], overlap: int = 200
+    ) -> Iterator[dict]:
+        """Chunk a stream of (page_number, text) pages lazily.
+
+        Offsets match chunk_text() over the [PAGE n]-joined full text, but only
+        about one chunk of text is buffered at a time. With the default
+        settings.rag_chunker = "clause", chunks follow clause and definition
+        boundaries and carry page spans (see app.services.chunking); "window"
+        keeps the fixed-size windows. Either way chunks are at most
+        settings.rag_chunk_max_chars long.
+        """
+        if settings.rag_chunker == "clause":
+            chunker = ClauseChunker(
+                max_chars=settings.rag_chunk_max_chars,
+                min_chars=settings.rag_chunk_min_chars,
+                overlap=overlap,
+            )
+            occurrences: dict[str, int] = {}
+            return (
+                {"id": chunk_id(chunk["text"], occurrences), **chunk}
+                for chunk in chunker.chunk_pages(pages)
+            )
+
+        # Same layout as PDFService: "[PAGE n]\n<text>" joined by blank lines
+        pieces = (
+            ("\n\n" if i else "") + f"[PAGE {page_num}]\n{page_text}"
+            for i, (page_num, page_text) in enumerate(pages)
+        )
+        return self.iter_chunks(
+            pieces, chunk_size=settings.rag_chunk_max_chars, overlap=overlap
+        )
+
+    def iter_chunks(
+        self, pieces: Iterable[str], chunk_size: int = 2000, overlap: int = 200
+    ) -> Iterator[dict]:
+        """Yield overlapping chunks from text arriving in consecutive pieces.
+
+        The overlap is capped at a quarter of chunk_size, so each chunk starts
+        at least that far past the previous one.
+        """
+        overlap = min(overlap, chunk_size // 4)
+        pieces = iter(pieces)
+        buffer = ""  # text[buffer_start:], everything before it was already chunked
+        buffer_start = 0
+        exhausted = False
         start = 0
-        chunk_id = 0
+        occurrences: dict[str, int] = {}
+
+        while True:
+            # Buffer one char past the window so we know whether more text follows
+            while not exhausted and buffer_start + len(buffer) <= start + chunk_size:
+                try:
+                    buffer += next(pieces)
+                except StopIteration:
+                    exhausted = True
+
+            text_length = buffer_start + len(buffer)
+            if start >= text_length:
+                break
 
-        while start < len(text):
             end = start + chunk_size
-            chunk_text = text[start:end]
+            chunk_text = buffer[start - buffer_start : end - buffer_start]
 
-            if end < len(text):
+            if end < text_length:
                 for boundary in [". ", ".\n", "\n\n", "\n"]:
                     last_boundary = chunk_text.rfind(boundary)
                     if last_boundary > chunk_size * 0.5:
@@ -54,109 +166,501 @@ class RAGService:
                 except ValueError:
                     pass
 
-            chunks.append(
-                {
-                    "id": f"chunk_{chunk_id}",
-                    "text": chunk_text,
-                    "start_char": start,
-                    "end_char": end,
-                    "page": page_num,
-                }
-            )
+            yield {
+                "id": chunk_id(chunk_text, occurrences),
+                "text": chunk_text,
+                "start_char": start,
+                "end_char": end,
+                "page": page_num,
+            }
 
-            chunk_id += 1
             start = end - overlap
 
-        return chunks
+            # Drop text that no later chunk can reach
+            if start > buffer_start:
+                buffer = buffer[start - buffer_start :]
+                buffer_start = start
 
     def index_document(self, document_id: str, text: str) -> int:
         """Index a document into the vector store. Returns number of chunks."""
+        return self._index_chunks(document_id, lambda: self.chunk_text(text))
+
+    def index_pages(
+        self,
+        document_id: str,
+        pages: Iterable[tuple[int, str]],
+        batch_size: int = 64,
+        content_hash: Optional[str] = None,
+    ) -> int:
+        """Index a stream of (page_number, text) pages. Returns number of chunks.
+
+        Chunks are embedded and added batch by batch, so peak memory is bounded
+        by a window of pages rather than the whole document. If the document is
+        already indexed the page stream is never consumed.
+
+        Args:
+            content_hash: Hash of the source PDF. If the document was indexed
+                from different content (an amendment or restatement uploaded
+                through POST /upload/{agreement_id}), it is re-indexed
+                incrementally, see reindex_pages.
+        """
+        return self._index_chunks(
+            document_id,
+            lambda: self.chunk_pages(pages),
+            batch_size=batch_size,
+            content_hash=content_hash,
+        )
+
+    def indexed_chunks(self, document_id: str, content_hash: str) -> int:
+        """Chunks indexed for the document from this content (0 if none).
+
+        0 too when it was indexed from other content or by another chunker,
+        i.e. whenever index_pages would have to embed anything.
+        """
+        try:
+            collection = self._get_collection(document_id)
+        except ValueError:
+            return 0
+        if self._collection_signature(collection) != self._index_signature(
+            content_hash
+        ):
+            return 0
+        return collection.count()
+
+    def reindex_pages(
+        self,
+        document_id: str,
+        pages: Iterable[tuple[int, str]],
+        batch_size: int = 64,
+        content_hash: Optional[str] = None,
+    ) -> dict:
+        """Bring an indexed document in line with new pages, embedding only changes.
+
+        Returns:
+            Dict with counts of "added", "updated" (same text, new position),
+            "unchanged" and "deleted" chunks
+        """
         collection_name = f"doc_{hashlib.md5(document_id.encode()).hexdigest()[:12]}"
-        collection = self.create_collection(collection_name)
 
-        if collection.count() > 0:
-            print(
-                f"Document {document_id} already indexed with {collection.count()} chunks"
+        with self._document_lock(document_id):
+            collection = self.create_collection(collection_name)
+            lexical = self._load_lexical_index(collection_name, collection)
+            stats = self._sync_chunks(
+                collection, document_id, self.chunk_pages(pages), batch_size, lexical
+            )
+            if content_hash:
+                collection.modify(metadata=self._index_signature(content_hash))
+            self._save_lexical_index(
+                collection_name, lexical, self._collection_signature(collection)
             )
-            return collection.count()
-
-        chunks = self.chunk_text(text)
-
-        ids = [chunk["id"] for chunk in chunks]
-        documents = [chunk["text"] for chunk in chunks]
-        metadatas = [
-            {
-                "document_id": document_id,
-                "start_char": chunk["start_char"],
-                "end_char": chunk["end_char"],
-                "page": chunk["page"] or 0,
-            }
-            for chunk in chunks
-        ]
 
-        collection.add(ids=ids, documents=documents, metadatas=metadatas)
-        print(f"Indexed {len(chunks)} chunks for document {document_id}")
-        return len(chunks)
+        print(f"Re-indexed document {document_id}: {stats}")
+        return stats
 
-    def query(self, document_id: str, query: str, n_results: int = 10) -> list[dict]:
-        """Query the vector store for relevant chunks."""
+    def _index_chunks(
+        self,
+        document_id: str,
+        make_chunks: Callable[[], Iterable[dict]],
+        batch_size: int = 64,
+        content_hash: Optional[str] = None,
+    ) -> int:
+        """Embed chunks into the document's collection in batches."""
         collection_name = f"doc_{hashlib.md5(document_id.encode()).hexdigest()[:12]}"
 
+        with self._document_lock(document_id):
+            collection = self.create_collection(collection_name)
+            count = collection.count()
+
+            if count > 0:
+                signature = self._collection_signature(collection)
+                if content_hash is None or signature == self._index_signature(
+                    content_hash
+                ):
+                    print(f"Document {document_id} already indexed with {count} chunks")
+                    return count
+
+                # Indexed from other content or by another chunker: embed only
+                # what changed
+                lexical = self._load_lexical_index(collection_name, collection)
+                stats = self._sync_chunks(
+                    collection, document_id, make_chunks(), batch_size, lexical
+                )
+                collection.modify(metadata=self._index_signature(content_hash))
+                self._save_lexical_index(
+                    collection_name, lexical, self._index_signature(content_hash)
+                )
+                print(f"Re-indexed document {document_id}: {stats}")
+                return stats["added"] + stats["updated"] + stats["unchanged"]
+
+            lexical = BM25Index()
+            total = 0
+            batch = []
+            for chunk in make_chunks():
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    self._add_batch(collection, document_id, batch, lexical)
+                    total += len(batch)
+                    batch = []
+
+            if batch:
+                self._add_batch(collection, document_id, batch, lexical)
+                total += len(batch)
+
+            signature = {}
+            if content_hash:
+                signature = self._index_signature(content_hash)
+                collection.modify(metadata=signature)
+            self._save_lexical_index(collection_name, lexical, signature)
+
+        print(f"Indexed {total} chunks for document {document_id}")
+        return total
+
+    def _sync_chunks(
+        self,
+        collection,
+        document_id: str,
+        chunks: Iterable[dict],
+        batch_size: int,
+        lexical: Optional[BM25Index] = None,
+    ) -> dict:
+        """Diff new chunks against the collection by id and apply the changes.
+
+        - New ids are embedded and added
+        - Known ids keep their embedding; only moved offsets are updated
+        - Ids that no longer occur are deleted
+        """
+        existing = collection.get(include=["metadatas"])
+        stored = dict(zip(existing["ids"], existing["metadatas"]))
+
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        seen = set()
+        to_add, to_update = [], []
+
+        for chunk in chunks:
+            seen.add(chunk["id"])
+            metadata = stored.get(chunk["id"])
+
+            if metadata is None:
+                to_add.append(chunk)
+                if len(to_add) >= batch_size:
+                    self._add_batch(collection, document_id, to_add, lexical)
+                    stats["added"] += len(to_add)
+                    to_add = []
+            elif metadata != self._chunk_metadata(document_id, chunk):
+                to_update.append(chunk)
+                if len(to_update) >= batch_size:
+                    self._update_batch(collection, document_id, to_update)
+                    stats["updated"] += len(to_update)
+                    to_update = []
+            else:
+                stats["unchanged"] += 1
+
+        if to_add:
+            self._add_batch(collection, document_id, to_add, lexical)
+            stats["added"] += len(to_add)
+        if to_update:
+            self._update_batch(collection, document_id, to_update)
+            stats["updated"] += len(to_update)
+
+        stale = [chunk_id for chunk_id in stored if chunk_id not in seen]
+        for start in range(0, len(stale), batch_size):
+            collection.delete(ids=stale[start : start + batch_size])
+        if lexical is not None:
+            for chunk_id in stale:
+                lexical.remove(chunk_id)
+        stats["deleted"] = len(stale)
+
+        return stats
+
+    def _collection_signature(self, collection) -> dict:
+        """Signature stored on a collection (its metadata minus HNSW settings)."""
+        return {
+            key: value
+            for key, value in (collection.metadata or {}).items()
+            if not key.startswith("hnsw:")
+        }
+
+    def _index_signature(self, content_hash: str) -> dict:
+        """What a collection was built from: re-index when either changes."""
+        return {"content_hash": content_hash, "chunker": settings.rag_chunker}
+
+    def _chunk_metadata(self, document_id: str, chunk: dict) -> dict:
+        page = chunk["page"] or 0
+        return {
+            "document_id": document_id,
+            "start_char": chunk["start_char"],
+            "end_char": chunk["end_char"],
+            "page": page,
+            "page_end": chunk.get("page_end") or page,
+            "clause": chunk.get("clause") or "",
+        }
+
+    def _add_batch(
+        self,
+        collection,
+        document_id: str,
+        chunks: list[dict],
+        lexical: Optional[BM25Index] = None,
+    ) -> None:
+        """Embed and store one batch of chunks (and add them to the BM25 index)."""
+        collection.add(
+            ids=[chunk["id"] for chunk in chunks],
+            documents=[chunk["text"] for chunk in chunks],
+            metadatas=[self._chunk_metadata(document_id, chunk) for chunk in chunks],
+        )
+        if lexical is not None:
+            for chunk in chunks:
+                lexical.add(chunk["id"], chunk["text"])
+
+    def _update_batch(self, collection, document_id: str, chunks: list[dict]) -> None:
+        """Move already embedded chunks (metadata only, no re-embedding)."""
+        collection.update(
+            ids=[chunk["id"] for chunk in chunks],
+            metadatas=[self._chunk_metadata(document_id, chunk) for chunk in chunks],
+        )
+
+    def _lexical_path(self, collection_name: str) -> Path:
+        return Path(settings.lexical_index_dir) / f"{collection_name}.json"
+
+    def _save_lexical_index(
+        self, collection_name: str, lexical: BM25Index, signature: dict
+    ) -> None:
+        lexical.signature = signature
+        lexical.save(self._lexical_path(collection_name))
+        self._lexical_indexes[collection_name] = lexical
+
+    def _load_lexical_index(self, collection_name: str, collection) -> BM25Index:
+        """
+        BM25 index of a collection: from memory, from disk, or rebuilt.
+
+        A saved index is only trusted if it was built from the same content
+        and chunker as the collection and has the same number of chunks;
+        otherwise it is rebuilt once from the stored chunk texts and saved.
+        Call with the document lock held.
+        """
+        signature = self._collection_signature(collection)
+        lexical = self._lexical_indexes.get(collection_name)
+        if lexical is None:
+            lexical = BM25Index.load(self._lexical_path(collection_name))
+
+        if (
+            lexical is None
+            or lexical.signature != signature
+            or len(lexical) != collection.count()
+        ):
+            stored = collection.get(include=["documents"])
+            lexical = BM25Index.build(zip(stored["ids"], stored["documents"]))
+            self._save_lexical_index(collection_name, lexical, signature)
+
+        self._lexical_indexes[collection_name] = lexical
+        return lexical
+
+    def _get_collection(self, document_id: str):
+        """Open a document's collection once and reuse it for later queries."""
+        collection_name = f"doc_{hashlib.md5(document_id.encode()).hexdigest()[:12]}"
+
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            return collection
+
         try:
             collection = self.client.get_collection(
                 name=collection_name, embedding_function=self.embedding_function
             )
-        except ValueError:
+        except (ValueError, NotFoundError):
             raise ValueError(f"Document {document_id} not indexed.")
 
+        self._collections[collection_name] = collection
+        return collection
+
+    def query(self, document_id: str, query: str, n_results: int = 10) -> list[dict]:
+        """Query the vector store for relevant chunks."""
+        return self.query_many(document_id, [query], n_results=n_results)[0]
+
+    def query_many(
+        self, document_id: str, queries: list[str], n_results: int = 10
+    ) -> list[list[dict]]:
+        """Run several queries in one batched Chroma call.
+
+        All query strings are embedded together and searched in a single
+        collection.query, so latency no longer grows with len(queries).
+        Returns one list of chunks per query, in the same order as `queries`.
+        """
+        if not queries:
+            return []
+
+        collection = self._get_collection(document_id)
         results = collection.query(
-            query_texts=[query],
+            query_texts=list(queries),
             n_results=n_results,
             include=["documents", "metadatas", "distances"],
         )
 
-        chunks = []
-        for i in range(len(results["ids"][0])):
-            chunks.append(
+        return [
+            [
                 {
-                    "id": results["ids"][0][i],
-                    "text": results["documents"][0][i],
-                    "metadata": results["metadatas"][0][i],
-                    "similarity": 1 - results["distances"][0][i],
+                    "id": results["ids"][q][i],
+                    "text": results["documents"][q][i],
+                    "metadata": results["metadatas"][q][i],
+                    "similarity": 1 - results["distances"][q][i],
                 }
-            )
+                for i in range(len(results["ids"][q]))
+            ]
+            for q in range(len(queries))
+        ]
+
+    def lexical_query_many(
+        self, document_id: str, queries: list[str], n_results: int = 10
+    ) -> list[list[tuple[str, float]]]:
+        """BM25 search for several queries: one list of (chunk_id, score) each."""
+        collection_name = f"doc_{hashlib.md5(document_id.encode()).hexdigest()[:12]}"
 
-        return chunks
+        lexical = self._lexical_indexes.get(collection_name)
+        if lexical is None:
+            collection = self._get_collection(document_id)
+            with self._document_lock(document_id):
+                lexical = self._load_lexical_index(collection_name, collection)
+
+        return [lexical.search(query, n_results=n_results) for query in queries]
+
+    def _get_chunks(self, document_id: str, chunk_ids: list[str]) -> dict[str, dict]:
+        """Fetch stored chunks by id (for hits that only BM25 found)."""
+        stored = self._get_collection(document_id).get(
+            ids=chunk_ids, include=["documents", "metadatas"]
+        )
+        return {
+            chunk_id: {
+                "id": chunk_id,
+                "text": text,
+                "metadata": metadata,
+                "similarity": None,
+            }
+            for chunk_id, text, metadata in zip(
+                stored["ids"], stored["documents"], stored["metadatas"]
+            )
+        }
 
     def get_relevant_text(
-        self, document_id: str, queries: list[str], n_per_query: int = 5
+        self,
+        document_id: str,
+        queries: list[str],
+        n_per_query: int = 5,
+        rank_by: str = "position",
+        max_tokens: Optional[int] = None,
+        hybrid: Optional[bool] = None,
     ) -> str:
-        """Get combined relevant text for multiple queries."""
-        all_chunks = {}
+        """Get combined relevant text for multiple queries.
 
-        for query in queries:
-            chunks = self.query(document_id, query, n_results=n_per_query)
-            for chunk in chunks:
-                if chunk["id"] not in all_chunks:
-                    all_chunks[chunk["id"]] = chunk
+        Args:
+            rank_by: "position" keeps the earliest chunks in the document,
+                "similarity" keeps the chunks with the highest similarity
+                summed over all queries that returned them
+            max_tokens: Optional token budget, filled in rank order by
+                pack_context (which also drops text repeated by overlapping
+                chunks). Kept text is always emitted in document order.
+            hybrid: Fuse BM25 and vector rankings per query (reciprocal rank
+                fusion) before taking the top n_per_query. Defaults to
+                settings.rag_hybrid_search. The fused score then replaces the
+                similarity for rank_by="similarity".
+        """
+        if rank_by not in ("position", "similarity"):
+            raise ValueError(f"Unknown rank_by: {rank_by}")
+        if hybrid is None:
+            hybrid = settings.rag_hybrid_search
 
-        sorted_chunks = sorted(
-            all_chunks.values(), key=lambda x: x["metadata"]["start_char"]
-        )
+        all_chunks = {}
+        if not hybrid:
+            for chunks in self.query_many(document_id, queries, n_results=n_per_query):
+                for chunk in chunks:
+                    if chunk["id"] not in all_chunks:
+                        all_chunks[chunk["id"]] = {**chunk, "score": 0.0}
+                    all_chunks[chunk["id"]]["score"] += chunk["similarity"]
+        else:
+            # Fuse deeper candidate lists, then keep n_per_query per query
+            candidates = n_per_query * 2
+            vector_results = self.query_many(document_id, queries, n_results=candidates)
+            lexical_results = self.lexical_query_many(
+                document_id, queries, n_results=candidates
+            )
 
-        combined_text = "\n\n---\n\n".join(
-            [
-                f"[Chunk from Page {c['metadata']['page']}]\n{c['text']}"
-                for c in sorted_chunks
+            by_id = {
+                chunk["id"]: chunk for chunks in vector_results for chunk in chunks
+            }
+            fused_per_query = [
+                reciprocal_rank_fusion(
+                    [
+                        [chunk["id"] for chunk in vector],
+                        [chunk_id for chunk_id, _ in lexical],
+                    ]
+                )[:n_per_query]
+                for vector, lexical in zip(vector_results, lexical_results)
             ]
-        )
 
-        return combined_text
+            missing = {
+                chunk_id
+                for fused in fused_per_query
+                for chunk_id, _ in fused
+                if chunk_id not in by_id
+            }
+            if missing:
+                by_id.update(self._get_chunks(document_id, sorted(missing)))
+
+            for fused in fused_per_query:
+                for chunk_id, score in fused:
+                    if chunk_id not in by_id:
+                        continue
+                    if chunk_id not in all_chunks:
+                        all_chunks[chunk_id] = {**by_id[chunk_id], "score": 0.0}
+                    all_chunks[chunk_id]["score"] += score
+
+        if rank_by == "similarity":
+            ranked = sorted(all_chunks.values(), key=lambda x: -x["score"])
+        else:
+            ranked = sorted(
+                all_chunks.values(), key=lambda x: x["metadata"]["start_char"]
+            )
+
+        return pack_context(ranked, max_tokens=max_tokens).text
 
     def delete_document(self, document_id: str):
-        """Delete a document from the vector store."""
+        """Delete a document from the vector store (and its BM25 index)."""
         collection_name = f"doc_{hashlib.md5(document_id.encode()).hexdigest()[:12]}"
-        try:
-            self.client.delete_collection(collection_name)
-        except ValueError:
-            pass
+        with self._document_lock(document_id):
+            self._collections.pop(collection_name, None)
+            self._lexical_indexes.pop(collection_name, None)
+            self._lexical_path(collection_name).unlink(missing_ok=True)
+            try:
+                self.client.delete_collection(collection_name)
+            except (ValueError, NotFoundError):
+                pass
+
+
+# Process-wide engine, created at app startup and shared by all requests
+_rag_service: Optional[RAGService] = None
+_rag_service_lock = threading.Lock()
+
+
+def init_rag_service(warm_up: bool = True) -> RAGService:
+    """Create the shared RAGService (idempotent) and optionally warm it up."""
+    global _rag_service
+    with _rag_service_lock:
+        if _rag_service is None:
+            service = RAGService()
+            if warm_up:
+                service.warm_up()
+            _rag_service = service
+        return _rag_service
+
+
+def get_rag_service() -> RAGService:
+    """Return the shared RAGService, creating it on first use if needed."""
+    if _rag_service is not None:
+        return _rag_service
+    return init_rag_service()
+
+
+def close_rag_service() -> None:
+    """Drop the shared engine (on shutdown, or to reset between tests)."""
+    global _rag_service
+    with _rag_service_lock:
+        _rag_service = None
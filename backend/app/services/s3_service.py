@@ -1,8 +1,38 @@
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from app.config import settings
+import asyncio
+import hashlib
+import mmap
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+from app.services.blob_cache import get_blob_cache
+from app.services.executors import run_io_bound
+
+# delete_objects accepts at most 1000 keys per request
+MAX_DELETE_BATCH = 1000
+
+# S3 rejects multipart parts under 5MB (except the last one)
+MIN_MULTIPART_PART_SIZE = 5 * 1024 * 1024
+
+
+class FileTooLargeError(ValueError):
+    """An upload went over the size limit while it was being streamed."""
+
+
+@dataclass(frozen=True)
+class UploadResult:
+    """Where a streamed upload ended up, plus what was learned on the way."""
+
+    s3_key: str
+    size_bytes: int
+    content_hash: str  # SHA-256 hex digest of the uploaded bytes
 
 
 class S3Service:
@@ -17,18 +47,47 @@ class S3Service:
 
     def __init__(self):
         """
-        Initialize S3 client with AWS credentials.
+        Prepare the S3 service; the client is created on first use.
+
+        Why lazy?
+        - The router builds S3Service at import time; creating the client
+          there slowed imports and failed without AWS settings
+        """
+        self.bucket_name = settings.s3_bucket_name
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def s3_client(self):
+        """
+        The shared boto3 client (thread-safe, reused by every request).
 
         boto3.client() creates a connection to AWS S3.
         We get credentials from settings (loaded from .env)
+
+        Why a custom Config?
+        - botocore's default pool is 10 connections; with more concurrent
+          requests the extra ones block waiting for a free connection
+        - "adaptive" retries back off on throttling (503 SlowDown) instead of
+          failing the upload or download
         """
-        self.s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-            region_name=settings.aws_region,
-        )
-        self.bucket_name = settings.s3_bucket_name
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = boto3.client(
+                        "s3",
+                        aws_access_key_id=settings.aws_access_key_id,
+                        aws_secret_access_key=settings.aws_secret_access_key,
+                        region_name=settings.aws_region,
+                        config=Config(
+                            max_pool_connections=settings.s3_max_pool_connections,
+                            retries={
+                                "mode": settings.s3_retry_mode,
+                                "total_max_attempts": settings.s3_max_attempts,
+                            },
+                        ),
+                    )
+        return self._client
 
     def upload_file(
         self, file_content: bytes, original_filename: str, folder: str = "agreements"
@@ -64,6 +123,116 @@ class S3Service:
         except ClientError as e:
             raise Exception(f"Failed to upload file to S3: {str(e)}")
 
+    def upload_stream(
+        self,
+        fileobj: BinaryIO,
+        original_filename: str,
+        folder: str = "agreements",
+        max_bytes: Optional[int] = None,
+    ) -> UploadResult:
+        """
+        Stream a file object to S3 in parts, hashing it on the way.
+
+        Args:
+            fileobj: Readable binary file (e.g. the upload's spooled temp file)
+            original_filename: Original name like "loan_agreement.pdf"
+            folder: S3 folder to organize files
+            max_bytes: Abort with FileTooLargeError once more than this is read
+
+        Returns:
+            UploadResult with the S3 key, size and SHA-256 content hash
+
+        Why multipart?
+        - put_object needs the whole body in memory at once
+        - Here only one part (settings.s3_multipart_part_size_mb) is held at a
+          time, however large the file or however many uploads run at once
+        - Files that fit in a single part still go up with one put_object
+
+        max_bytes bounds what is read from fileobj and sent to S3. For a
+        FastAPI UploadFile, Starlette has already received and spooled the
+        whole request body to a temp file before the handler runs, so it does
+        not stop a large request from being received; cap the request body
+        size in front of the app (proxy or load balancer) for that.
+        """
+        file_extension = Path(original_filename).suffix
+        unique_id = str(uuid.uuid4())[:8]
+        s3_key = f"{folder}/{unique_id}_{original_filename}"
+        content_type = self._get_content_type(file_extension)
+        part_size = max(
+            settings.s3_multipart_part_size_mb * 1024 * 1024, MIN_MULTIPART_PART_SIZE
+        )
+
+        sha256 = hashlib.sha256()
+        size_bytes = 0
+
+        def read_part() -> bytes:
+            nonlocal size_bytes
+            chunk = fileobj.read(part_size)
+            size_bytes += len(chunk)
+            if max_bytes is not None and size_bytes > max_bytes:
+                raise FileTooLargeError(
+                    f"File exceeds the maximum size of {max_bytes} bytes"
+                )
+            sha256.update(chunk)
+            return chunk
+
+        first = read_part()
+        second = read_part() if len(first) == part_size else b""
+
+        if not second:
+            try:
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    Body=first,
+                    ContentType=content_type,
+                )
+            except ClientError as e:
+                raise Exception(f"Failed to upload file to S3: {str(e)}")
+            return UploadResult(s3_key, size_bytes, sha256.hexdigest())
+
+        try:
+            upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=s3_key, ContentType=content_type
+            )["UploadId"]
+        except ClientError as e:
+            raise Exception(f"Failed to upload file to S3: {str(e)}")
+
+        try:
+            parts = []
+            chunk = first
+            pending = second
+            while chunk:
+                response = self.s3_client.upload_part(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    PartNumber=len(parts) + 1,
+                    Body=chunk,
+                )
+                parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+                chunk, pending = pending, (read_part() if pending else b"")
+
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException as e:
+            # Don't leave orphaned parts behind (they are billed until aborted)
+            try:
+                self.s3_client.abort_multipart_upload(
+                    Bucket=self.bucket_name, Key=s3_key, UploadId=upload_id
+                )
+            except ClientError:
+                pass
+            if isinstance(e, ClientError):
+                raise Exception(f"Failed to upload file to S3: {str(e)}")
+            raise
+
+        return UploadResult(s3_key, size_bytes, sha256.hexdigest())
+
     def download_file(self, s3_key: str) -> bytes:
         """
         Download a file from S3.
@@ -73,13 +242,49 @@ class S3Service:
 
         Returns:
             File content as bytes
+
+        Served from the local blob cache when it is enabled: uploaded keys
+        are unique and never overwritten, so a cached copy can't go stale.
         """
+        cache = get_blob_cache()
+        if cache is not None:
+            return cache.read_bytes(s3_key, self._fetcher(s3_key))
+
         try:
             response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
             return response["Body"].read()
         except ClientError as e:
             raise Exception(f"Failed to download file from S3: {str(e)}")
 
+    def open_file(self, s3_key: str) -> Union[mmap.mmap, bytes]:
+        """
+        Read-only view of a file for parsing.
+
+        A memory map of the cached copy when the blob cache is enabled (no
+        S3 round-trip and no heap copy), otherwise the downloaded bytes.
+        """
+        cache = get_blob_cache()
+        if cache is None:
+            return self.download_file(s3_key)
+        return cache.open_mmap(s3_key, self._fetcher(s3_key))
+
+    def cache_upload(self, s3_key: str, fileobj: BinaryIO) -> None:
+        """Seed the blob cache with a file we just uploaded."""
+        cache = get_blob_cache()
+        if cache is not None:
+            cache.put(s3_key, fileobj)
+
+    def _fetcher(self, s3_key: str):
+        """Callback for the blob cache that streams the object into a file."""
+
+        def fetch(fileobj: BinaryIO) -> None:
+            try:
+                self.s3_client.download_fileobj(self.bucket_name, s3_key, fileobj)
+            except ClientError as e:
+                raise Exception(f"Failed to download file from S3: {str(e)}")
+
+        return fetch
+
     def generate_presigned_url(self, s3_key: str, expiration: int = 3600) -> str:
         """
         Generate a temporary download URL for a file.
@@ -118,10 +323,69 @@ class S3Service:
         """
         try:
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=s3_key)
+            cache = get_blob_cache()
+            if cache is not None:
+                cache.discard(s3_key)
             return True
         except ClientError as e:
             raise Exception(f"Failed to delete file from S3: {str(e)}")
 
+    def delete_files(self, s3_keys: list[str]) -> list[str]:
+        """
+        Delete many files with batched delete_objects requests.
+
+        Args:
+            s3_keys: Paths to files in S3
+
+        Returns:
+            Keys that S3 reported as not deleted (empty if all succeeded)
+        """
+        cache = get_blob_cache()
+        failed = []
+
+        for start in range(0, len(s3_keys), MAX_DELETE_BATCH):
+            batch = s3_keys[start : start + MAX_DELETE_BATCH]
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+                )
+            except ClientError as e:
+                raise Exception(f"Failed to delete files from S3: {str(e)}")
+
+            batch_failed = {error["Key"] for error in response.get("Errors", [])}
+            failed.extend(key for key in batch if key in batch_failed)
+            if cache is not None:
+                for key in batch:
+                    if key not in batch_failed:
+                        cache.discard(key)
+
+        return failed
+
+    def download_files(
+        self, s3_keys: list[str], max_workers: Optional[int] = None
+    ) -> dict[str, bytes]:
+        """
+        Download several files in parallel (e.g. a portfolio of agreements).
+
+        Args:
+            s3_keys: Paths to files in S3
+            max_workers: Parallel downloads (defaults to the connection pool size)
+
+        Returns:
+            Dict of s3_key -> file content, in the order of s3_keys
+        """
+        unique_keys = list(dict.fromkeys(s3_keys))
+        if not unique_keys:
+            return {}
+
+        workers = min(max_workers or settings.s3_max_pool_connections, len(unique_keys))
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="s3-download"
+        ) as pool:
+            contents = pool.map(self.download_file, unique_keys)
+            return dict(zip(unique_keys, contents))
+
     def _get_content_type(self, extension: str) -> str:
         """
         Map file extension to MIME type.
@@ -139,3 +403,65 @@ class S3Service:
             ".json": "application/json",
         }
         return content_types.get(extension.lower(), "application/octet-stream")
+
+
+class AsyncS3Service:
+    """
+    Awaitable facade over S3Service for async route handlers.
+
+    Each call runs the blocking boto3 method on the shared I/O pool
+    (see app.services.executors), so the event loop never waits on S3. The
+    underlying client and its connection pool are shared with S3Service.
+    """
+
+    def __init__(self, s3_service: Optional[S3Service] = None):
+        self.sync = s3_service or S3Service()
+
+    async def upload_stream(self, *args, **kwargs) -> UploadResult:
+        return await run_io_bound(self.sync.upload_stream, *args, **kwargs)
+
+    async def cache_upload(self, s3_key: str, fileobj: BinaryIO) -> None:
+        await run_io_bound(self.sync.cache_upload, s3_key, fileobj)
+
+    async def download_file(self, s3_key: str) -> bytes:
+        return await run_io_bound(self.sync.download_file, s3_key)
+
+    async def open_file(self, s3_key: str) -> Union[mmap.mmap, bytes]:
+        return await run_io_bound(self.sync.open_file, s3_key)
+
+    async def delete_file(self, s3_key: str) -> bool:
+        return await run_io_bound(self.sync.delete_file, s3_key)
+
+    async def delete_files(self, s3_keys: list[str]) -> list[str]:
+        return await run_io_bound(self.sync.delete_files, s3_keys)
+
+    async def generate_presigned_url(self, s3_key: str, expiration: int = 3600) -> str:
+        return await run_io_bound(
+            self.sync.generate_presigned_url, s3_key, expiration=expiration
+        )
+
+    async def download_files(
+        self, s3_keys: list[str], max_concurrency: Optional[int] = None
+    ) -> dict[str, bytes]:
+        """
+        Download several files concurrently on the I/O pool.
+
+        Args:
+            s3_keys: Paths to files in S3
+            max_concurrency: Downloads in flight at once (defaults to the
+                connection pool size)
+
+        Returns:
+            Dict of s3_key -> file content, in the order of s3_keys
+        """
+        unique_keys = list(dict.fromkeys(s3_keys))
+        semaphore = asyncio.Semaphore(
+            max_concurrency or settings.s3_max_pool_connections
+        )
+
+        async def download(s3_key: str) -> bytes:
+            async with semaphore:
+                return await self.download_file(s3_key)
+
+        contents = await asyncio.gather(*(download(key) for key in unique_keys))
+        return dict(zip(unique_keys, contents))
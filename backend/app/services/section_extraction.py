@@ -0,0 +1,235 @@
+"""
+Map-reduce covenant extraction, one LLM call per definition section.
+
+A single extraction call over all retrieved text has two costs: the model
+has to find every covenant in one long context (recall suffers on the ones
+mentioned late), and the whole request waits on one slow call. Here each
+section gets its own retrieval and its own call:
+
+- Map: EBITDA definition, its adjustments (add-backs, deductions, caps) and
+  each financial covenant are retrieved and extracted independently, with at
+  most settings.extraction_max_concurrency calls in flight
+- Reduce: results are merged in the fixed section order, so the output does
+  not depend on which call finished first
+
+Wall-clock time becomes roughly the slowest section instead of the sum.
+
+retrieve_sections and extract_sections are the pipeline's retrieve and
+extract stages in this mode (see workflows.covenant_pipeline).
+"""
+
+import asyncio
+import json
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from app.agents.pdf_extractor import extract_covenants_from_text
+from app.config import settings
+from app.services.executors import run_cpu_bound, run_io_bound
+
+
+@dataclass(frozen=True)
+class ExtractionSection:
+    """One independent part of the extraction: what to retrieve and extract."""
+
+    name: str
+    queries: tuple[str, ...]
+    focus: str
+
+
+EXTRACTION_SECTIONS: tuple[ExtractionSection, ...] = (
+    ExtractionSection(
+        name="ebitda",
+        queries=(
+            "EBITDA definition calculation",
+            "Consolidated EBITDA means operating profit",
+        ),
+        focus="the EBITDA definition (base metric and section reference)",
+    ),
+    ExtractionSection(
+        name="adjustments",
+        queries=(
+            "EBITDA add backs deductions",
+            "adding back depreciation amortisation impairment exceptional items",
+            "cap on synergies cost savings not exceeding per cent of EBITDA",
+        ),
+        focus="EBITDA add-backs, deductions and caps",
+    ),
+    ExtractionSection(
+        name="leverage",
+        queries=(
+            "leverage ratio covenant limit shall not exceed",
+            "Total Net Debt to EBITDA financial condition",
+        ),
+        focus="leverage ratio covenants (debt to EBITDA)",
+    ),
+    ExtractionSection(
+        name="interest_cover",
+        queries=(
+            "interest coverage ratio financial covenant",
+            "EBITDA to Net Finance Charges shall not be less than",
+        ),
+        focus="interest cover covenants",
+    ),
+    ExtractionSection(
+        name="debt_service",
+        queries=(
+            "debt service coverage ratio",
+            "Cashflow to Debt Service shall not be less than",
+        ),
+        focus="debt service cover covenants",
+    ),
+    ExtractionSection(
+        name="capex",
+        queries=("capital expenditure capex limits",),
+        focus="capital expenditure limits",
+    ),
+)
+
+
+def _normalize(name: Optional[str]) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", (name or "").lower()).strip()
+
+
+def _item_key(item) -> str:
+    """Dedupe key for an add-back, deduction or cap."""
+    if isinstance(item, dict):
+        return _normalize(item.get("name") or item.get("item")) or json.dumps(
+            item, sort_keys=True
+        )
+    return _normalize(str(item))
+
+
+def merge_section_results(results: list[tuple[str, dict]]) -> dict:
+    """
+    Merge per-section extractions into one ebitda_definition/covenants result.
+
+    Deterministic for a given input order:
+    - Scalar EBITDA fields come from the first section that has them
+    - Add-backs, deductions and caps are unioned, first occurrence wins
+    - Covenants are deduplicated by name; a later section only fills fields
+      the first one left empty
+    """
+    ebitda: Optional[dict] = None
+    covenants: dict[str, dict] = {}
+    raw_responses = []
+    errors = {}
+    validation_errors = []
+
+    for name, result in results:
+        if not result.get("success"):
+            errors[name] = result.get("error") or "Unknown error"
+            continue
+        if result.get("raw_response"):
+            raw_responses.append(f"[{name}]\n{result['raw_response']}")
+        validation_errors.extend(
+            f"[{name}] {error}" for error in result.get("validation_errors") or []
+        )
+
+        definition = result.get("ebitda_definition")
+        if isinstance(definition, dict):
+            if ebitda is None:
+                ebitda = {"add_backs": [], "deductions": [], "caps": []}
+            for field, value in definition.items():
+                if field in ("add_backs", "deductions", "caps"):
+                    seen = {_item_key(item) for item in ebitda[field]}
+                    for item in value or []:
+                        if _item_key(item) not in seen:
+                            seen.add(_item_key(item))
+                            ebitda[field].append(item)
+                elif ebitda.get(field) in (None, "") and value not in (None, ""):
+                    ebitda[field] = value
+
+        for covenant in result.get("covenants") or []:
+            if not isinstance(covenant, dict):
+                continue
+            key = _normalize(covenant.get("name"))
+            if key not in covenants:
+                covenants[key] = dict(covenant)
+                continue
+            merged = covenants[key]
+            for field, value in covenant.items():
+                if merged.get(field) in (None, "") and value not in (None, ""):
+                    merged[field] = value
+
+    if len(errors) == len(results):
+        return {
+            "success": False,
+            "error": "; ".join(f"{name}: {error}" for name, error in errors.items()),
+            "raw_response": None,
+        }
+
+    return {
+        "success": True,
+        "ebitda_definition": ebitda,
+        "covenants": list(covenants.values()),
+        "raw_response": "\n\n".join(raw_responses),
+        "section_errors": errors,
+        "validation_errors": validation_errors,
+    }
+
+
+async def retrieve_sections(
+    rag,
+    document_id: str,
+    sections: tuple[ExtractionSection, ...] = EXTRACTION_SECTIONS,
+) -> dict[str, str]:
+    """
+    Retrieve every section's context concurrently.
+
+    Args:
+        rag: RAGService with the document already indexed
+        document_id: Agreement id the document was indexed under
+        sections: Sections to retrieve for
+
+    Returns:
+        Section name -> retrieved text, in section order
+    """
+
+    async def retrieve(section: ExtractionSection) -> str:
+        return await run_cpu_bound(
+            rag.get_relevant_text,
+            document_id=document_id,
+            queries=list(section.queries),
+            n_per_query=4,
+            rank_by="similarity",
+            max_tokens=settings.extraction_section_tokens,
+        )
+
+    texts = await asyncio.gather(*(retrieve(section) for section in sections))
+    return {section.name: text for section, text in zip(sections, texts)}
+
+
+async def extract_sections(
+    texts: dict[str, str],
+    sections: tuple[ExtractionSection, ...] = EXTRACTION_SECTIONS,
+    max_concurrency: Optional[int] = None,
+) -> dict:
+    """
+    Extract every section from its retrieved text concurrently, then merge.
+
+    Args:
+        texts: Section name -> retrieved text (see retrieve_sections)
+        sections: Sections to extract, in merge order
+        max_concurrency: LLM calls in flight at once
+            (default settings.extraction_max_concurrency)
+
+    Returns:
+        Same shape as extract_covenants_from_text, plus "section_errors" for
+        sections that failed while others succeeded
+    """
+    semaphore = asyncio.Semaphore(
+        max_concurrency or settings.extraction_max_concurrency
+    )
+
+    async def extract_section(section: ExtractionSection) -> tuple[str, dict]:
+        async with semaphore:
+            result = await run_io_bound(
+                extract_covenants_from_text, texts[section.name], focus=section.focus
+            )
+        return section.name, result
+
+    # gather keeps the input order, whatever order the calls finish in
+    results = await asyncio.gather(*(extract_section(s) for s in sections))
+    return merge_section_results(list(results))
@@ -0,0 +1,376 @@
+"""
+Pluggable storage for agreements and extracted covenants.
+
+Backends:
+- "sqlite" (default): persistent, shared by all uvicorn workers on a host
+- "memory": process-local dicts, handy for tests and quick demos
+
+agreement_storage and covenant_store keep their function APIs and delegate
+to the backend chosen by settings.storage_backend.
+"""
+
+import itertools
+import json
+import threading
+from datetime import datetime
+from typing import Optional
+
+from app.config import settings
+from app.database import get_connection, transaction
+from app.models.agreement import COVENANT_COLUMNS
+
+# Extraction keys with their own column/table; the rest is kept in `extra`
+_EXTRACTION_KEYS = {"ebitda_definition", "covenants", "generated_code"}
+
+
+def _split_covenant(covenant: dict) -> tuple[list, dict]:
+    """A covenant's column values, and the keys to keep in its `extra` JSON.
+
+    Values SQLite can't bind (e.g. "page": [290, 291] from the LLM or a
+    manual edit) go to `extra` too, and come back unchanged on read.
+    """
+    columns = []
+    extra = {k: v for k, v in covenant.items() if k not in COVENANT_COLUMNS}
+    for column in COVENANT_COLUMNS:
+        value = covenant.get(column)
+        if isinstance(value, (list, dict)):
+            extra[column] = value
+            value = None
+        columns.append(value)
+    return columns, extra
+
+
+class MemoryStorage:
+    """Process-local storage (lost on restart, not shared across workers)."""
+
+    def __init__(self):
+        self._agreements: dict[str, dict] = {}
+        self._extractions: dict[str, dict] = {}
+        self._kinds: dict[str, list[str]] = {}
+        self._stage_runs: dict[str, dict[str, dict]] = {}
+        # Bumped on every extraction write, used to invalidate limit indexes
+        self._versions: dict[str, str] = {}
+        self._version_counter = itertools.count(1)
+
+    def save_agreement(self, agreement_id: str, s3_key: str, **metadata) -> None:
+        self._agreements[agreement_id] = {
+            "agreement_id": agreement_id,
+            "s3_key": s3_key,
+            **metadata,
+        }
+
+    def get_agreement(self, agreement_id: str) -> Optional[dict]:
+        return self._agreements.get(agreement_id)
+
+    def find_agreements_by_hash(self, content_hash: str) -> list[dict]:
+        return [
+            agreement
+            for agreement in self._agreements.values()
+            if agreement.get("content_hash") == content_hash
+        ]
+
+    def save_extraction(
+        self, agreement_id: str, data: dict, kinds: Optional[list[str]] = None
+    ) -> None:
+        self._extractions[agreement_id] = data
+        self._kinds[agreement_id] = list(kinds or [])
+        self._versions[agreement_id] = str(next(self._version_counter))
+
+    def get_extraction(self, agreement_id: str) -> Optional[dict]:
+        return self._extractions.get(agreement_id)
+
+    def get_extraction_version(self, agreement_id: str) -> Optional[str]:
+        return self._versions.get(agreement_id)
+
+    def get_classified_covenants(self, agreement_id: str) -> list[dict]:
+        covenants = (self._extractions.get(agreement_id) or {}).get("covenants") or []
+        kinds = self._kinds.get(agreement_id, [])
+        return [
+            {**covenant, "kind": kinds[position] if position < len(kinds) else None}
+            for position, covenant in enumerate(covenants)
+        ]
+
+    def get_generated_code(self, agreement_id: str) -> Optional[str]:
+        return (self._extractions.get(agreement_id) or {}).get("generated_code")
+
+    def save_generated_code(self, agreement_id: str, code: str) -> None:
+        self._extractions.setdefault(agreement_id, {})["generated_code"] = code
+        self._versions[agreement_id] = str(next(self._version_counter))
+
+    def delete_extraction(self, agreement_id: str) -> None:
+        self._extractions.pop(agreement_id, None)
+        self._kinds.pop(agreement_id, None)
+        self._versions.pop(agreement_id, None)
+
+    def save_stage_run(self, agreement_id: str, run: dict) -> None:
+        self._stage_runs.setdefault(agreement_id, {})[run["stage"]] = dict(run)
+
+    def get_stage_runs(self, agreement_id: str) -> list[dict]:
+        runs = self._stage_runs.get(agreement_id, {}).values()
+        return sorted(runs, key=lambda run: run["finished_at"])
+
+    def clear_agreements(self) -> None:
+        self._agreements.clear()
+
+    def clear_extractions(self) -> None:
+        self._extractions.clear()
+        self._kinds.clear()
+        self._versions.clear()
+        self._stage_runs.clear()
+
+
+class SQLiteStorage:
+    """SQLite (WAL) storage with covenants normalized one row per covenant."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.sqlite_path
+
+    def save_agreement(
+        self,
+        agreement_id: str,
+        s3_key: str,
+        content_hash: Optional[str] = None,
+        filename: Optional[str] = None,
+        page_count: Optional[int] = None,
+    ) -> None:
+        with transaction(self.path) as db:
+            db.execute(
+                """
+                INSERT INTO agreements
+                    (agreement_id, s3_key, content_hash, filename, page_count, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (agreement_id) DO UPDATE SET
+                    s3_key = excluded.s3_key,
+                    content_hash = COALESCE(excluded.content_hash, content_hash),
+                    filename = COALESCE(excluded.filename, filename),
+                    page_count = COALESCE(excluded.page_count, page_count)
+                """,
+                (
+                    agreement_id,
+                    s3_key,
+                    content_hash,
+                    filename,
+                    page_count,
+                    datetime.utcnow().isoformat(),
+                ),
+            )
+
+    def get_agreement(self, agreement_id: str) -> Optional[dict]:
+        row = (
+            get_connection(self.path)
+            .execute("SELECT * FROM agreements WHERE agreement_id = ?", (agreement_id,))
+            .fetchone()
+        )
+        return dict(row) if row else None
+
+    def find_agreements_by_hash(self, content_hash: str) -> list[dict]:
+        rows = (
+            get_connection(self.path)
+            .execute(
+                "SELECT * FROM agreements WHERE content_hash = ? ORDER BY created_at",
+                (content_hash,),
+            )
+            .fetchall()
+        )
+        return [dict(row) for row in rows]
+
+    def save_extraction(
+        self, agreement_id: str, data: dict, kinds: Optional[list[str]] = None
+    ) -> None:
+        extra = {k: v for k, v in data.items() if k not in _EXTRACTION_KEYS}
+        covenants = data.get("covenants") or []
+        kinds = list(kinds or [None] * len(covenants))
+
+        covenant_rows = []
+        for position, (covenant, kind) in enumerate(zip(covenants, kinds)):
+            columns, covenant_extra = _split_covenant(covenant)
+            covenant_rows.append(
+                (agreement_id, position, *columns, kind, json.dumps(covenant_extra))
+            )
+
+        with transaction(self.path) as db:
+            db.execute(
+                """
+                INSERT INTO extractions
+                    (agreement_id, ebitda_definition, generated_code, extra, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (agreement_id) DO UPDATE SET
+                    ebitda_definition = excluded.ebitda_definition,
+                    generated_code = excluded.generated_code,
+                    extra = excluded.extra,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    agreement_id,
+                    json.dumps(data.get("ebitda_definition")),
+                    data.get("generated_code"),
+                    json.dumps(extra),
+                    datetime.utcnow().isoformat(),
+                ),
+            )
+            db.execute("DELETE FROM covenants WHERE agreement_id = ?", (agreement_id,))
+            db.executemany(
+                f"""
+                INSERT INTO covenants
+                    (agreement_id, position, {", ".join(COVENANT_COLUMNS)}, kind, extra)
+                VALUES (?, ?, {", ".join("?" for _ in COVENANT_COLUMNS)}, ?, ?)
+                """,
+                covenant_rows,
+            )
+
+    def get_extraction(self, agreement_id: str) -> Optional[dict]:
+        db = get_connection(self.path)
+        row = db.execute(
+            "SELECT * FROM extractions WHERE agreement_id = ?", (agreement_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        covenant_rows = db.execute(
+            "SELECT * FROM covenants WHERE agreement_id = ? ORDER BY position",
+            (agreement_id,),
+        ).fetchall()
+
+        covenants = []
+        for covenant_row in covenant_rows:
+            covenant = {
+                column: covenant_row[column]
+                for column in COVENANT_COLUMNS
+                if covenant_row[column] is not None
+            }
+            covenant.update(json.loads(covenant_row["extra"] or "{}"))
+            covenants.append(covenant)
+
+        data = {
+            **json.loads(row["extra"] or "{}"),
+            "ebitda_definition": json.loads(row["ebitda_definition"] or "null"),
+            "covenants": covenants,
+        }
+        if row["generated_code"] is not None:
+            data["generated_code"] = row["generated_code"]
+        return data
+
+    def get_extraction_version(self, agreement_id: str) -> Optional[str]:
+        row = (
+            get_connection(self.path)
+            .execute(
+                "SELECT updated_at FROM extractions WHERE agreement_id = ?",
+                (agreement_id,),
+            )
+            .fetchone()
+        )
+        return row["updated_at"] if row else None
+
+    def get_classified_covenants(self, agreement_id: str) -> list[dict]:
+        rows = (
+            get_connection(self.path)
+            .execute(
+                """
+                SELECT kind, name, limit_value, limit_type, section_ref
+                FROM covenants
+                WHERE agreement_id = ?
+                ORDER BY position
+                """,
+                (agreement_id,),
+            )
+            .fetchall()
+        )
+        return [dict(row) for row in rows]
+
+    def get_generated_code(self, agreement_id: str) -> Optional[str]:
+        row = (
+            get_connection(self.path)
+            .execute(
+                "SELECT generated_code FROM extractions WHERE agreement_id = ?",
+                (agreement_id,),
+            )
+            .fetchone()
+        )
+        return row["generated_code"] if row else None
+
+    def save_generated_code(self, agreement_id: str, code: str) -> None:
+        with transaction(self.path) as db:
+            db.execute(
+                """
+                INSERT INTO extractions (agreement_id, generated_code, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (agreement_id) DO UPDATE SET
+                    generated_code = excluded.generated_code,
+                    updated_at = excluded.updated_at
+                """,
+                (agreement_id, code, datetime.utcnow().isoformat()),
+            )
+
+    def delete_extraction(self, agreement_id: str) -> None:
+        with transaction(self.path) as db:
+            db.execute("DELETE FROM covenants WHERE agreement_id = ?", (agreement_id,))
+            db.execute(
+                "DELETE FROM extractions WHERE agreement_id = ?", (agreement_id,)
+            )
+
+    def save_stage_run(self, agreement_id: str, run: dict) -> None:
+        with transaction(self.path) as db:
+            db.execute(
+                """
+                INSERT INTO stage_runs
+                    (agreement_id, stage, stage_key, cached, duration_ms, finished_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (agreement_id, stage) DO UPDATE SET
+                    stage_key = excluded.stage_key,
+                    cached = excluded.cached,
+                    duration_ms = excluded.duration_ms,
+                    finished_at = excluded.finished_at
+                """,
+                (
+                    agreement_id,
+                    run["stage"],
+                    run["stage_key"],
+                    int(run["cached"]),
+                    run["duration_ms"],
+                    run["finished_at"],
+                ),
+            )
+
+    def get_stage_runs(self, agreement_id: str) -> list[dict]:
+        rows = (
+            get_connection(self.path)
+            .execute(
+                """
+                SELECT stage, stage_key, cached, duration_ms, finished_at
+                FROM stage_runs
+                WHERE agreement_id = ?
+                ORDER BY finished_at
+                """,
+                (agreement_id,),
+            )
+            .fetchall()
+        )
+        return [{**dict(row), "cached": bool(row["cached"])} for row in rows]
+
+    def clear_agreements(self) -> None:
+        with transaction(self.path) as db:
+            db.execute("DELETE FROM agreements")
+
+    def clear_extractions(self) -> None:
+        with transaction(self.path) as db:
+            db.execute("DELETE FROM covenants")
+            db.execute("DELETE FROM extractions")
+            db.execute("DELETE FROM stage_runs")
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Return the configured storage backend (created on first use)."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if settings.storage_backend == "memory":
+                _storage = MemoryStorage()
+            elif settings.storage_backend == "sqlite":
+                _storage = SQLiteStorage()
+            else:
+                raise ValueError(f"Unknown storage backend: {settings.storage_backend}")
+        return _storage
@@ -0,0 +1,545 @@
+"""
+Extraction and code generation pipelines, shared by the HTTP endpoints and
+background jobs.
+
+Both are built from the named stages fetch -> parse -> index -> retrieve ->
+extract (-> codegen), each memoized under a key derived from the PDF's
+content hash (see stages). A pipeline starts from the last stage it needs
+and only goes back as far as the first memo it finds: re-extracting an
+agreement whose retrieval is memoized never touches S3, and /generate-code
+on an agreement with a stored extraction runs codegen alone.
+
+The synchronous /extract and /generate-code endpoints await them directly;
+the job queue runs them in a worker and records each stage as it starts
+through the `progress` callback.
+"""
+
+import asyncio
+import mmap
+import re
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from app.config import settings
+from app.schemas.agreement import GeneratedCodeResponse
+from app.services import agreement_storage
+from app.services.executors import run_cpu_bound, run_io_bound
+from app.services.pdf_service import ParsedDocument, PDFService
+from app.services.s3_service import AsyncS3Service
+from app.workflows.stages import PIPELINE_STAGES, PipelineRun, stage_key
+
+s3_service = AsyncS3Service()
+pdf_service = PDFService()
+
+# Retrieval queries for a single-call extraction
+EXTRACTION_QUERIES = [
+    "EBITDA definition calculation add backs deductions",
+    "leverage ratio covenant limit shall not exceed",
+    "interest coverage ratio financial covenant",
+    "debt service coverage ratio",
+    "financial definitions Section 24 Clause 24",
+    "conditions precedent financial covenants",
+    "capital expenditure capex limits",
+]
+
+# Stage names reported through `progress`, in order
+EXTRACT_STAGES = PIPELINE_STAGES[:5] + ("save",)
+CODEGEN_STAGES = PIPELINE_STAGES + ("validate",)
+
+Progress = Optional[Callable[[str], None]]
+# Called with (event stage name, counts) as stages finish, for /extract/stream
+StageEvents = Optional[Callable[[str, dict], None]]
+
+
+class PipelineError(RuntimeError):
+    """A pipeline stage failed in a way the caller should report as-is."""
+
+
+def _report(progress: Progress, stage: str) -> None:
+    if progress is not None:
+        progress(stage)
+
+
+def _notify(on_stage: StageEvents, stage: str, **counts) -> None:
+    if on_stage is not None:
+        on_stage(stage, counts)
+
+
+async def _get_agreement(agreement_id: str) -> dict:
+    agreement = await run_io_bound(agreement_storage.get_agreement, agreement_id)
+    if agreement is None:
+        raise KeyError(f"No S3 key found for agreement_id: {agreement_id}")
+    return agreement
+
+
+def _stage_keys(agreement: dict, mode: str) -> dict[str, str]:
+    """Keys of the extraction stages, chained from the PDF's content hash."""
+    from app.agents.pdf_extractor import (
+        EXTRACTION_MODEL_ID,
+        EXTRACTION_PROMPT_VERSION,
+        model_key,
+    )
+    from app.services.section_extraction import EXTRACTION_SECTIONS
+
+    # Agreements uploaded before content hashing: their S3 object is immutable
+    source = agreement.get("content_hash") or agreement["s3_key"]
+    keys = {"fetch": stage_key("fetch", source)}
+    keys["parse"] = stage_key("parse", keys["fetch"])
+    keys["index"] = stage_key(
+        "index",
+        keys["parse"],
+        settings.rag_chunker,
+        settings.rag_chunk_max_chars,
+        settings.rag_chunk_min_chars,
+        settings.embedding_model_name,
+    )
+    if mode == "sections":
+        queries = [(section.name, section.queries) for section in EXTRACTION_SECTIONS]
+        budget = settings.extraction_section_tokens
+    else:
+        queries = EXTRACTION_QUERIES
+        budget = settings.extraction_context_tokens
+    keys["retrieve"] = stage_key(
+        "retrieve",
+        keys["index"],
+        mode,
+        queries,
+        budget,
+        settings.context_tokenizer,
+        settings.rag_hybrid_search,
+    )
+    keys["extract"] = stage_key(
+        "extract",
+        keys["retrieve"],
+        EXTRACTION_PROMPT_VERSION,
+        model_key(EXTRACTION_MODEL_ID),
+        settings.extraction_reask_attempts,
+    )
+    return keys
+
+
+async def _fetch(agreement_id: str):
+    """The agreement PDF (an mmap of the local blob cache copy, or bytes)."""
+    s3_key = await run_io_bound(agreement_storage.get_s3_key, agreement_id)
+    return await s3_service.open_file(s3_key)
+
+
+async def _parse(
+    run: PipelineRun,
+    agreement_id: str,
+    agreement: dict,
+    keys: dict,
+    on_stage: StageEvents = None,
+) -> ParsedDocument:
+    """fetch + parse: the agreement's page texts."""
+    content_hash = agreement.get("content_hash")
+
+    async def parsed() -> Optional[ParsedDocument]:
+        return pdf_service.get_parsed(content_hash) if content_hash else None
+
+    document = await run.memoized("parse", keys["parse"], parsed)
+    if document is None:
+        pdf_bytes = await run.run(
+            "fetch", keys["fetch"], lambda: _fetch(agreement_id), memoize=False
+        )
+        _notify(on_stage, "downloaded", bytes=len(pdf_bytes))
+        try:
+            document = await run.run(
+                "parse",
+                keys["parse"],
+                lambda: run_cpu_bound(pdf_service.parse, pdf_bytes),
+                memoize=False,
+            )
+        finally:
+            # Page texts are extracted eagerly, so the map isn't needed after
+            if isinstance(pdf_bytes, mmap.mmap):
+                pdf_bytes.close()
+    _notify(on_stage, "parsed", pages=document.page_count)
+    return document
+
+
+async def _index(
+    run: PipelineRun,
+    agreement_id: str,
+    agreement: dict,
+    keys: dict,
+    on_stage: StageEvents = None,
+):
+    """fetch + parse + index, as far back as needed. Returns the RAGService."""
+    from app.services.rag_service import get_rag_service
+
+    rag = await run_cpu_bound(get_rag_service)
+    content_hash = agreement.get("content_hash")
+
+    async def indexed() -> Optional[int]:
+        if not content_hash:
+            return None
+        return (
+            await run_cpu_bound(rag.indexed_chunks, agreement_id, content_hash) or None
+        )
+
+    chunk_count = await run.memoized("index", keys["index"], indexed)
+    if chunk_count is None:
+        document = await _parse(run, agreement_id, agreement, keys, on_stage)
+        # Only changed chunks are embedded if it was indexed from other content
+        chunk_count = await run.run(
+            "index",
+            keys["index"],
+            lambda: run_cpu_bound(
+                rag.index_pages,
+                agreement_id,
+                enumerate(document.page_texts, start=1),
+                content_hash=document.content_hash,
+            ),
+            memoize=False,
+        )
+    _notify(on_stage, "indexed", chunks=chunk_count)
+    return rag
+
+
+async def _retrieve(
+    run: PipelineRun,
+    agreement_id: str,
+    agreement: dict,
+    keys: dict,
+    mode: str,
+    on_stage: StageEvents = None,
+) -> dict:
+    """
+    The retrieve stage: {"text": ...} for a single extraction call, or
+    {"texts": {section name: text}} for settings.extraction_mode "sections".
+    """
+    from app.services.context_packer import get_token_counter
+    from app.services.section_extraction import retrieve_sections
+
+    retrieved = await run.memoized("retrieve", keys["retrieve"])
+    if retrieved is None:
+        rag = await _index(run, agreement_id, agreement, keys, on_stage)
+        count_tokens = get_token_counter()
+
+        async def retrieve() -> dict:
+            if mode == "sections":
+                texts = await retrieve_sections(rag, agreement_id)
+                tokens = sum(count_tokens(text) for text in texts.values())
+                return {"texts": texts, "tokens": tokens}
+
+            # Deeper candidate lists; the token budget decides what is kept
+            text = await run_cpu_bound(
+                rag.get_relevant_text,
+                document_id=agreement_id,
+                queries=EXTRACTION_QUERIES,
+                n_per_query=6,
+                rank_by="similarity",
+                max_tokens=settings.extraction_context_tokens,
+            )
+            return {"text": text, "tokens": count_tokens(text)}
+
+        retrieved = await run.run("retrieve", keys["retrieve"], retrieve)
+    _notify(on_stage, "retrieved", tokens=retrieved["tokens"])
+    return retrieved
+
+
+async def _extract(
+    run: PipelineRun,
+    agreement_id: str,
+    on_stage: StageEvents = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> dict:
+    """
+    The extract stage, running whatever stages before it are not memoized.
+
+    settings.extraction_mode picks one LLM call over all retrieved text, or
+    concurrent per-section calls merged afterwards (see section_extraction).
+    Streaming (on_delta) is always a single call.
+    """
+    from app.agents.pdf_extractor import extract_covenants_from_text
+    from app.services.section_extraction import extract_sections
+
+    agreement = await _get_agreement(agreement_id)
+    mode = "single" if on_delta is not None else settings.extraction_mode
+    keys = _stage_keys(agreement, mode)
+
+    extraction_result = await run.memoized("extract", keys["extract"])
+    if extraction_result is not None:
+        return extraction_result
+
+    retrieved = await _retrieve(run, agreement_id, agreement, keys, mode, on_stage)
+
+    async def extract() -> dict:
+        if "texts" in retrieved:
+            result = await extract_sections(retrieved["texts"])
+        else:
+            result = await run_io_bound(
+                extract_covenants_from_text, retrieved["text"], on_delta=on_delta
+            )
+        if not result["success"]:
+            raise PipelineError(
+                f"Extraction failed: {result.get('error', 'Unknown error')}"
+            )
+        return result
+
+    return await run.run("extract", keys["extract"], extract)
+
+
+async def _codegen(run: PipelineRun, covenant_data: dict) -> tuple[str, Optional[str]]:
+    """
+    The codegen stage (generation + validation), keyed by the covenant data.
+
+    Returns (code, validation error or None). Only code that passed
+    validation is memoized, so a bad generation is retried next time.
+    """
+    from app.agents.pdf_extractor import (
+        CODE_GENERATION_MODEL_ID,
+        CODE_GENERATION_PROMPT_VERSION,
+        generate_python_code,
+        model_key,
+    )
+    from app.services.covenant_engine import CovenantCodeError, compile_covenants
+
+    key = stage_key(
+        "codegen",
+        _without_none(covenant_data),
+        CODE_GENERATION_PROMPT_VERSION,
+        model_key(CODE_GENERATION_MODEL_ID),
+    )
+
+    async def codegen() -> dict:
+        code = await run_io_bound(generate_python_code, covenant_data)
+        run.start("validate")
+        try:
+            compiled = await run_cpu_bound(compile_covenants, code)
+            await run_cpu_bound(compiled.load)
+        except CovenantCodeError as e:
+            return {"code": code, "validation_error": str(e)}
+        return {"code": code, "validation_error": None}
+
+    output = await run.memoized("codegen", key)
+    if output is None:
+        output = await run.run(
+            "codegen",
+            key,
+            codegen,
+            memoize=lambda output: output["validation_error"] is None,
+        )
+    return output["code"], output["validation_error"]
+
+
+def _without_none(value):
+    """Drop None fields: stored covenants omit them (see storage)."""
+    if isinstance(value, dict):
+        return {k: _without_none(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_without_none(item) for item in value]
+    return value
+
+
+def _with_provenance(covenant_data: dict, copied_from: Optional[str]) -> dict:
+    """Covenant data to store, recording the agreement it was copied from."""
+    if copied_from is None:
+        return covenant_data
+    return {**covenant_data, "copied_from": copied_from}
+
+
+async def _save_extraction(agreement_id: str, extraction_result: dict) -> dict:
+    """Store extracted covenants for /calculate and build the /extract body."""
+    from app.services.covenant_store import save_covenants
+
+    covenant_data = {
+        "ebitda_definition": extraction_result.get("ebitda_definition"),
+        "covenants": extraction_result.get("covenants", []),
+    }
+    copied_from = extraction_result.get("copied_from")
+    await run_io_bound(
+        save_covenants, agreement_id, _with_provenance(covenant_data, copied_from)
+    )
+
+    return {
+        "agreement_id": agreement_id,
+        "extraction_time": datetime.utcnow().isoformat(),
+        "success": True,
+        **covenant_data,
+        # Agreement whose extraction was reused (identical PDF), else None
+        "copied_from": copied_from,
+        "raw_response": extraction_result.get("raw_response"),
+        # Items dropped because they failed schema validation, even re-asked
+        "validation_errors": extraction_result.get("validation_errors") or [],
+    }
+
+
+async def run_extract(agreement_id: str, progress: Progress = None) -> dict:
+    """Extract covenant definitions from an agreement using RAG and AI."""
+    from app.services.covenant_store import find_covenants_by_content
+
+    # The same PDF was uploaded and extracted before: no LLM work needed
+    previous = await run_io_bound(find_covenants_by_content, agreement_id)
+    if previous is not None:
+        _report(progress, "save")
+        return await _save_extraction(agreement_id, {**previous, "raw_response": None})
+
+    extraction_result = await _extract(
+        PipelineRun(agreement_id, progress), agreement_id
+    )
+
+    _report(progress, "save")
+    return await _save_extraction(agreement_id, extraction_result)
+
+
+def _replay(extraction_result: dict) -> Iterator[tuple[str, dict]]:
+    """The events of an extraction that was not streamed (stored or memoized)."""
+    if extraction_result.get("ebitda_definition"):
+        yield "ebitda_definition", extraction_result["ebitda_definition"]
+    for covenant in extraction_result.get("covenants") or []:
+        yield "covenant", covenant
+
+
+async def stream_extract(agreement_id: str) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Run /extract, yielding (event, data) as each stage finishes.
+
+    Events: "stage" ({"stage": "downloaded" | "parsed" | "indexed" |
+    "retrieved", ...counts}, for the stages that had to run),
+    "ebitda_definition", "covenant" (one per covenant, as soon as the
+    streamed response contains it) and finally "done" with the same body
+    /extract returns.
+
+    Streamed pieces are validated and normalized like the final result (see
+    extraction_schema.validate_piece); a piece that fails is not sent, and
+    only appears in "done" if the re-ask fixes it. "done" is authoritative.
+
+    Always a single streamed LLM call, whatever settings.extraction_mode.
+    """
+    from app.services.covenant_store import find_covenants_by_content
+    from app.services.extraction_schema import validate_piece
+    from app.services.json_stream import ExtractionStreamParser
+
+    previous = await run_io_bound(find_covenants_by_content, agreement_id)
+    if previous is not None:
+        yield "stage", {"stage": "cached"}
+        for event in _replay(previous):
+            yield event
+        yield "done", await _save_extraction(
+            agreement_id, {**previous, "raw_response": None}
+        )
+        return
+
+    # Stage events come from the event loop, model deltas from the I/O pool;
+    # both arrive through one queue
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    extraction = asyncio.ensure_future(
+        _extract(
+            PipelineRun(agreement_id),
+            agreement_id,
+            on_stage=lambda stage, counts: events.put_nowait(
+                ("stage", {"stage": stage, **counts})
+            ),
+            on_delta=lambda delta: loop.call_soon_threadsafe(
+                events.put_nowait, ("delta", delta)
+            ),
+        )
+    )
+    parser = ExtractionStreamParser()
+    streamed = False
+
+    def handle(item: tuple[str, object]) -> list[tuple[str, dict]]:
+        nonlocal streamed
+        kind, payload = item
+        if kind == "stage":
+            return [("stage", payload)]
+        streamed = True
+        pieces = []
+        for event, value in parser.feed(payload):
+            piece = validate_piece(event, value)
+            if piece is not None:
+                pieces.append((event, piece))
+        return pieces
+
+    try:
+        while True:
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait(
+                {getter, extraction}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not getter.done():
+                getter.cancel()
+                break
+            for event in handle(getter.result()):
+                yield event
+    finally:
+        if not extraction.done():
+            # Client went away; the call finishes in the background and is cached
+            extraction.add_done_callback(lambda task: task.exception())
+
+    # Events queued before the extraction returned
+    while not events.empty():
+        for event in handle(events.get_nowait()):
+            yield event
+
+    extraction_result = extraction.result()
+    if not streamed:
+        # Served from the extract stage's memo: nothing came from the model
+        yield "stage", {"stage": "cached"}
+        for event in _replay(extraction_result):
+            yield event
+    yield "done", await _save_extraction(agreement_id, extraction_result)
+
+
+async def run_generate_code(
+    agreement_id: str, progress: Progress = None
+) -> GeneratedCodeResponse:
+    """Generate executable Python code from extracted covenant definitions.
+
+    With a stored extraction only the codegen stage runs (and is itself
+    memoized by the covenant data).
+    """
+    from app.services.covenant_store import (
+        find_covenants_by_content,
+        get_covenants,
+        save_covenants,
+        save_generated_code,
+    )
+
+    run = PipelineRun(agreement_id, progress)
+
+    # Reuse the stored extraction (including manual edits) when /extract ran
+    stored = await run_io_bound(get_covenants, agreement_id)
+    from_identical_pdf = stored is None
+    if from_identical_pdf:
+        stored = await run_io_bound(find_covenants_by_content, agreement_id)
+
+    if stored is not None:
+        covenant_data = {
+            "ebitda_definition": stored.get("ebitda_definition"),
+            "covenants": stored.get("covenants", []),
+        }
+        if from_identical_pdf:
+            await run_io_bound(
+                save_covenants,
+                agreement_id,
+                _with_provenance(covenant_data, stored["copied_from"]),
+            )
+    else:
+        extraction_result = await _extract(run, agreement_id)
+        covenant_data = {
+            "ebitda_definition": extraction_result.get("ebitda_definition"),
+            "covenants": extraction_result.get("covenants", []),
+        }
+        await run_io_bound(save_covenants, agreement_id, covenant_data)
+
+    generated_code, validation_error = await _codegen(run, covenant_data)
+    function_names = re.findall(r"def (\w+)\(", generated_code)
+    contract_refs = list(set(re.findall(r"Section [\d.]+\([a-z]\)?", generated_code)))
+
+    # Validated and compiled once; /calculate then runs this agreement's code
+    if validation_error is None:
+        await run_io_bound(save_generated_code, agreement_id, generated_code)
+
+    return GeneratedCodeResponse(
+        agreement_id=agreement_id,
+        code=generated_code,
+        functions=function_names,
+        generation_time=datetime.utcnow(),
+        contract_refs=contract_refs,
+        executable=validation_error is None,
+        validation_error=validation_error,
+    )
@@ -0,0 +1,145 @@
+"""
+Named, memoized pipeline stages.
+
+    fetch -> parse -> index -> retrieve -> extract -> codegen
+
+Every stage has a key: a hash of its name and everything its output depends
+on, i.e. the key of the stage before it plus the stage's own settings
+(chunker, queries, token budget, prompt version, model). The chain starts at
+the PDF's content hash, so all keys are known before anything runs, and a
+stage whose output is memoized under its key makes everything before it
+unnecessary: extracting an agreement whose retrieval is memoized never
+downloads or parses the PDF.
+
+Where each stage's memo lives:
+- fetch: the local blob cache (s3_service)
+- parse: PDFService's parse cache, by content hash
+- index: the vector store, whose collections are signed with the content
+  hash and chunker
+- retrieve, extract, codegen: the stage cache (see extraction_cache)
+
+Each stage that runs or is served from its memo is timed and recorded for
+the agreement (latest run per stage), see GET /agreements/stages/{agreement_id}.
+"""
+
+import hashlib
+import json
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional, TypeVar, Union
+
+from app.services.executors import run_io_bound
+from app.services.extraction_cache import get_stage_cache
+from app.services.storage import get_storage
+
+PIPELINE_STAGES = ("fetch", "parse", "index", "retrieve", "extract", "codegen")
+
+T = TypeVar("T")
+
+
+def stage_key(stage: str, *inputs: Any) -> str:
+    """Hash a stage name with everything its output depends on."""
+    digest = hashlib.sha256(stage.encode("utf-8"))
+    for value in inputs:
+        digest.update(b"\0")
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class StageRun:
+    """Timing of one stage of one pipeline run."""
+
+    stage: str
+    stage_key: str
+    cached: bool
+    duration_ms: float
+    finished_at: str
+
+
+class PipelineRun:
+    """
+    The stages of one pipeline run for one agreement.
+
+    Args:
+        agreement_id: Agreement the timings are recorded for
+        progress: Called with each stage name as it starts (job progress,
+            see job_queue); stages that never run are left out
+    """
+
+    def __init__(
+        self, agreement_id: str, progress: Optional[Callable[[str], None]] = None
+    ):
+        self.agreement_id = agreement_id
+        self.progress = progress
+        self.runs: list[StageRun] = []
+
+    async def memoized(
+        self,
+        stage: str,
+        key: str,
+        lookup: Optional[Callable[[], Awaitable[Optional[T]]]] = None,
+    ) -> Optional[T]:
+        """
+        The stage's memoized output, recorded as a cached run, or None.
+
+        Args:
+            lookup: Finds the output where the stage keeps it (default: the
+                stage cache, under `key`)
+        """
+        started = time.perf_counter()
+        if lookup is None:
+            output = await run_io_bound(get_stage_cache().get, key)
+        else:
+            output = await lookup()
+        if output is not None:
+            self.start(stage)
+            await self.record(stage, key, cached=True, started=started)
+        return output
+
+    async def run(
+        self,
+        stage: str,
+        key: str,
+        compute: Callable[[], Awaitable[T]],
+        memoize: Union[bool, Callable[[T], bool]] = True,
+    ) -> T:
+        """
+        Run a stage and record its timing.
+
+        Args:
+            compute: Produces the output; if it raises, nothing is memoized
+                or recorded
+            memoize: Store the output (a JSON-able dict) in the stage cache,
+                or a predicate deciding from the output. False for stages
+                memoized elsewhere (fetch, parse, index)
+        """
+        self.start(stage)
+        started = time.perf_counter()
+        output = await compute()
+        if memoize is True or (callable(memoize) and memoize(output)):
+            await run_io_bound(get_stage_cache().set, key, output)
+        await self.record(stage, key, cached=False, started=started)
+        return output
+
+    def start(self, stage: str) -> None:
+        if self.progress is not None:
+            self.progress(stage)
+
+    async def record(self, stage: str, key: str, cached: bool, started: float) -> None:
+        """Record a stage that took from `started` (perf_counter) until now."""
+        run = StageRun(
+            stage=stage,
+            stage_key=key,
+            cached=cached,
+            duration_ms=round((time.perf_counter() - started) * 1000, 2),
+            finished_at=datetime.utcnow().isoformat(),
+        )
+        self.runs.append(run)
+        await run_io_bound(get_storage().save_stage_run, self.agreement_id, asdict(run))
+
+
+def get_stage_runs(agreement_id: str) -> list[dict]:
+    """Latest run of each stage for an agreement, in the order they finished."""
+    return get_storage().get_stage_runs(agreement_id)
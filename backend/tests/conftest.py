@@ -0,0 +1,26 @@
+"""
+Test settings: app.config reads the environment once, on first import, so
+these are set before any test module imports the app.
+"""
+
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="covenant-tests-")
+
+for name, value in {
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_REGION": "us-east-1",
+    "AWS_S3_BUCKET_NAME": "covenant-tests",
+    "LLM_PROVIDER": "fake",
+    "LLM_FAKE_LATENCY_MS": "0",
+    "STORAGE_BACKEND": "memory",
+    "BLOB_CACHE_ENABLED": "false",
+    "EXTRACTION_CACHE_BACKEND": "memory",
+    "CHROMA_PERSIST_DIRECTORY": os.path.join(_tmp, "chroma"),
+    "STAGE_CACHE_DIR": os.path.join(_tmp, "stage_cache"),
+    "EXTRACTION_CACHE_DIR": os.path.join(_tmp, "extraction_cache"),
+    "BLOB_CACHE_DIR": os.path.join(_tmp, "blob_cache"),
+}.items():
+    os.environ[name] = value
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import agreements
+from app.main import app
+from app.schemas.agreement import AgreementUploadResponse
+from app.services import agreement_storage, covenant_store, storage
+from app.workflows import stages
+
+PDF = {"file": ("amended.pdf", b"%PDF-1.4", "application/pdf")}
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def stored_pdf(monkeypatch):
+    """Replace the S3 upload and parse with recording the new content hash."""
+
+    async def store(agreement_id, file):
+        agreement_storage.save_s3_key(
+            agreement_id, "agreements/new_amended.pdf", content_hash="amended"
+        )
+        return AgreementUploadResponse(
+            agreement_id=agreement_id,
+            filename=file.filename,
+            page_count=1,
+            s3_key="agreements/new_amended.pdf",
+            upload_time=datetime.utcnow(),
+            definitions_found=False,
+        )
+
+    monkeypatch.setattr(agreements, "_store_agreement_pdf", store)
+
+
+def test_amendment_keeps_the_agreement_and_drops_its_covenants(client, stored_pdf):
+    agreement_storage.save_s3_key(
+        "agr_amended", "agreements/old.pdf", content_hash="original"
+    )
+    covenant_store.save_covenants(
+        "agr_amended",
+        {"covenants": [{"name": "DSCR", "limit_value": 1.2}], "generated_code": "x"},
+    )
+
+    response = client.post("/api/v1/agreements/upload/agr_amended", files=PDF)
+
+    assert response.status_code == 200
+    assert response.json()["agreement_id"] == "agr_amended"
+    assert agreement_storage.get_agreement("agr_amended")["content_hash"] == "amended"
+    assert covenant_store.get_covenants("agr_amended") is None
+    assert covenant_store.get_limit_index("agr_amended") == {}
+
+
+def test_amendment_of_unknown_agreement_is_404(client, stored_pdf):
+    response = client.post("/api/v1/agreements/upload/agr_missing", files=PDF)
+
+    assert response.status_code == 404
+
+
+class OffLoopStorage:
+    """Storage proxy that fails when called from the event loop's thread."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        method = getattr(self.backend, name)
+
+        def call(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return method(*args, **kwargs)
+            raise AssertionError(f"storage.{name} called on the event loop")
+
+        return call
+
+
+@pytest.fixture
+def off_loop_storage(monkeypatch):
+    backend = storage.get_storage()
+    proxy = OffLoopStorage(backend)
+    for module in (storage, agreement_storage, covenant_store, stages):
+        monkeypatch.setattr(module, "get_storage", lambda: proxy)
+    return backend
+
+
+def test_routes_read_and_write_storage_off_the_event_loop(client, off_loop_storage):
+    agreement_storage.save_s3_key("agr_off_loop", "agreements/off_loop.pdf")
+    base = "/api/v1/agreements"
+
+    edited = client.put(
+        f"{base}/covenants/agr_off_loop",
+        json={"covenants": [{"name": "DSCR", "limit_value": 1.1}]},
+    )
+    calculated = client.post(
+        f"{base}/calculate",
+        json={
+            "agreement_id": "agr_off_loop",
+            "consolidated_ebit": 100.0,
+            "senior_debt": 300.0,
+            "total_debt": 400.0,
+            "interest_expense": 20.0,
+        },
+    )
+    timings = client.get(f"{base}/stages/agr_off_loop")
+
+    assert edited.status_code == 200
+    assert calculated.status_code == 200
+    assert calculated.json()["covenants"][2]["limit"] == 1.1
+    assert timings.status_code == 200
+
+
+def test_pipeline_stage_timings_are_saved_off_the_event_loop(off_loop_storage):
+    async def parse():
+        return {"pages": 1}
+
+    run = stages.PipelineRun("agr_stage_timings")
+    asyncio.run(run.run("parse", "key_parse", parse, memoize=False))
+
+    recorded = off_loop_storage.get_stage_runs("agr_stage_timings")
+    assert [r["stage"] for r in recorded] == ["parse"]
@@ -0,0 +1,62 @@
+from app.agents.fake_llm import FAKE_CODE
+from app.services import covenant_store
+from app.services.batch_calculator import calculate_batch
+
+COLUMNS = {
+    "consolidated_ebit": [100.0, 100.0],
+    "depreciation": [10.0, 10.0],
+    "amortisation": None,
+    "impairment_costs": None,
+    "senior_debt": [300.0, 300.0],
+    "total_debt": [400.0, 400.0],
+    "interest_expense": [20.0, 20.0],
+    "principal_payments": [10.0, 10.0],
+}
+
+
+def test_zero_limit_is_not_replaced_by_the_default():
+    covenant_store.save_covenants(
+        "agr_batch_zero",
+        {"covenants": [{"name": "Debt Service Coverage Ratio", "limit_value": 0}]},
+    )
+
+    result = calculate_batch(["agr_batch_zero"], COLUMNS)
+
+    assert result["covenants"]["dscr"]["limits"] == [0.0, 0.0]
+    assert result["covenants"]["senior_leverage"]["limits"] == [6.75, 6.75]
+
+
+def test_rows_of_agreements_with_generated_code_run_it():
+    covenant_store.save_covenants(
+        "agr_batch_code", {"covenants": [{"name": "Leverage Ratio"}]}
+    )
+    covenant_store.save_generated_code("agr_batch_code", FAKE_CODE)
+
+    result = calculate_batch(["agr_batch_code", "agr_batch_plain"], COLUMNS)
+
+    assert result["engines"] == ["generated", "builtin"]
+    assert result["engine_errors"] == {}
+    assert result["ebitda"] == [110.0, 110.0]
+    # The generated "Leverage Ratio" (Clause 24.2(a)) is a senior leverage test
+    leverage = result["covenants"]["senior_leverage"]
+    assert leverage["values"] == [round(400 / 110, 2), round(300 / 110, 2)]
+    assert leverage["limits"] == [4.0, 6.75]
+    assert leverage["section_refs"]["agr_batch_code"] == "Clause 24.2(a)"
+    # Covenants only one engine reports are null in the other's rows
+    assert result["covenants"]["dscr"]["values"][0] is None
+    assert result["covenants"]["interest_cover"]["values"] == [5.5, None]
+    assert result["covenants"]["interest_cover"]["breached"] == [False, False]
+
+
+def test_failing_generated_code_falls_back_to_builtin():
+    covenant_store.save_covenants("agr_batch_broken", {"covenants": []})
+    covenant_store.save_generated_code(
+        "agr_batch_broken",
+        'def calculate_covenants(financials: dict) -> dict:\n    raise ValueError("no")\n',
+    )
+
+    result = calculate_batch(["agr_batch_broken"], COLUMNS)
+
+    assert result["engines"] == ["builtin", "builtin"]
+    assert "no" in result["engine_errors"]["agr_batch_broken"]
+    assert result["covenants"]["dscr"]["values"] == [3.67, 3.67]
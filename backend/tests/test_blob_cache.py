@@ -0,0 +1,82 @@
+import io
+
+from app.services.blob_cache import BlobCache
+
+
+def _writer(data: bytes):
+    return lambda f: f.write(data)
+
+
+def test_stats_track_the_directory_without_listing_it(tmp_path, monkeypatch):
+    cache = BlobCache(str(tmp_path), max_bytes=250)
+    cache.get_path("a", _writer(b"x" * 100))
+    cache.get_path("b", _writer(b"y" * 100))
+    cache.get_path("a", _writer(b"unused"))
+
+    monkeypatch.setattr(
+        type(cache.directory),
+        "glob",
+        lambda *args: (_ for _ in ()).throw(AssertionError("directory listed")),
+    )
+    stats = cache.stats()
+
+    assert stats["entries"] == 2
+    assert stats["bytes_cached"] == 200
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_eviction_and_discard_update_the_totals(tmp_path):
+    cache = BlobCache(str(tmp_path), max_bytes=250)
+    for key in ("a", "b", "c"):
+        cache.get_path(key, _writer(b"z" * 100))
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes_cached"] == 200
+    assert cache.stats()["evictions"] == 1
+
+    for key in ("a", "b", "c"):
+        cache.discard(key)
+
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bytes_cached"] == 0
+
+
+def test_directory_is_only_listed_once_past_the_limit(tmp_path, monkeypatch):
+    cache = BlobCache(str(tmp_path), max_bytes=250)
+    listings = []
+    glob = type(cache.directory).glob
+    monkeypatch.setattr(
+        type(cache.directory),
+        "glob",
+        lambda self, pattern: listings.append(pattern) or glob(self, pattern),
+    )
+
+    cache.get_path("a", _writer(b"x" * 100))
+    cache.put("b", io.BytesIO(b"y" * 100))
+    cache.put("b", io.BytesIO(b"y" * 120))  # replaced, not added
+
+    assert listings == []
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes_cached"] == 220
+
+    cache.get_path("c", _writer(b"z" * 100))
+
+    assert len(listings) == 1
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes_cached"] <= 250
+
+
+def test_existing_files_are_counted_on_start(tmp_path):
+    BlobCache(str(tmp_path), max_bytes=1000).get_path("a", _writer(b"x" * 10))
+
+    assert BlobCache(str(tmp_path), max_bytes=1000).stats()["bytes_cached"] == 10
+
+
+def test_memory_map_can_be_closed_after_reading(tmp_path):
+    cache = BlobCache(str(tmp_path), max_bytes=1000)
+
+    with cache.open_mmap("a", _writer(b"%PDF-1.4")) as mapped:
+        assert mapped[:4] == b"%PDF"
+
+    assert mapped.closed
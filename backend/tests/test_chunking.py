@@ -0,0 +1,60 @@
+import pytest
+from pydantic import ValidationError
+
+from app.config import Settings
+from app.services.chunking import ClauseChunker, PageIndex
+
+COVENANTS_PAGE = (
+    "24. FINANCIAL COVENANTS\n"
+    "24.1 Financial definitions\n"
+    + "In this Clause the following terms apply. " * 20
+    + "\n24.2 Financial condition\n"
+    "(a) Leverage must not exceed 3.00:1.\n"
+)
+
+
+def test_page_index_finds_the_page_of_an_offset():
+    pages = [(7, "a" * 10), (8, "b" * 10)]
+    text = "\n\n".join(f"[PAGE {number}]\n{body}" for number, body in pages)
+    index = PageIndex.from_pages(pages)
+
+    assert index.page_at(-1) is None
+    assert index.page_at(0) == 7
+    assert index.page_at(text.index("[PAGE 8]") - 1) == 7
+    assert index.page_at(text.index("[PAGE 8]")) == 8
+    assert index.page_span(0, len(text)) == (7, 8)
+
+
+def test_chunks_start_at_clause_headings_and_carry_their_page_span():
+    pages = [(1, COVENANTS_PAGE), (2, "(b) Interest Cover must be at least 4.00:1.")]
+    text = "\n\n".join(f"[PAGE {number}]\n{body}" for number, body in pages)
+
+    chunks = list(ClauseChunker(max_chars=600, min_chars=100).chunk_pages(pages))
+
+    last = chunks[-1]
+    assert last["clause"] == "24.2"
+    assert last["text"].startswith("24.2 Financial condition")
+    assert (last["page_start"], last["page_end"]) == (1, 2)
+    for chunk in chunks:
+        assert text[chunk["start_char"] : chunk["end_char"]] == chunk["text"]
+        assert len(chunk["text"]) <= 600
+
+
+def test_overlap_is_capped_so_small_chunks_still_advance():
+    # Without the cap, a 200-character overlap on 100-character chunks moves
+    # on by one character per chunk
+    chunks = list(
+        ClauseChunker(max_chars=100, min_chars=10, overlap=200).chunk_pages(
+            [(1, "x" * 3000)]
+        )
+    )
+
+    assert len(chunks) < 3000 / 50
+    assert chunks[-1]["end_char"] == len("[PAGE 1]\n") + 3000
+
+
+def test_min_chars_must_be_below_max_chars():
+    with pytest.raises(ValueError):
+        ClauseChunker(max_chars=400, min_chars=400)
+    with pytest.raises(ValidationError):
+        Settings(rag_chunk_max_chars=300, rag_chunk_min_chars=400)
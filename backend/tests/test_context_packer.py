@@ -0,0 +1,65 @@
+from app.services.context_packer import pack_context
+
+DOCUMENT = "".join(f"Sentence {i:02d}. " for i in range(40))
+
+
+def chunk(start: int, end: int, page: int = 1, clause: str = "") -> dict:
+    return {
+        "text": DOCUMENT[start:end],
+        "metadata": {
+            "start_char": start,
+            "end_char": end,
+            "page": page,
+            "clause": clause,
+        },
+    }
+
+
+def test_overlapping_chunks_are_emitted_once():
+    packed = pack_context([chunk(100, 200), chunk(150, 250)], count_tokens=len)
+
+    assert packed.text == f"[Chunk from Page 1]\n{DOCUMENT[100:250]}"
+    assert packed.chunks_used == 2
+    assert packed.chunks_dropped == 0
+
+
+def test_chunk_covered_by_higher_ranked_ones_adds_nothing():
+    packed = pack_context(
+        [chunk(0, 100), chunk(100, 200), chunk(50, 150)], count_tokens=len
+    )
+
+    assert packed.text.count("Sentence 06.") == 1
+    assert packed.text.endswith(DOCUMENT[:200])
+
+
+def test_chunks_over_budget_are_dropped_and_counted():
+    ranked = [chunk(0, 100), chunk(300, 400), chunk(200, 250)]
+    # Each piece costs its text + header (20) + separator (7)
+    budget = (100 + 27) + (50 + 27)
+
+    packed = pack_context(ranked, max_tokens=budget, count_tokens=len)
+
+    assert packed.chunks_used == 2
+    assert packed.chunks_dropped == 1
+    assert DOCUMENT[300:400] not in packed.text
+    # Document order, not rank order
+    assert packed.text.index(DOCUMENT[:100]) < packed.text.index(DOCUMENT[200:250])
+
+
+def test_touching_pieces_are_merged_under_one_header():
+    packed = pack_context(
+        [chunk(200, 300, page=3), chunk(100, 200, page=2, clause="24.2")],
+        count_tokens=len,
+    )
+
+    assert packed.text == f"[Chunk from Pages 2-3, Clause 24.2]\n{DOCUMENT[100:300]}"
+
+
+def test_chunks_whose_offsets_do_not_match_their_text_are_sent_whole():
+    mismatched = chunk(100, 200)
+    mismatched["metadata"]["end_char"] = 190  # e.g. offsets of a stripped text
+
+    packed = pack_context([chunk(150, 250), mismatched], count_tokens=len)
+
+    assert packed.text.count(DOCUMENT[100:200]) == 1
+    assert packed.chunks_used == 2
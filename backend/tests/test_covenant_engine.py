@@ -0,0 +1,141 @@
+import time
+
+import pytest
+
+from app.agents.fake_llm import FAKE_CODE
+from app.config import settings
+from app.services import covenant_engine
+from app.services.covenant_engine import (
+    ENTRYPOINT,
+    CovenantCodeError,
+    compile_covenants,
+    validate_code,
+)
+
+FINANCIALS = {
+    "consolidated_ebit": 100.0,
+    "depreciation": 10.0,
+    "amortisation": 5.0,
+    "impairment_costs": 0.0,
+    "senior_debt": 300.0,
+    "total_debt": 400.0,
+    "interest_expense": 20.0,
+    "principal_payments": 10.0,
+}
+
+
+def entrypoint(body: str) -> str:
+    """Generated-looking code whose entry point runs `body` first."""
+    lines = "\n".join(f"    {line}" for line in body.strip().splitlines())
+    return f"""def {ENTRYPOINT}(financials: dict) -> dict:
+{lines}
+    return {{"ebitda": 0.0, "covenants": []}}
+"""
+
+
+def test_fake_code_runs_in_sandbox():
+    result = compile_covenants(FAKE_CODE).run(FINANCIALS)
+
+    assert result["ebitda"] == 115.0
+    assert [c["name"] for c in result["covenants"]] == [
+        "Leverage Ratio",
+        "Interest Cover",
+    ]
+
+
+def test_math_is_available_without_import():
+    code = entrypoint("value = math.sqrt(16) + math.pi")
+
+    assert compile_covenants(code).run(FINANCIALS)["covenants"] == []
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        # Module escapes
+        "import typing\n" + entrypoint('typing.sys.modules["os"].getcwd()'),
+        "import math\n" + entrypoint("pass"),
+        "from math import sqrt\n" + entrypoint("pass"),
+        entrypoint("m = math"),
+        entrypoint("f(math)"),
+        entrypoint("math.sys"),
+        # Frame and globals introspection
+        entrypoint("g = (x for x in [1])\nframe = g.gi_frame.f_back"),
+        entrypoint("e = ValueError()\ne.with_traceback(None).tb_frame"),
+        entrypoint('"{0.gi_frame}".format(x for x in [1])'),
+        entrypoint("financials.__class__"),
+        entrypoint("eval('1')"),
+        entrypoint("__builtins__"),
+        # Constructs outside the allow-list
+        entrypoint("while True:\n    pass"),
+        entrypoint("f = lambda: 1"),
+        "class Evil:\n    pass\n" + entrypoint("pass"),
+    ],
+)
+def test_escapes_are_rejected(code):
+    with pytest.raises(CovenantCodeError):
+        validate_code(code)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "for i in range(10 ** 12):\n    pass",
+        "total = sum(range(10 ** 9))",
+        "value = 10 ** 10 ** 10",
+        "value = 2\nvalue **= 100000",
+    ],
+)
+def test_unbounded_work_fails_fast(body):
+    compiled = compile_covenants(entrypoint(body))
+
+    started = time.monotonic()
+    with pytest.raises(CovenantCodeError, match="ValueError"):
+        compiled.run(FINANCIALS)
+    assert time.monotonic() - started < settings.sandbox_timeout_seconds
+
+
+def test_slow_code_is_stopped_at_the_wall_clock_limit():
+    body = """
+for i in range(100000):
+    for j in range(100000):
+        pass
+"""
+    compiled = compile_covenants(entrypoint(body))
+
+    started = time.monotonic()
+    with pytest.raises(CovenantCodeError, match="ran longer than"):
+        compiled.run(FINANCIALS)
+    assert time.monotonic() - started < settings.sandbox_timeout_seconds + 1
+
+    # The killed worker is replaced
+    assert compile_covenants(FAKE_CODE).run(FINANCIALS)["ebitda"] == 115.0
+
+
+def test_memory_is_limited():
+    compiled = compile_covenants(entrypoint("blob = [0] * (10 ** 9)"))
+
+    with pytest.raises(CovenantCodeError, match="MemoryError"):
+        compiled.run(FINANCIALS)
+
+
+def test_load_reports_top_level_errors():
+    compiled = compile_covenants("RATE = missing_name\n" + entrypoint("pass"))
+
+    with pytest.raises(CovenantCodeError, match="NameError"):
+        compiled.load()
+
+
+def test_run_many_sends_rows_in_batches_and_isolates_failures(monkeypatch):
+    monkeypatch.setattr(covenant_engine, "BATCH_ROWS", 2)
+    code = entrypoint("""
+if financials["consolidated_ebit"] < 0:
+    raise ValueError("negative EBIT")
+""")
+    rows = [dict(FINANCIALS, consolidated_ebit=ebit) for ebit in (1, -1, 2, 3, -2)]
+
+    outcomes = compile_covenants(code).run_many(rows)
+
+    assert [error is None for _, error in outcomes] == [True, False, True, True, False]
+    assert "negative EBIT" in outcomes[1][1]
+    assert outcomes[0][0] == {"ebitda": 0.0, "covenants": []}
@@ -0,0 +1,129 @@
+import sqlite3
+
+import pytest
+
+from app.services import agreement_storage, covenant_store
+from app.services.storage import SQLiteStorage
+
+# The covenants table as released before covenants were classified
+LEGACY_SCHEMA = [
+    """
+    CREATE TABLE extractions (
+        agreement_id      TEXT PRIMARY KEY,
+        ebitda_definition TEXT,
+        generated_code    TEXT,
+        extra             TEXT,
+        updated_at        TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE covenants (
+        agreement_id TEXT NOT NULL,
+        position     INTEGER NOT NULL,
+        name         TEXT,
+        formula      TEXT,
+        legal_text   TEXT,
+        section_ref  TEXT,
+        page         INTEGER,
+        limit_value  REAL,
+        limit_type   TEXT,
+        extra        TEXT,
+        PRIMARY KEY (agreement_id, position)
+    )
+    """,
+]
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / "covenants.db"))
+    monkeypatch.setattr(covenant_store, "get_storage", lambda: storage)
+    monkeypatch.setattr(agreement_storage, "get_storage", lambda: storage)
+    return storage
+
+
+def test_covenants_saved_before_classification_are_indexed(sqlite_storage):
+    legacy = sqlite3.connect(sqlite_storage.path)
+    for statement in LEGACY_SCHEMA:
+        legacy.execute(statement)
+    legacy.execute(
+        "INSERT INTO extractions VALUES ('agr_old', 'null', NULL, '{}', "
+        "'2025-01-01T00:00:00')"
+    )
+    legacy.executemany(
+        "INSERT INTO covenants VALUES ('agr_old', ?, ?, NULL, NULL, ?, NULL, ?, "
+        "'max', '{}')",
+        [
+            (0, "Senior Leverage Ratio", "Clause 24.2(a)", 5.5),
+            (1, "Debt Service Coverage", "Clause 24.2(c)", 1.2),
+        ],
+    )
+    legacy.commit()
+    legacy.close()
+
+    limits = covenant_store.get_limit_index("agr_old")
+
+    assert limits["senior_leverage"].value == 5.5
+    assert limits["dscr"].value == 1.2
+    assert limits["dscr"].section_ref == "Clause 24.2(c)"
+
+
+def test_saved_covenants_are_indexed_by_kind(sqlite_storage):
+    covenant_store.save_covenants(
+        "agr_new",
+        {
+            "covenants": [
+                {"name": "Super Senior Leverage", "limit_value": 7.0},
+                {"name": "Capital Expenditure", "limit_value": 0.0},
+            ]
+        },
+    )
+
+    limits = covenant_store.get_limit_index("agr_new")
+
+    assert limits["super_senior_leverage"].value == 7.0
+    assert limits["capital_expenditure"].value == 0.0
+
+
+def test_unbindable_column_values_round_trip_through_extra(sqlite_storage):
+    covenant = {
+        "name": "Senior Leverage Ratio",
+        "page": [290, 291],
+        "limit_value": 5.5,
+        "limit_type": {"type": "max"},
+    }
+
+    covenant_store.save_covenants("agr_pages", {"covenants": [covenant]})
+
+    assert covenant_store.get_covenants("agr_pages")["covenants"] == [covenant]
+    assert covenant_store.get_limit_index("agr_pages")["senior_leverage"].value == 5.5
+
+
+def _upload(agreement_id: str) -> None:
+    agreement_storage.save_s3_key(
+        agreement_id, f"agreements/{agreement_id}.pdf", content_hash="same-pdf"
+    )
+
+
+def test_identical_pdf_copies_extraction_with_its_source(sqlite_storage):
+    _upload("agr_first")
+    _upload("agr_second")
+    covenant_store.save_covenants(
+        "agr_first", {"covenants": [{"name": "DSCR", "limit_value": 1.2}]}
+    )
+
+    copied = covenant_store.find_covenants_by_content("agr_second")
+
+    assert copied["copied_from"] == "agr_first"
+    assert copied["covenants"] == [{"name": "DSCR", "limit_value": 1.2}]
+
+
+def test_manually_edited_extraction_is_not_copied(sqlite_storage):
+    _upload("agr_first")
+    _upload("agr_second")
+    covenant_store.save_covenants(
+        "agr_first", {"covenants": [{"name": "DSCR", "limit_value": 1.2}]}
+    )
+    covenant_store.update_covenants("agr_first", [{"name": "DSCR", "limit_value": 1.5}])
+
+    assert covenant_store.find_covenants_by_content("agr_second") is None
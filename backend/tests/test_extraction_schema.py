@@ -0,0 +1,161 @@
+from app.services.extraction_schema import ValidatedExtraction, validate_piece
+
+COVENANT = {
+    "name": "Senior Leverage Ratio",
+    "formula": "Senior Debt / EBITDA",
+    "legal_text": "Leverage shall not exceed 4.00:1.",
+    "section_ref": "Clause 24.2(a)",
+    "page": 290,
+    "limit_value": "4.00:1",
+    "limit_type": "Maximum",
+}
+
+ADD_BACK = {"name": "depreciation", "section_ref": "Clause 1.1", "page": 12}
+CAP = {
+    "item": "synergies",
+    "cap_type": "percentage",
+    "cap_value": "20%",
+    "section_ref": "Clause 1.1",
+}
+
+
+def test_valid_items_are_normalized():
+    validated = ValidatedExtraction({"covenants": [COVENANT]})
+
+    assert validated.invalid == {}
+    covenant = validated.covenants[0]
+    assert covenant["limit_value"] == 4.0
+    assert covenant["limit_type"] == "max"
+
+
+def test_missing_or_ranged_pages_keep_the_covenant():
+    covenants = [
+        {key: value for key, value in COVENANT.items() if key != "page"},
+        {**COVENANT, "page": "290-291"},
+        {**COVENANT, "page": [290, 291]},
+        {**COVENANT, "page": "n/a"},
+    ]
+
+    validated = ValidatedExtraction({"covenants": covenants})
+
+    assert validated.invalid == {}
+    assert [c["page"] for c in validated.covenants] == [None, 290, 290, None]
+
+
+def test_invalid_items_are_left_out_and_listed():
+    broken = {"name": "Interest Cover", "limit_value": "n/a"}
+
+    validated = ValidatedExtraction({"covenants": [COVENANT, broken]})
+
+    assert [c["name"] for c in validated.covenants] == ["Senior Leverage Ratio"]
+    assert list(validated.invalid) == ["covenants[1]"]
+    assert validated.invalid["covenants[1]"].value == broken
+    assert any("formula" in error for error in validated.errors())
+
+
+def test_fix_replaces_an_invalid_item_in_place():
+    validated = ValidatedExtraction(
+        {"covenants": [{"name": "Interest Cover"}, COVENANT]}
+    )
+
+    assert not validated.fix("covenants[0]", {"name": "Interest Cover"})
+    assert "covenants[0]" in validated.invalid
+
+    fixed = {**COVENANT, "name": "Interest Cover", "limit_type": "min"}
+    assert validated.fix("covenants[0]", fixed)
+    assert validated.invalid == {}
+    assert [c["name"] for c in validated.covenants] == [
+        "Interest Cover",
+        "Senior Leverage Ratio",
+    ]
+
+
+def test_fix_ignores_paths_that_are_not_invalid():
+    validated = ValidatedExtraction({"covenants": [COVENANT]})
+
+    assert not validated.fix("covenants[0]", {})
+    assert not validated.fix("covenants[7]", COVENANT)
+    assert validated.covenants[0]["name"] == "Senior Leverage Ratio"
+
+
+def test_fix_ebitda_items():
+    validated = ValidatedExtraction(
+        {
+            "ebitda_definition": {
+                "base_metric": "Operating Profit",
+                "section_ref": "Clause 1.1",
+                "add_backs": [ADD_BACK, {"name": "amortisation"}],
+                "caps": [{**CAP, "cap_value": "unlimited"}],
+            }
+        }
+    )
+
+    assert set(validated.invalid) == {
+        "ebitda_definition.add_backs[1]",
+        "ebitda_definition.caps[0]",
+    }
+    assert validated.fix(
+        "ebitda_definition.add_backs[1]",
+        {"name": "amortisation", "section_ref": "Clause 1.1"},
+    )
+    assert validated.fix("ebitda_definition.caps[0]", CAP)
+
+    definition = validated.ebitda_definition
+    assert [a["name"] for a in definition["add_backs"]] == [
+        "depreciation",
+        "amortisation",
+    ]
+    assert definition["caps"][0]["cap_value"] == 0.2
+
+
+def test_invalid_ebitda_header_keeps_its_valid_items():
+    validated = ValidatedExtraction(
+        {
+            "ebitda_definition": {
+                "base_metric": "Operating Profit",
+                "page": 12,
+                "add_backs": [ADD_BACK],
+                "caps": [CAP],
+            }
+        }
+    )
+
+    assert list(validated.invalid) == ["ebitda_definition"]
+    definition = validated.ebitda_definition
+    assert definition["base_metric"] == "Operating Profit"
+    assert "section_ref" not in definition
+    assert definition["add_backs"] == [ADD_BACK]
+    assert definition["caps"][0]["item"] == "synergies"
+
+    assert validated.fix(
+        "ebitda_definition",
+        {"base_metric": "Operating Profit", "section_ref": "Clause 1.1"},
+    )
+    assert validated.invalid == {}
+    assert validated.ebitda_definition["section_ref"] == "Clause 1.1"
+    assert validated.ebitda_definition["add_backs"] == [ADD_BACK]
+
+
+def test_partial_extraction_does_not_require_the_header():
+    validated = ValidatedExtraction(
+        {"ebitda_definition": {"add_backs": [ADD_BACK]}}, partial=True
+    )
+
+    assert validated.invalid == {}
+    assert validated.ebitda_definition["add_backs"] == [ADD_BACK]
+
+
+def test_streamed_pieces_are_validated_like_the_answer():
+    assert validate_piece("covenant", COVENANT)["limit_value"] == 4.0
+    assert validate_piece("covenant", {"name": "Interest Cover"}) is None
+
+    definition = validate_piece(
+        "ebitda_definition", {"base_metric": "Operating Profit", "add_backs": [{}]}
+    )
+    assert definition == {
+        "base_metric": "Operating Profit",
+        "add_backs": [],
+        "deductions": [],
+        "caps": [],
+    }
+    assert validate_piece("unknown", {}) is None
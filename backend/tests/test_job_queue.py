@@ -0,0 +1,148 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.services.job_queue import JobQueue
+from app.services.job_store import MemoryJobStore
+
+
+def leftover_job(worker: str, heartbeat_at: datetime) -> dict:
+    return {
+        "job_id": "job_leftover",
+        "job_key": "agr_1:extract",
+        "agreement_id": "agr_1",
+        "kind": "extract",
+        "status": "running",
+        "stages": [],
+        "result": None,
+        "error": None,
+        "worker": worker,
+        "heartbeat_at": heartbeat_at.isoformat(),
+        "created_at": heartbeat_at.isoformat(),
+        "started_at": heartbeat_at.isoformat(),
+        "finished_at": None,
+    }
+
+
+async def succeed(agreement_id, progress):
+    progress("extract")
+    return {"agreement_id": agreement_id}
+
+
+def submit_after_start(queue: JobQueue) -> tuple[dict, bool]:
+    async def scenario():
+        await queue.start()
+        try:
+            job, created = await queue.submit("agr_1", "extract", succeed, ["extract"])
+            await queue._queue.join()
+            return await queue.get(job["job_id"]), created
+        finally:
+            await queue.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_start_fails_jobs_left_by_a_previous_process_with_the_same_pid():
+    store = MemoryJobStore()
+    queue = JobQueue(store=store)
+    # A restarted container: same hostname, server is PID 1 again
+    store.create(leftover_job(queue.worker_id, datetime.utcnow()))
+
+    job, created = submit_after_start(queue)
+
+    assert created
+    assert job["status"] == "succeeded"
+    assert store.get("job_leftover")["status"] == "failed"
+
+
+def test_jobs_of_another_host_expire_with_their_lease():
+    store = MemoryJobStore()
+    queue = JobQueue(store=store, lease_seconds=60)
+    stale = datetime.utcnow() - timedelta(seconds=120)
+    store.create(leftover_job("other-host:1", stale))
+
+    job, created = submit_after_start(queue)
+
+    assert created
+    assert store.get("job_leftover")["error"].startswith("Interrupted")
+
+
+def test_live_jobs_of_another_host_are_kept():
+    store = MemoryJobStore()
+    queue = JobQueue(store=store, lease_seconds=60)
+    store.create(leftover_job("other-host:1", datetime.utcnow()))
+
+    job, created = submit_after_start(queue)
+
+    assert not created
+    assert job["job_id"] == "job_leftover"
+    assert job["status"] == "running"
+
+
+def test_heartbeat_renews_own_jobs():
+    store = MemoryJobStore()
+    queue = JobQueue(store=store, heartbeat_seconds=0.01)
+
+    async def scenario():
+        await queue.start()
+        release = asyncio.Event()
+
+        async def slow(agreement_id, progress):
+            await release.wait()
+
+        job, _ = await queue.submit("agr_1", "extract", slow, ["extract"])
+        first = store.get(job["job_id"])["heartbeat_at"]
+        await asyncio.sleep(0.05)
+        renewed = store.get(job["job_id"])["heartbeat_at"]
+        release.set()
+        await queue._queue.join()
+        await queue.stop()
+        return first, renewed
+
+    first, renewed = asyncio.run(scenario())
+
+    assert renewed > first
+
+
+class OffLoopJobStore(MemoryJobStore):
+    """Job store that fails when called from the event loop's thread."""
+
+    def __getattribute__(self, name):
+        attribute = super().__getattribute__(name)
+        if name not in ("create", "get", "update", "list_active", "heartbeat"):
+            return attribute
+
+        def call(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return attribute(*args, **kwargs)
+            raise AssertionError(f"job store {name} called on the event loop")
+
+        return call
+
+
+def test_store_is_used_off_the_event_loop_and_progress_stays_ordered():
+    store = OffLoopJobStore()
+    queue = JobQueue(store=store, heartbeat_seconds=0.01)
+
+    async def pipeline(agreement_id, progress):
+        for stage in ("fetch", "extract", "save"):
+            progress(stage)
+        await asyncio.sleep(0.03)
+        return {"agreement_id": agreement_id}
+
+    async def scenario():
+        await queue.start()
+        try:
+            job, _ = await queue.submit(
+                "agr_1", "extract", pipeline, ["fetch", "extract", "save"]
+            )
+            await queue._queue.join()
+            return await queue.get(job["job_id"])
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+
+    assert job["status"] == "succeeded"
+    assert [stage["status"] for stage in job["stages"]] == ["done"] * 3
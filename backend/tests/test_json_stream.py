@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from app.services.json_stream import ExtractionStreamParser, loads_lenient, repair_json
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        # Trailing and missing commas
+        ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}),
+        ('{"a": 1 "b": 2}', {"a": 1, "b": 2}),
+        ("[1 2 3]", [1, 2, 3]),
+        # Python and JS literals
+        (
+            '{"a": True, "b": None, "c": NaN, "d": undefined}',
+            {
+                "a": True,
+                "b": None,
+                "c": None,
+                "d": None,
+            },
+        ),
+        # Single quotes and unquoted keys
+        (
+            "{'name': 'Leverage', limit_value: 4.5}",
+            {
+                "name": "Leverage",
+                "limit_value": 4.5,
+            },
+        ),
+        ("{'text': 'the Borrower\\'s debt'}", {"text": "the Borrower's debt"}),
+        ("{'n': 'it's'}", {"n": "it's"}),
+        (
+            "{'legal_text': 'the Borrower's debt',\n 'page': 3}",
+            {"legal_text": "the Borrower's debt", "page": 3},
+        ),
+        # Comments and fences
+        ('```json\n{"a": 1, // one\n/* two */ "b": 2}\n```', {"a": 1, "b": 2}),
+        # Unescaped quotes inside legal text
+        (
+            '{"legal_text": "the "Borrower" shall ensure", "page": 3}',
+            {"legal_text": 'the "Borrower" shall ensure', "page": 3},
+        ),
+        # Raw newlines and invalid escapes inside strings
+        (
+            '{"a": "line one\nline two", "b": "\\d"}',
+            {
+                "a": "line one\nline two",
+                "b": "\\d",
+            },
+        ),
+        # Truncated answers
+        (
+            '{"covenants": [{"name": "Leverage", "page": 29',
+            {"covenants": [{"name": "Leverage", "page": 29}]},
+        ),
+        ('{"covenants": [{"name": "Lever', {"covenants": [{"name": "Lever"}]}),
+        ('{"a": 1, "b":', {"a": 1, "b": None}),
+        ('{"a": 1, "b"', {"a": 1, "b": None}),
+        # Mismatched closer closes what was left open inside it
+        ('{"a": [1, 2}', {"a": [1, 2]}),
+    ],
+)
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_repair_json_keeps_valid_json():
+    value = {"a": [1, 2.5, -3e-2], "b": {"c": 'd " e \\ f'}, "f": False, "g": None}
+    assert json.loads(repair_json(json.dumps(value))) == value
+
+
+def test_repair_json_needs_an_object_or_array():
+    with pytest.raises(ValueError):
+        repair_json("no json here")
+
+
+def test_loads_lenient_ignores_prose_around_the_value():
+    text = 'Here is the extraction:\n{"covenants": []}\nLet me know!'
+    assert loads_lenient(text) == {"covenants": []}
+
+
+def test_loads_lenient_repairs_invalid_json():
+    assert loads_lenient("{'covenants': [],}") == {"covenants": []}
+
+
+def test_stream_parser_yields_pieces_as_they_close():
+    answer = json.dumps(
+        {
+            "ebitda_definition": {"base_metric": "Operating Profit", "caps": []},
+            "covenants": [{"name": "Leverage"}, {"name": "Interest Cover"}],
+        }
+    )
+    parser = ExtractionStreamParser()
+
+    pieces = []
+    for start in range(0, len(answer), 7):
+        pieces.extend(parser.feed(answer[start : start + 7]))
+
+    assert pieces == [
+        ("ebitda_definition", {"base_metric": "Operating Profit", "caps": []}),
+        ("covenant", {"name": "Leverage"}),
+        ("covenant", {"name": "Interest Cover"}),
+    ]
@@ -0,0 +1,74 @@
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    ("definitions", "Consolidated EBITDA means operating profit before tax."),
+    ("leverage", "24.2 Financial condition: Leverage shall not exceed 4.00:1."),
+    ("cross_ref", "Subject to Clause 24.20, the financial covenants in Clause 24."),
+    ("boilerplate", "The financial condition of each Obligor is tested annually."),
+]
+
+
+def test_clause_numbers_are_single_tokens():
+    assert tokenize("Clause 24.2(b) and 22.1.3") == ["clause", "24.2", "b", "22.1.3"]
+
+
+def test_exact_clause_number_ranks_first():
+    index = BM25Index.build(CHUNKS)
+
+    results = index.search("24.2 financial condition")
+
+    # Not "24.20" or "24." in the cross-reference
+    assert results[0][0] == "leverage"
+
+
+def test_remove_updates_postings():
+    index = BM25Index.build(CHUNKS)
+
+    index.remove("leverage")
+
+    assert "leverage" not in index
+    assert len(index) == 3
+    assert index.search("24.2") == []
+    assert "leverage" not in {chunk_id for chunk_id, _ in index.search("financial")}
+
+
+def test_replacing_a_chunk_drops_its_old_terms():
+    index = BM25Index.build(CHUNKS)
+
+    index.add("leverage", "Interest Cover shall be at least 4.00:1.")
+
+    assert index.search("24.2") == []
+    assert index.search("interest cover")[0][0] == "leverage"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index.build(CHUNKS)
+    index.signature = {"content_hash": "abc", "chunker": "clause"}
+    path = tmp_path / "index.json"
+
+    index.save(path)
+    loaded = BM25Index.load(path)
+
+    assert loaded.signature == index.signature
+    assert len(loaded) == len(index)
+    query = "consolidated EBITDA financial condition 24.2"
+    assert loaded.search(query) == index.search(query)
+    # Removal still works on a loaded index
+    loaded.remove("definitions")
+    assert loaded.search("ebitda") == []
+
+
+def test_load_of_a_missing_or_corrupt_file_is_none(tmp_path):
+    corrupt = tmp_path / "corrupt.json"
+    corrupt.write_text("{not json")
+
+    assert BM25Index.load(tmp_path / "missing.json") is None
+    assert BM25Index.load(corrupt) is None
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "c"]], k=60)
+
+    # Found by both rankings beats first in only one
+    assert [item_id for item_id, _ in fused] == ["b", "c", "a", "d"]
+    assert dict(fused)["b"] == 1 / 62 + 1 / 61
@@ -0,0 +1,28 @@
+from app.agents.pdf_extractor import _reask_context
+from app.services.context_packer import PASSAGE_SEPARATOR
+
+CONTEXT = PASSAGE_SEPARATOR.join(
+    [
+        "[Chunk from Page 3, Clause 1.1]\nDefinitions.",
+        "[Chunk from Pages 28-29, Clause 24.1]\nConsolidated EBITDA means ...",
+        "[Chunk from Page 30, Clause 24.2]\nLeverage shall not exceed 4.00:1.",
+        "[Chunk from Page 31, Clause 24.20]\nOther undertakings.",
+    ]
+)
+
+
+def test_reask_context_keeps_the_passages_items_cite():
+    context = _reask_context(
+        CONTEXT,
+        [
+            {"name": "depreciation", "page": 29},
+            {"name": "Leverage", "section_ref": "Clause 24.2(a)", "page": None},
+        ],
+    )
+
+    assert context.split(PASSAGE_SEPARATOR) == CONTEXT.split(PASSAGE_SEPARATOR)[1:3]
+
+
+def test_reask_context_falls_back_to_the_whole_text():
+    assert _reask_context(CONTEXT, [{"name": "Leverage"}, "not an item"]) == CONTEXT
+    assert _reask_context("raw text", [{"page": 3}]) == "raw text"
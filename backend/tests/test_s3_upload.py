@@ -0,0 +1,88 @@
+import hashlib
+import io
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.config import settings
+from app.services.s3_service import FileTooLargeError, S3Service
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    # S3's smallest multipart part, so a multipart upload needs only a few MB
+    monkeypatch.setattr(settings, "s3_multipart_part_size_mb", 5)
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=settings.s3_bucket_name)
+        yield client
+
+
+def stored(client, key: str) -> bytes:
+    return client.get_object(Bucket=settings.s3_bucket_name, Key=key)["Body"].read()
+
+
+def open_uploads(client) -> list:
+    return client.list_multipart_uploads(Bucket=settings.s3_bucket_name).get(
+        "Uploads", []
+    )
+
+
+def test_small_file_is_put_in_one_request(s3):
+    content = b"%PDF-1.4 small agreement"
+
+    result = S3Service().upload_stream(io.BytesIO(content), "small.pdf")
+
+    assert result.s3_key.startswith("agreements/")
+    assert result.s3_key.endswith("_small.pdf")
+    assert result.size_bytes == len(content)
+    assert result.content_hash == hashlib.sha256(content).hexdigest()
+    assert stored(s3, result.s3_key) == content
+    head = s3.head_object(Bucket=settings.s3_bucket_name, Key=result.s3_key)
+    assert head["ContentType"] == "application/pdf"
+    assert "-" not in head["ETag"]
+
+
+def test_large_file_is_uploaded_in_parts(s3):
+    content = os.urandom(12 * MB)
+
+    result = S3Service().upload_stream(io.BytesIO(content), "large.pdf")
+
+    assert result.size_bytes == len(content)
+    assert result.content_hash == hashlib.sha256(content).hexdigest()
+    assert stored(s3, result.s3_key) == content
+    # Multipart ETags end with the number of parts: 5MB + 5MB + 2MB
+    etag = s3.head_object(Bucket=settings.s3_bucket_name, Key=result.s3_key)["ETag"]
+    assert etag.strip('"').endswith("-3")
+    assert open_uploads(s3) == []
+
+
+def test_file_of_exactly_one_part_is_put_in_one_request(s3):
+    content = os.urandom(5 * MB)
+
+    result = S3Service().upload_stream(io.BytesIO(content), "exact.pdf")
+
+    etag = s3.head_object(Bucket=settings.s3_bucket_name, Key=result.s3_key)["ETag"]
+    assert "-" not in etag
+    assert stored(s3, result.s3_key) == content
+
+
+def test_oversized_multipart_upload_is_aborted(s3):
+    content = os.urandom(16 * MB)
+
+    with pytest.raises(FileTooLargeError):
+        S3Service().upload_stream(io.BytesIO(content), "huge.pdf", max_bytes=11 * MB)
+
+    assert open_uploads(s3) == []
+    assert s3.list_objects_v2(Bucket=settings.s3_bucket_name).get("KeyCount") == 0
+
+
+def test_oversized_small_file_is_not_stored(s3):
+    with pytest.raises(FileTooLargeError):
+        S3Service().upload_stream(io.BytesIO(b"x" * 2048), "small.pdf", max_bytes=1024)
+
+    assert s3.list_objects_v2(Bucket=settings.s3_bucket_name).get("KeyCount") == 0
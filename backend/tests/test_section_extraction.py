@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from app.services import section_extraction
+from app.services.section_extraction import (
+    EXTRACTION_SECTIONS,
+    extract_sections,
+    merge_section_results,
+)
+
+RESULTS = {
+    "ebitda": {
+        "ebitda_definition": {
+            "base_metric": "operating profit",
+            "section_ref": "Clause 24.1",
+            "add_backs": [{"name": "Depreciation"}],
+        },
+        "covenants": [],
+    },
+    "adjustments": {
+        "ebitda_definition": {
+            "base_metric": "",
+            "page": 28,
+            "add_backs": [{"name": "depreciation"}, {"name": "amortisation"}],
+            "caps": [{"item": "synergies", "cap_value": 0.2}],
+        },
+        "covenants": [],
+    },
+    "leverage": {
+        "ebitda_definition": None,
+        "covenants": [
+            {"name": "Leverage Ratio", "limit_value": 4.0, "page": None},
+        ],
+    },
+    "interest_cover": {
+        "ebitda_definition": None,
+        "covenants": [
+            {"name": "Interest Cover", "limit_value": 4.0, "limit_type": "min"},
+            {"name": "leverage ratio", "limit_value": 9.9, "page": 30},
+        ],
+    },
+}
+
+
+def section_results() -> list[tuple[str, dict]]:
+    return [
+        (name, {"success": True, "raw_response": name, **result})
+        for name, result in RESULTS.items()
+    ]
+
+
+def test_merge_deduplicates_and_keeps_the_first_value():
+    merged = merge_section_results(section_results())
+
+    ebitda = merged["ebitda_definition"]
+    assert ebitda["base_metric"] == "operating profit"
+    assert ebitda["page"] == 28
+    assert [item["name"] for item in ebitda["add_backs"]] == [
+        "Depreciation",
+        "amortisation",
+    ]
+    assert merged["covenants"] == [
+        {"name": "Leverage Ratio", "limit_value": 4.0, "page": 30},
+        {"name": "Interest Cover", "limit_value": 4.0, "limit_type": "min"},
+    ]
+
+
+def test_failed_sections_are_reported_beside_the_others():
+    results = section_results()
+    results[2] = ("leverage", {"success": False, "error": "rate limited"})
+
+    merged = merge_section_results(results)
+
+    assert merged["success"]
+    assert merged["section_errors"] == {"leverage": "rate limited"}
+    assert merge_section_results(results[2:3])["success"] is False
+
+
+def test_extraction_does_not_depend_on_completion_order(monkeypatch):
+    sections = tuple(s for s in EXTRACTION_SECTIONS if s.name in RESULTS)
+    names = [section.name for section in sections]
+
+    def extract(text, focus=None):
+        # Later sections finish first
+        time.sleep(0.01 * (len(names) - names.index(text)))
+        return {"success": True, "raw_response": text, **RESULTS[text]}
+
+    monkeypatch.setattr(section_extraction, "extract_covenants_from_text", extract)
+    merged = asyncio.run(
+        extract_sections({name: name for name in names}, sections, max_concurrency=4)
+    )
+
+    assert merged == merge_section_results(section_results())
@@ -14,7 +14,7 @@ export interface AgreementUploadResponse {
 export interface EBITDAAdjustment {
   name: string;
   section_ref: string;
-  page: number;
+  page?: number | null;
 }
 
 export interface EBITDACap {
@@ -25,9 +25,9 @@ export interface EBITDACap {
 }
 
 export interface EBITDADefinition {
-  base_metric: string;
-  section_ref: string;
-  page: number;
+  base_metric?: string;
+  section_ref?: string;
+  page?: number | null;
   add_backs: EBITDAAdjustment[];
   deductions: EBITDAAdjustment[];
   caps: EBITDACap[];
@@ -41,7 +41,7 @@ export interface CovenantDefinition {
   formula?: string;
   legal_text?: string;
   section_ref: string;
-  page?: number;
+  page?: number | null;
   // UI helpers
   limit?: number; // fallback
   section?: string; // fallback
@@ -54,6 +54,7 @@ export interface ExtractionResponse {
   ebitda_definition: EBITDADefinition | null;
   covenants: CovenantDefinition[];
   raw_response?: string;
+  validation_errors?: string[];
 }
 
 export interface GeneratedCodeResponse {
@@ -131,6 +132,64 @@ export async function extractCovenants(
   return response.json();
 }
 
+export interface ExtractionStreamHandlers {
+  onStage?: (stage: { stage: string; [count: string]: string | number }) => void;
+  onEbitdaDefinition?: (definition: EBITDADefinition) => void;
+  onCovenant?: (covenant: CovenantDefinition) => void;
+}
+
+// Same result as extractCovenants, but reports stages and each covenant as
+// soon as the server has it (server-sent events from /extract/stream)
+export async function extractCovenantsStream(
+  agreementId: string,
+  handlers: ExtractionStreamHandlers = {}
+): Promise<ExtractionResponse> {
+  const response = await fetch(`${API_BASE_URL}/extract/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ agreement_id: agreementId }),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error("Extraction failed");
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of message.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+
+      if (event === "stage") handlers.onStage?.(payload);
+      else if (event === "ebitda_definition")
+        handlers.onEbitdaDefinition?.(payload);
+      else if (event === "covenant") handlers.onCovenant?.(payload);
+      else if (event === "error")
+        throw new Error(payload.detail || "Extraction failed");
+      else if (event === "done") return payload;
+    }
+  }
+
+  throw new Error("Extraction stream ended unexpectedly");
+}
+
 export async function generateCode(
   agreementId: string
 ): Promise<GeneratedCodeResponse> {